@@ -186,7 +186,7 @@ def send_order_confirmation_email(order):
     for item in order.items.all():
         items_html += f"""
         <tr>
-            <td>{item.product.name}</td>
+            <td>{item.product_name}</td>
             <td style="text-align: center;">{item.quantity}</td>
             <td style="text-align: right;">₹{item.price:,.2f}</td>
             <td style="text-align: right;">₹{(item.price * item.quantity):,.2f}</td>
@@ -1,18 +1,56 @@
 from rest_framework import serializers
-from .models import Cart, CartItem
 
 from products.serializers import ProductSerializer
 
-class CartItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
-    
+class CartProductSerializer(ProductSerializer):
+    """Product snapshot shown in the cart drawer"""
+
     class Meta:
-        model = CartItem
-        fields = '__all__'
+        model = ProductSerializer.Meta.model
+        fields = [
+            'id', 'name', 'slug', 'sku', 'size', 'price', 'discount_price',
+            'image_main', 'stock_quantity', 'in_stock', 'available_quantity',
+        ]
+
+    # Columns loaded for each cart line; in_stock also needs manual_out_of_stock
+    queryset_fields = [
+        'id', 'name', 'slug', 'sku', 'size', 'price', 'discount_price',
+        'image_main', 'stock_quantity', 'manual_out_of_stock',
+    ]
+
+class CartItemSerializer(serializers.Serializer):
+    """A cart line ({'product', 'quantity'}); lines are keyed by product, so id is the product id"""
+    id = serializers.IntegerField(source='product.pk', read_only=True)
+    product = CartProductSerializer(read_only=True)
+    quantity = serializers.IntegerField(read_only=True)
+    unit_price = serializers.DecimalField(source='product.effective_price', max_digits=10, decimal_places=2, read_only=True)
+    line_total = serializers.SerializerMethodField()
+
+    def get_line_total(self, line):
+        return f"{line['product'].effective_price * line['quantity']:.2f}"
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(serializers.Serializer):
+    """A cart ({'items': [lines]})"""
     items = CartItemSerializer(many=True, read_only=True)
+    item_count = serializers.SerializerMethodField()
+    subtotal = serializers.SerializerMethodField()
 
-    class Meta:
-        model = Cart
-        fields = ('id', 'user', 'items', 'created_at')
+    def get_item_count(self, cart):
+        return sum(line['quantity'] for line in cart['items'])
+
+    def get_subtotal(self, cart):
+        subtotal = sum(line['product'].effective_price * line['quantity'] for line in cart['items'])
+        return f'{subtotal:.2f}'
+
+class CartOperationSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0)
+
+class CartBulkSerializer(serializers.Serializer):
+    """
+    Several cart changes applied at once. In 'add' mode quantities are added
+    to what is already in the cart; in 'set' mode they replace it (0 removes
+    the product).
+    """
+    items = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
+    mode = serializers.ChoiceField(choices=['add', 'set'], default='add')
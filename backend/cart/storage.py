@@ -0,0 +1,332 @@
+"""
+Cart storage backends.
+
+A cart is a mapping of product id -> quantity owned by either a user
+('user:<id>') or an anonymous visitor ('anon:<token>', see X-Cart-Token in
+cart.views).
+
+DatabaseCartStore reads and writes the Cart/CartItem tables directly.
+
+RedisCartStore keeps each cart in a Redis hash, so every mutation is a
+single HINCRBY/HSET/HDEL. User carts are written behind to the Cart/CartItem
+tables by the flush_dirty_carts task, and synchronously at checkout
+(flush()), so orders and admin keep reading the tables. Anonymous carts
+only live in Redis and are merged into the user's cart on login.
+
+CART_STORE selects the backend ('redis' or 'database').
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Cart, CartItem
+from products.models import Product
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'cart:'
+DIRTY_KEY = 'cart:dirty'
+
+# Reserved hash field marking a cart as loaded, so an emptied cart is not
+# re-seeded from the tables before it has been flushed
+LOADED_FIELD = '_'
+
+_redis = None
+_redis_lock = threading.Lock()
+
+
+def user_owner(user_id):
+    return f"user:{user_id}"
+
+
+def anonymous_owner(token):
+    return f"anon:{token}"
+
+
+def _user_id(owner):
+    kind, _, value = owner.partition(':')
+    return int(value) if kind == 'user' else None
+
+
+def _load_from_db(user_id):
+    return dict(
+        CartItem.objects.filter(cart__user_id=user_id).values_list('product_id', 'quantity')
+    )
+
+
+def apply_cart_changes(user_id, quantities, replace=False):
+    """
+    Write new quantities to a user's CartItem rows in one transaction.
+
+    Args:
+        user_id: Cart owner
+        quantities: Dict of product id -> quantity (0 removes the product)
+        replace: Also remove every product not in quantities
+    """
+    # Products deleted since they were added can't be written back
+    existing_products = set(Product.objects.filter(pk__in=list(quantities)).values_list('pk', flat=True))
+    quantities = {
+        product_id: quantity for product_id, quantity in quantities.items()
+        if product_id in existing_products
+    }
+
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user_id=user_id)
+        existing = {item.product_id: item for item in cart.items.select_for_update()}
+
+        removed = []
+        for product_id, item in existing.items():
+            quantity = quantities.get(product_id)
+            if (quantity is None and replace) or (quantity is not None and quantity <= 0):
+                removed.append(item.pk)
+
+        changed = []
+        created = []
+        for product_id, quantity in quantities.items():
+            item = existing.get(product_id)
+            if quantity <= 0:
+                continue
+            if item is None:
+                created.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+            elif item.quantity != quantity:
+                item.quantity = quantity
+                changed.append(item)
+
+        CartItem.objects.filter(pk__in=removed).delete()
+        CartItem.objects.bulk_update(changed, ['quantity'])
+        CartItem.objects.bulk_create(created)
+
+
+def write_cart_to_db(user_id, items):
+    """Replace a user's CartItem rows with the given product id -> quantity map"""
+    apply_cart_changes(user_id, items, replace=True)
+
+
+class DatabaseCartStore:
+    """Carts stored only in the Cart/CartItem tables (user carts only)"""
+
+    supports_anonymous = False
+
+    def items(self, owner):
+        return _load_from_db(_user_id(owner))
+
+    def quantity(self, owner, product_id):
+        item = CartItem.objects.filter(cart__user_id=_user_id(owner), product_id=product_id).first()
+        return item.quantity if item else 0
+
+    def add(self, owner, product_id, quantity):
+        cart, _ = Cart.objects.get_or_create(user_id=_user_id(owner))
+        item, created = CartItem.objects.get_or_create(
+            cart=cart, product_id=product_id, defaults={'quantity': quantity}
+        )
+        if not created:
+            item.quantity += quantity
+            item.save(update_fields=['quantity'])
+        return item.quantity
+
+    def set(self, owner, product_id, quantity):
+        if quantity <= 0:
+            return self.remove(owner, product_id)
+        cart, _ = Cart.objects.get_or_create(user_id=_user_id(owner))
+        CartItem.objects.update_or_create(
+            cart=cart, product_id=product_id, defaults={'quantity': quantity}
+        )
+
+    def remove(self, owner, product_id):
+        CartItem.objects.filter(cart__user_id=_user_id(owner), product_id=product_id).delete()
+
+    def clear(self, owner):
+        CartItem.objects.filter(cart__user_id=_user_id(owner)).delete()
+
+    def apply(self, owner, quantities):
+        apply_cart_changes(_user_id(owner), quantities)
+
+    def merge(self, source, target):
+        pass
+
+    def flush(self, owner):
+        pass
+
+
+class RedisCartStore:
+    """Carts stored in Redis hashes, written behind to the tables"""
+
+    supports_anonymous = True
+
+    def __init__(self, client):
+        self.client = client
+
+    def _key(self, owner):
+        return f"{KEY_PREFIX}{owner}"
+
+    def _ttl(self, owner):
+        days = settings.CART_ANONYMOUS_TTL_DAYS if _user_id(owner) is None else settings.CART_REDIS_TTL_DAYS
+        return days * 86400
+
+    def _touch(self, pipe, owner):
+        """Refresh the TTL and queue user carts for the next flush"""
+        pipe.expire(self._key(owner), self._ttl(owner))
+        user_id = _user_id(owner)
+        if user_id is not None:
+            pipe.sadd(DIRTY_KEY, user_id)
+
+    def _ensure_loaded(self, owner):
+        """
+        Seed a user cart's hash from the tables the first time it is touched.
+
+        Anonymous carts have nothing to seed from; their hash is created by
+        the first write.
+        """
+        user_id = _user_id(owner)
+        key = self._key(owner)
+        if user_id is None or self.client.hexists(key, LOADED_FIELD):
+            return
+
+        mapping = {LOADED_FIELD: 1}
+        mapping.update(_load_from_db(user_id))
+        # Don't overwrite a hash another request seeded in the meantime
+        from redis import WatchError
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if not pipe.hexists(key, LOADED_FIELD):
+                    pipe.multi()
+                    pipe.hset(key, mapping=mapping)
+                    pipe.expire(key, self._ttl(owner))
+                    pipe.execute()
+            except WatchError:
+                pass
+
+    def items(self, owner):
+        self._ensure_loaded(owner)
+        return {
+            int(product_id): int(quantity)
+            for product_id, quantity in self.client.hgetall(self._key(owner)).items()
+            if product_id != LOADED_FIELD
+        }
+
+    def quantity(self, owner, product_id):
+        self._ensure_loaded(owner)
+        return int(self.client.hget(self._key(owner), product_id) or 0)
+
+    def add(self, owner, product_id, quantity):
+        self._ensure_loaded(owner)
+        with self.client.pipeline() as pipe:
+            pipe.hincrby(self._key(owner), product_id, quantity)
+            self._touch(pipe, owner)
+            return pipe.execute()[0]
+
+    def set(self, owner, product_id, quantity):
+        self._ensure_loaded(owner)
+        with self.client.pipeline() as pipe:
+            if quantity > 0:
+                pipe.hset(self._key(owner), product_id, quantity)
+            else:
+                pipe.hdel(self._key(owner), product_id)
+            self._touch(pipe, owner)
+            pipe.execute()
+
+    def remove(self, owner, product_id):
+        self.set(owner, product_id, 0)
+
+    def apply(self, owner, quantities):
+        """Set several quantities at once (0 removes the product)"""
+        self._ensure_loaded(owner)
+        key = self._key(owner)
+        updated = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+        removed = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+
+        with self.client.pipeline() as pipe:
+            if updated:
+                pipe.hset(key, mapping=updated)
+            if removed:
+                pipe.hdel(key, *removed)
+            self._touch(pipe, owner)
+            pipe.execute()
+
+    def clear(self, owner):
+        key = self._key(owner)
+        with self.client.pipeline() as pipe:
+            pipe.delete(key)
+            pipe.hset(key, LOADED_FIELD, 1)
+            self._touch(pipe, owner)
+            pipe.execute()
+
+    def merge(self, source, target):
+        """Add an anonymous cart's quantities to a user's cart and drop it"""
+        with self.client.pipeline() as pipe:
+            pipe.hgetall(self._key(source))
+            pipe.delete(self._key(source))
+            source_hash = pipe.execute()[0]
+
+        items = {
+            int(product_id): int(quantity)
+            for product_id, quantity in source_hash.items()
+            if product_id != LOADED_FIELD
+        }
+        if not items:
+            return
+
+        self._ensure_loaded(target)
+        with self.client.pipeline() as pipe:
+            for product_id, quantity in items.items():
+                pipe.hincrby(self._key(target), product_id, quantity)
+            self._touch(pipe, target)
+            pipe.execute()
+        logger.info(f"Merged anonymous cart ({len(items)} products) into {target}")
+
+    def flush(self, owner):
+        """Write a user's cart to the tables now (checkout)"""
+        user_id = _user_id(owner)
+        self.client.srem(DIRTY_KEY, user_id)
+        write_cart_to_db(user_id, self.items(owner))
+
+    def flush_dirty(self, batch_size=500):
+        """
+        Write every changed user cart to the tables.
+
+        A cart changed while it is being written is marked dirty again by
+        that change and picked up by the next flush. Carts that fail to write
+        are marked dirty again once the run is over, so a cart that always
+        fails can't keep the run going.
+
+        Returns:
+            int: Number of carts written
+        """
+        flushed = 0
+        failed = []
+        while True:
+            user_ids = self.client.spop(DIRTY_KEY, batch_size)
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                owner = user_owner(int(user_id))
+                try:
+                    write_cart_to_db(int(user_id), self.items(owner))
+                    flushed += 1
+                except Exception as e:
+                    logger.error(f"Failed to flush cart for user {user_id}: {e}")
+                    failed.append(user_id)
+        if failed:
+            self.client.sadd(DIRTY_KEY, *failed)
+        return flushed
+
+
+def get_redis():
+    """Process-wide Redis client for cart storage"""
+    global _redis
+    if _redis is None:
+        with _redis_lock:
+            if _redis is None:
+                import redis
+                _redis = redis.Redis.from_url(settings.CART_REDIS_URL, decode_responses=True)
+    return _redis
+
+
+def get_cart_store():
+    """Return the cart backend selected by CART_STORE"""
+    if settings.CART_STORE == 'redis':
+        return RedisCartStore(get_redis())
+    return DatabaseCartStore()
@@ -0,0 +1,26 @@
+"""
+Celery tasks for cart storage
+"""
+from celery import shared_task
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def flush_dirty_carts():
+    """
+    Write Redis carts changed since the last run to the Cart/CartItem tables.
+    
+    Scheduled via Celery Beat: Every 5 minutes. No-op with the database store.
+    """
+    if settings.CART_STORE != 'redis':
+        return 0
+    
+    from .storage import get_cart_store
+    
+    flushed = get_cart_store().flush_dirty()
+    if flushed:
+        logger.info(f"Flushed {flushed} carts to the database")
+    return flushed
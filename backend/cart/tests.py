@@ -0,0 +1,260 @@
+from decimal import Decimal
+from unittest import mock, skipIf
+
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from cart import storage
+from cart.models import Cart, CartItem
+from cart.storage import DIRTY_KEY, RedisCartStore
+from cart.tasks import flush_dirty_carts
+from orders.tests import make_user
+from products.tests import make_product
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+@override_settings(CART_STORE='database')
+class CartSnapshotTests(TestCase):
+    url = '/api/cart/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def add_to_cart(self, product, quantity):
+        CartItem.objects.create(cart=self.cart, product=product, quantity=quantity)
+
+    def test_lines_carry_prices_and_totals(self):
+        wash = make_product('Foaming Face Wash', price=Decimal('400.00'), discount_price=Decimal('350.00'))
+        toner = make_product('Rose Toner', price=Decimal('250.00'))
+        self.add_to_cart(wash, 2)
+        self.add_to_cart(toner, 1)
+
+        cart = self.client.get(self.url).json()
+
+        lines = {line['id']: line for line in cart['items']}
+        self.assertEqual(lines[wash.pk]['unit_price'], '350.00')
+        self.assertEqual(lines[wash.pk]['line_total'], '700.00')
+        self.assertEqual(lines[wash.pk]['product']['slug'], 'foaming-face-wash')
+        self.assertTrue(lines[toner.pk]['product']['in_stock'])
+        self.assertNotIn('description', lines[toner.pk]['product'])
+        self.assertEqual(cart['item_count'], 3)
+        self.assertEqual(cart['subtotal'], '950.00')
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        def cart_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(self.url).status_code, 200)
+            return len(queries)
+
+        self.add_to_cart(make_product('Product 0'), 1)
+        one_line = cart_queries()
+        for number in range(1, 6):
+            self.add_to_cart(make_product(f'Product {number}'), 1)
+
+        self.assertEqual(cart_queries(), one_line)
+
+    def test_deleted_products_are_left_out(self):
+        product = make_product('Rose Toner')
+        self.add_to_cart(product, 1)
+        self.add_to_cart(make_product('Foaming Face Wash'), 1)
+        product.delete()
+
+        cart = self.client.get(self.url).json()
+
+        self.assertEqual([line['product']['name'] for line in cart['items']], ['Foaming Face Wash'])
+
+
+@skipIf(fakeredis is None, 'fakeredis is not installed')
+@override_settings(CART_STORE='redis', CART_REDIS_TTL_DAYS=30, CART_ANONYMOUS_TTL_DAYS=14)
+class RedisCartTests(TestCase):
+    url = '/api/cart/'
+
+    def setUp(self):
+        cache.clear()
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patcher = mock.patch('cart.storage.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.product = make_product('Foaming Face Wash')
+
+    def cart_keys(self):
+        return [key for key in self.redis.keys('cart:*') if key != DIRTY_KEY]
+
+    def test_tokenless_reads_do_not_create_a_cart(self):
+        for _ in range(3):
+            response = self.client.get(self.url)
+            self.assertEqual(response.json()['items'], [])
+            self.assertNotIn('X-Cart-Token', response)
+
+        self.assertEqual(self.client.delete(f'{self.url}clear/').status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_X_CART_TOKEN='0' * 32).json()['items'], [])
+        self.assertEqual(self.cart_keys(), [])
+
+    def test_first_add_issues_a_token_and_an_expiring_cart(self):
+        response = self.client.post(f'{self.url}add/', {'product_id': self.product.pk, 'quantity': 2})
+        token = response['X-Cart-Token']
+
+        key, = self.cart_keys()
+        self.assertEqual(key, f'cart:anon:{token}')
+        self.assertGreater(self.redis.ttl(key), 13 * 86400)
+        self.assertLessEqual(self.redis.ttl(key), 14 * 86400)
+
+        cart = self.client.get(self.url, HTTP_X_CART_TOKEN=token)
+        self.assertNotIn('X-Cart-Token', cart)
+        self.assertEqual(cart.json()['item_count'], 2)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_seeded_user_carts_expire(self):
+        user = make_user()
+        CartItem.objects.create(cart=Cart.objects.create(user=user), product=self.product, quantity=3)
+        self.client.force_authenticate(user)
+
+        self.assertEqual(self.client.get(self.url).json()['item_count'], 3)
+
+        self.assertGreater(self.redis.ttl(f'cart:user:{user.pk}'), 29 * 86400)
+        self.assertFalse(self.redis.sismember(DIRTY_KEY, user.pk))
+
+    def test_anonymous_cart_is_merged_on_login(self):
+        token = self.client.post(f'{self.url}add/', {'product_id': self.product.pk})['X-Cart-Token']
+        user = make_user()
+        CartItem.objects.create(cart=Cart.objects.create(user=user), product=self.product, quantity=2)
+        self.client.force_authenticate(user)
+
+        cart = self.client.get(self.url, HTTP_X_CART_TOKEN=token).json()
+
+        self.assertEqual(cart['item_count'], 3)
+        self.assertFalse(self.redis.exists(f'cart:anon:{token}'))
+
+    def test_user_changes_are_written_behind(self):
+        user = make_user()
+        self.client.force_authenticate(user)
+        self.client.post(f'{self.url}add/', {'product_id': self.product.pk, 'quantity': 2})
+        self.assertFalse(CartItem.objects.exists())
+
+        self.assertEqual(flush_dirty_carts(), 1)
+
+        self.assertEqual(list(CartItem.objects.values_list('product_id', 'quantity')), [(self.product.pk, 2)])
+        self.assertEqual(flush_dirty_carts(), 0)
+
+    def test_carts_that_fail_to_write_are_retried_by_the_next_run(self):
+        users = [make_user('asha'), make_user('ravi')]
+        store = RedisCartStore(self.redis)
+        for user in users:
+            store.add(f'user:{user.pk}', self.product.pk, 1)
+        write_cart_to_db = storage.write_cart_to_db
+
+        def write(user_id, items):
+            if user_id == users[0].pk:
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            write_cart_to_db(user_id, items)
+
+        with mock.patch('cart.storage.write_cart_to_db', side_effect=write) as writes:
+            self.assertEqual(store.flush_dirty(batch_size=1), 1)
+
+        self.assertEqual(writes.call_count, 2)
+        self.assertEqual(self.redis.smembers(DIRTY_KEY), {str(users[0].pk)})
+
+    def test_emptied_cart_is_not_reseeded_before_the_flush(self):
+        user = make_user()
+        CartItem.objects.create(cart=Cart.objects.create(user=user), product=self.product, quantity=1)
+        self.client.force_authenticate(user)
+
+        self.client.delete(f'{self.url}{self.product.pk}/remove_item/')
+
+        self.assertEqual(self.client.get(self.url).json()['items'], [])
+        flush_dirty_carts()
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_flush_writes_a_cart_now(self):
+        user = make_user()
+        store = RedisCartStore(self.redis)
+        store.add(f'user:{user.pk}', self.product.pk, 4)
+
+        store.flush(f'user:{user.pk}')
+
+        self.assertEqual(CartItem.objects.get().quantity, 4)
+        self.assertFalse(self.redis.sismember(DIRTY_KEY, user.pk))
+
+
+@override_settings(CART_STORE='database')
+class CartBulkTests(TestCase):
+    url = '/api/cart/bulk/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.wash = make_product('Foaming Face Wash', stock_quantity=10)
+        self.toner = make_product('Rose Toner', stock_quantity=3)
+        CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=self.wash, quantity=2)
+
+    def cart(self):
+        return dict(CartItem.objects.values_list('product_id', 'quantity'))
+
+    def test_add_mode_adds_to_the_cart(self):
+        response = self.client.post(self.url, [
+            {'product_id': self.wash.pk, 'quantity': 1},
+            {'product_id': self.toner.pk, 'quantity': 2},
+            {'product_id': self.wash.pk, 'quantity': 1},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cart(), {self.wash.pk: 4, self.toner.pk: 2})
+        self.assertEqual(response.json()['item_count'], 6)
+
+    def test_set_mode_replaces_quantities_and_zero_removes(self):
+        response = self.client.post(self.url, {'mode': 'set', 'items': [
+            {'product_id': self.wash.pk, 'quantity': 0},
+            {'product_id': self.toner.pk, 'quantity': 3},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cart(), {self.toner.pk: 3})
+
+    def test_nothing_is_applied_unless_every_change_is_valid(self):
+        response = self.client.post(self.url, [
+            {'product_id': self.wash.pk, 'quantity': 1},
+            {'product_id': self.toner.pk, 'quantity': 4},
+            {'product_id': 999999, 'quantity': 1},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        errors = {error['product_id']: error for error in response.json()['items']}
+        self.assertEqual(errors[self.toner.pk]['available'], 3)
+        self.assertEqual(errors[999999]['error'], 'Product not found')
+        self.assertNotIn(self.wash.pk, errors)
+        self.assertEqual(self.cart(), {self.wash.pk: 2})
+
+    def test_invalid_payloads_are_rejected(self):
+        for payload in ([], {'items': [{'product_id': self.wash.pk, 'quantity': -1}]},
+                        {'mode': 'replace', 'items': [{'product_id': self.wash.pk, 'quantity': 1}]}):
+            self.assertEqual(self.client.post(self.url, payload, format='json').status_code, 400)
+        self.assertEqual(self.cart(), {self.wash.pk: 2})
+
+    def test_query_count_does_not_grow_with_the_changes(self):
+        products = [make_product(f'Product {number}') for number in range(6)]
+
+        def bulk_queries(batch):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    self.url, [{'product_id': product.pk, 'quantity': 1} for product in batch], format='json'
+                )
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        self.assertEqual(bulk_queries(products[:1]), bulk_queries(products[1:]))
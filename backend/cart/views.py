@@ -1,97 +1,211 @@
+import re
+import uuid
+
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
-from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer
+from rest_framework.exceptions import NotAuthenticated
+from rest_framework.permissions import AllowAny
+from .serializers import CartSerializer, CartProductSerializer, CartBulkSerializer
+from .storage import get_cart_store, user_owner, anonymous_owner
 from products.models import Product
+from orders.stock import available_quantities, held_quantities
+
+# Anonymous carts are identified by this header; a new token is returned in
+# the same response header when an anonymous visitor first adds to the cart
+CART_TOKEN_HEADER = 'X-Cart-Token'
+CART_TOKEN_PATTERN = re.compile(r'[0-9a-f]{32}')
+
 
 class CartViewSet(viewsets.ViewSet):
-    permission_classes = [IsAuthenticated]
+    """
+    The current user's cart, or an anonymous visitor's cart identified by
+    X-Cart-Token (Redis cart store only). Anonymous visitors without a token
+    see an empty cart; the token is issued by their first add. Sending the
+    token with an authenticated request merges the anonymous cart into the
+    user's cart.
 
-    def list(self, request):
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        serializer = CartSerializer(cart, context={'request': request})
+    Cart items are keyed by product, so update_item/remove_item take a
+    product id.
+    """
+    permission_classes = [AllowAny]
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.store = get_cart_store()
+        self.new_token = None
+
+        token = request.headers.get(CART_TOKEN_HEADER, '')
+        if not CART_TOKEN_PATTERN.fullmatch(token):
+            token = None
+
+        if request.user.is_authenticated:
+            self.owner = user_owner(request.user.id)
+            if token and self.store.supports_anonymous:
+                self.store.merge(anonymous_owner(token), self.owner)
+        elif self.store.supports_anonymous:
+            # None until the visitor's first add creates the cart
+            self.owner = anonymous_owner(token) if token else None
+        else:
+            raise NotAuthenticated()
+
+    def writable_owner(self):
+        """Cart owner for a write, issuing a token to a new anonymous visitor"""
+        if self.owner is None:
+            self.new_token = uuid.uuid4().hex
+            self.owner = anonymous_owner(self.new_token)
+        return self.owner
+
+    def cart_items(self):
+        return self.store.items(self.owner) if self.owner else {}
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'new_token', None):
+            response[CART_TOKEN_HEADER] = self.new_token
+        return response
+
+    def cart_response(self, request):
+        """Serialize the cart with its product snapshots loaded in one query"""
+        items = self.cart_items()
+        products = Product.objects.filter(pk__in=list(items)).only(*CartProductSerializer.queryset_fields)
+        products = {product.pk: product for product in products}
+
+        cart = {
+            'items': [
+                {'product': products[product_id], 'quantity': quantity}
+                for product_id, quantity in items.items()
+                if product_id in products
+            ]
+        }
+        context = {'request': request, 'held_quantities': held_quantities(products)}
+        serializer = CartSerializer(cart, context=context)
         return Response(serializer.data)
 
+    def get_cart_product(self, pk):
+        """Product for a line in the cart, or None"""
+        try:
+            product_id = int(pk)
+        except (TypeError, ValueError):
+            return None
+        if not self.owner or not self.store.quantity(self.owner, product_id):
+            return None
+        return Product.objects.filter(pk=product_id).first()
+
+    def list(self, request):
+        return self.cart_response(request)
+
     @action(detail=False, methods=['post'])
     def add(self, request):
-        cart, created = Cart.objects.get_or_create(user=request.user)
         product_id = request.data.get('product_id')
         quantity = int(request.data.get('quantity', 1))
 
         try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
+            product = Product.objects.only('id', 'stock_quantity', 'stock_shards').get(id=product_id)
+        except (Product.DoesNotExist, ValueError, TypeError):
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
 
         # Check stock availability
-        cart_item_existing = CartItem.objects.filter(cart=cart, product=product).first()
-        current_qty = cart_item_existing.quantity if cart_item_existing else 0
+        current_qty = self.store.quantity(self.owner, product.id) if self.owner else 0
         total_requested = current_qty + quantity
+        available = available_quantities([product])[product.id]
 
-        if total_requested > product.stock_quantity:
+        if total_requested > available:
             return Response(
                 {
-                    'error': f'Only {product.stock_quantity} units available',
-                    'available': product.stock_quantity,
+                    'error': f'Only {available} units available',
+                    'available': available,
                     'in_cart': current_qty
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if cart_item_existing:
-            cart_item_existing.quantity = total_requested
-            cart_item_existing.save()
-        else:
-            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        self.store.add(self.writable_owner(), product.id, quantity)
+        return self.cart_response(request)
 
-        serializer = CartSerializer(cart, context={'request': request})
-        return Response(serializer.data)
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Apply a list of {product_id, quantity} changes (restoring a saved
+        cart, moving a wishlist, re-ordering) with one stock check and one
+        cart write. Nothing is applied unless every change is valid.
+        """
+        data = {'items': request.data} if isinstance(request.data, list) else request.data
+        serializer = CartBulkSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        mode = serializer.validated_data['mode']
+
+        requested = {}
+        for operation in serializer.validated_data['items']:
+            product_id = operation['product_id']
+            if mode == 'add':
+                requested[product_id] = requested.get(product_id, 0) + operation['quantity']
+            else:
+                requested[product_id] = operation['quantity']
+
+        current = self.cart_items()
+        quantities = {
+            product_id: current.get(product_id, 0) + quantity if mode == 'add' else quantity
+            for product_id, quantity in requested.items()
+        }
+
+        # Validate stock for every product in one query
+        stock = available_quantities(
+            Product.objects.filter(pk__in=list(quantities)).only('id', 'stock_quantity', 'stock_shards')
+        )
+        errors = []
+        for product_id, quantity in quantities.items():
+            if product_id not in stock:
+                errors.append({'product_id': product_id, 'error': 'Product not found'})
+            elif quantity > stock[product_id]:
+                errors.append({
+                    'product_id': product_id,
+                    'error': f'Only {stock[product_id]} units available',
+                    'available': stock[product_id],
+                    'in_cart': current.get(product_id, 0),
+                })
+
+        if errors:
+            return Response({'error': 'Some items could not be added', 'items': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        self.store.apply(self.writable_owner(), quantities)
+        return self.cart_response(request)
 
     @action(detail=True, methods=['patch'])
     def update_item(self, request, pk=None):
-        try:
-            cart_item = CartItem.objects.select_related('product').get(id=pk, cart__user=request.user)
-        except CartItem.DoesNotExist:
+        product = self.get_cart_product(pk)
+        if product is None:
             return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
 
         quantity = int(request.data.get('quantity', 1))
         if quantity > 0:
             # Validate against stock
-            if quantity > cart_item.product.stock_quantity:
+            available = available_quantities([product])[product.id]
+            if quantity > available:
                 return Response(
                     {
-                        'error': f'Only {cart_item.product.stock_quantity} units available',
-                        'available': cart_item.product.stock_quantity,
+                        'error': f'Only {available} units available',
+                        'available': available,
                     },
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            cart_item.quantity = quantity
-            cart_item.save()
+            self.store.set(self.owner, product.id, quantity)
         else:
-            cart_item.delete()
+            self.store.remove(self.owner, product.id)
 
-        cart = Cart.objects.get(user=request.user)
-        serializer = CartSerializer(cart, context={'request': request})
-        return Response(serializer.data)
+        return self.cart_response(request)
 
     @action(detail=True, methods=['delete'])
     def remove_item(self, request, pk=None):
-        try:
-            cart_item = CartItem.objects.get(id=pk, cart__user=request.user)
-        except CartItem.DoesNotExist:
+        product = self.get_cart_product(pk)
+        if product is None:
             return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        cart_item.delete()
-
-        cart = Cart.objects.get(user=request.user)
-        serializer = CartSerializer(cart, context={'request': request})
-        return Response(serializer.data)
+        self.store.remove(self.owner, product.id)
+        return self.cart_response(request)
 
     @action(detail=False, methods=['delete'])
     def clear(self, request):
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        cart.items.all().delete()
-        serializer = CartSerializer(cart, context={'request': request})
-        return Response(serializer.data)
+        if self.owner:
+            self.store.clear(self.owner)
+        return self.cart_response(request)
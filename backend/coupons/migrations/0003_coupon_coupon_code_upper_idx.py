@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:32
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupons', '0002_coupon_max_uses_coupon_min_order_amount_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='coupon',
+            index=models.Index(django.db.models.functions.text.Upper('code'), name='coupon_code_upper_idx'),
+        ),
+    ]
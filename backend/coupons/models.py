@@ -1,5 +1,11 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Upper
+
+class CouponQuerySet(models.QuerySet):
+    def with_code(self, code):
+        """Case-insensitive code lookup that can use the Upper(code) index"""
+        return self.alias(code_upper=Upper('code')).filter(code_upper=Upper(models.Value(code)))
 
 class Coupon(models.Model):
     code = models.CharField(max_length=50, unique=True)
@@ -11,6 +17,14 @@ class Coupon(models.Model):
     used_count = models.PositiveIntegerField(default=0)
     min_order_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Minimum order total to apply coupon")
 
+    objects = CouponQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Checkout and coupon validation look codes up case-insensitively
+            models.Index(Upper('code'), name='coupon_code_upper_idx'),
+        ]
+
     def __str__(self):
         return self.code
 
@@ -14,7 +14,7 @@ class CouponViewSet(viewsets.ViewSet):
         code = request.data.get('code')
         now = timezone.now()
         try:
-            coupon = Coupon.objects.get(code__iexact=code, valid_from__lte=now, valid_to__gte=now, active=True)
+            coupon = Coupon.objects.with_code(code).get(valid_from__lte=now, valid_to__gte=now, active=True)
             serializer = CouponSerializer(coupon)
             return Response(serializer.data)
         except Coupon.DoesNotExist:
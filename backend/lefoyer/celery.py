@@ -3,6 +3,7 @@ Celery configuration for Le Foyer project
 """
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 from django.conf import settings
 
 # Set default Django settings module
@@ -18,6 +19,14 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
 
+@worker_process_init.connect
+def preload_bluedart_wsdl(**kwargs):
+    """Parse Blue Dart WSDLs once per worker process before the first task"""
+    if settings.BLUEDART_PRELOAD_WSDL:
+        from shipping.client import preload_wsdl
+        preload_wsdl()
+
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     """Debug task to test Celery setup"""
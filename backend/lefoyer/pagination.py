@@ -0,0 +1,59 @@
+"""
+Pagination shared by the API apps.
+
+PageNumberPagination (the REST_FRAMEWORK default) runs a COUNT(*) and an
+OFFSET scan for every page. Endpoints that set pagination_class to
+CursorOrPageNumberPagination also accept keyset pagination: clients opt in
+with ?pagination=cursor and then follow the `next`/`previous` links, which
+carry an opaque ?cursor= token. Every page costs the same as the first and
+no count is computed.
+"""
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+
+
+class CursorOrPageNumberPagination(BasePagination):
+    """
+    Page-number pagination by default, cursor pagination on request.
+
+    The cursor sort key comes from the view's `cursor_ordering` attribute
+    (default newest first). It must end in a unique field so the order is
+    stable.
+    """
+    cursor_ordering = ('-created_at', '-id')
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.paginator = None
+
+    def uses_cursor(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def get_paginator(self, request, view=None):
+        if not self.uses_cursor(request):
+            return PageNumberPagination()
+
+        paginator = CursorPagination()
+        paginator.ordering = getattr(view, 'cursor_ordering', self.cursor_ordering)
+        paginator.cursor_query_param = self.cursor_query_param
+        return paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.get_paginator(request, view)
+        return self.paginator.paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return PageNumberPagination().get_paginated_response_schema(schema)
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.paginator, 'display_page_controls', False)
+
+    def to_html(self):
+        return self.paginator.to_html()
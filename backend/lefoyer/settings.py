@@ -67,6 +67,10 @@ JAZZMIN_SETTINGS = {
             "name": "Sales Analytics",
             "url": "/admin/orders/analytics/",
             "icon": "fas fa-chart-line",
+        }, {
+            "name": "Export Orders",
+            "url": "/admin/orders/export/",
+            "icon": "fas fa-file-export",
         }]
     }
 }
@@ -217,6 +221,11 @@ else:
         "https://lefoyerglobal.com",
     ]
 
+# Anonymous carts are identified by this request/response header (cart.views)
+from corsheaders.defaults import default_headers
+CORS_ALLOW_HEADERS = (*default_headers, 'x-cart-token')
+CORS_EXPOSE_HEADERS = ['X-Cart-Token']
+
 CSRF_TRUSTED_ORIGINS = [
     "https://www.lefoyerglobal.com",
     "https://lefoyerglobal.com",
@@ -275,10 +284,91 @@ CELERY_BEAT_SCHEDULE = {
     },
     'poll-active-shipments': {
         'task': 'shipping.tasks.poll_active_shipments',
-        'schedule': crontab(minute=0, hour='*/2'),  # Every 2 hours
+        'schedule': crontab(minute='*/15'),  # Due shipments only, see Shipment.next_poll_at
+    },
+    'preload-pincode-master': {
+        'task': 'shipping.tasks.preload_pincode_master',
+        'schedule': crontab(hour=2, minute=30),  # 2:30 AM IST nightly
+    },
+    'flush-dirty-carts': {
+        'task': 'cart.tasks.flush_dirty_carts',
+        'schedule': crontab(minute='*/5'),  # Write Redis carts behind to the database
+    },
+    'release-expired-reservations': {
+        'task': 'orders.tasks.release_expired_reservations',
+        'schedule': crontab(minute='*'),  # Give back stock held by abandoned payments
+    },
+    'sync-sharded-stock': {
+        'task': 'products.tasks.sync_sharded_stock',
+        'schedule': crontab(minute='*'),  # Display totals of sharded products
+    },
+    'reconcile-sales-rollups': {
+        'task': 'orders.tasks.reconcile_sales_rollups',
+        'schedule': crontab(minute=20),  # Hourly; rebuilds recent days of analytics
+    },
+    'export-orders-columnar': {
+        'task': 'orders.tasks.export_orders_columnar',
+        'schedule': crontab(minute=40),  # Hourly; changed rows to Parquet
     },
 }
 
+# ============================================================================
+# CACHE Configuration
+# ============================================================================
+# Shared Redis cache across gunicorn and celery processes; falls back to a
+# per-process memory cache when REDIS_CACHE_URL is not set (local development)
+REDIS_CACHE_URL = os.getenv('REDIS_CACHE_URL', '')
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': 'lefoyer',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds an anonymous catalog API response stays cached; catalog edits
+# invalidate it immediately (0 disables the response cache)
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 3600))
+
+# ============================================================================
+# CART Configuration
+# ============================================================================
+# 'redis' keeps carts in Redis hashes written behind to the Cart/CartItem
+# tables (required for anonymous carts); 'database' uses the tables directly
+CART_STORE = os.getenv('CART_STORE', 'redis' if REDIS_CACHE_URL else 'database')
+CART_REDIS_URL = os.getenv('CART_REDIS_URL', REDIS_CACHE_URL or CELERY_BROKER_URL)
+CART_REDIS_TTL_DAYS = int(os.getenv('CART_REDIS_TTL_DAYS', 30))
+CART_ANONYMOUS_TTL_DAYS = int(os.getenv('CART_ANONYMOUS_TTL_DAYS', 14))
+
+# Minutes a prepaid checkout holds its stock while the customer pays; expired
+# holds are released by orders.tasks.release_expired_reservations
+STOCK_HOLD_MINUTES = int(os.getenv('STOCK_HOLD_MINUTES', 15))
+
+# Shards created by the admin's "Shard stock" action for flash-sale products
+# (see products.shards)
+STOCK_SHARD_COUNT = int(os.getenv('STOCK_SHARD_COUNT', 8))
+
+# ============================================================================
+# SALES ANALYTICS Configuration
+# ============================================================================
+# Business day/hour boundaries of the sales rollups (see orders.rollups), and
+# how many recent days the hourly reconciliation rebuilds
+SALES_ROLLUP_TIME_ZONE = os.getenv('SALES_ROLLUP_TIME_ZONE', CELERY_TIMEZONE)
+SALES_ROLLUP_RECONCILE_DAYS = int(os.getenv('SALES_ROLLUP_RECONCILE_DAYS', 2))
+
+# Parquet export of orders, items, shipments and tracking events for offline
+# analytics (see orders.columnar), and rows fetched per database round trip
+ORDER_EXPORT_DIR = os.getenv('ORDER_EXPORT_DIR', str(BASE_DIR / 'exports'))
+ORDER_EXPORT_CHUNK_SIZE = int(os.getenv('ORDER_EXPORT_CHUNK_SIZE', 2000))
+
 # ============================================================================
 # BLUE DART SHIPPING Configuration
 # ============================================================================
@@ -306,7 +396,29 @@ BLUEDART_RETURN_PHONE = os.getenv('BLUEDART_RETURN_PHONE', BLUEDART_WAREHOUSE_PH
 
 # Environment
 BLUEDART_DEMO_MODE = os.getenv('BLUEDART_DEMO_MODE', 'True').lower() == 'true'
-BLUEDART_TRACKING_POLL_INTERVAL = 120  # minutes
+
+# Build SOAP clients from the WSDL snapshots in shipping/wsdl/ when present
+BLUEDART_USE_WSDL_SNAPSHOTS = os.getenv('BLUEDART_USE_WSDL_SNAPSHOTS', 'True').lower() == 'true'
+
+# Parse Blue Dart WSDLs when a gunicorn/celery worker starts
+BLUEDART_PRELOAD_WSDL = os.getenv('BLUEDART_PRELOAD_WSDL', str(not DEBUG)).lower() in ('true', '1', 'yes')
+BLUEDART_TRACKING_POLL_INTERVAL = 120  # minutes, for statuses without their own cadence
+BLUEDART_TRACKING_CONCURRENCY = int(os.getenv('BLUEDART_TRACKING_CONCURRENCY', '16'))
+BLUEDART_TRACKING_BATCH_SIZE = int(os.getenv('BLUEDART_TRACKING_BATCH_SIZE', '25'))  # AWBs per tracking request
+BLUEDART_TRACKING_TIMEOUT = 15  # seconds per tracking request
+BLUEDART_TRACKING_POLL_DEADLINE = 90  # seconds; unfinished AWBs wait for the next poll
+
+# Pincode serviceability cache lifetime (hours). Longer than the nightly
+# preload interval so preloaded pincodes never expire between runs.
+BLUEDART_SERVICEABILITY_TTL_HOURS = int(os.getenv('BLUEDART_SERVICEABILITY_TTL_HOURS', '48'))
+BLUEDART_SERVICEABILITY_NEGATIVE_TTL_HOURS = int(os.getenv('BLUEDART_SERVICEABILITY_NEGATIVE_TTL_HOURS', '6'))
+
+# Nightly pincode master preload
+BLUEDART_PINCODE_CSV = os.getenv('BLUEDART_PINCODE_CSV', str(BASE_DIR / 'shipping' / 'data' / 'pincodes.csv'))
+BLUEDART_PRELOAD_CONCURRENCY = int(os.getenv('BLUEDART_PRELOAD_CONCURRENCY', '4'))
+BLUEDART_PRELOAD_RATE_PER_SECOND = float(os.getenv('BLUEDART_PRELOAD_RATE_PER_SECOND', '5'))
+BLUEDART_PRELOAD_BATCH_SIZE = 200
+BLUEDART_PRELOAD_MIN_AGE_HOURS = 20  # Pincodes checked more recently are skipped
 
 # Default product settings for beauty products (lightweight parcels)
 BLUEDART_DEFAULT_PRODUCT_CODE = 'D'  # Domestic Priority (fast delivery)
@@ -14,3 +14,18 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lefoyer.settings')
 
 application = get_wsgi_application()
+
+# Warm the Blue Dart WSDL registry in the background so the first
+# serviceability check after a restart doesn't pay the parse cost
+from django.conf import settings  # noqa: E402
+
+if settings.BLUEDART_PRELOAD_WSDL:
+    import threading
+    from shipping.client import preload_wsdl
+
+    threading.Thread(target=preload_wsdl, name='bluedart-wsdl-preload', daemon=True).start()
+
+# Build the product suggestion index before the first keystroke arrives
+from products.suggest import refresh_index_in_background  # noqa: E402
+
+refresh_index_in_background()
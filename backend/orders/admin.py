@@ -1,17 +1,41 @@
 from django.contrib import admin
+from .exports import export_response
 from .models import Order, OrderItem
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
-    raw_id_fields = ['product']
-    readonly_fields = ['product', 'price', 'quantity']
+    # Snapshot columns only, so showing an order doesn't load its products
+    fields = ['product_name', 'product_sku', 'product_size', 'price', 'quantity']
+    readonly_fields = fields
     extra = 0
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'first_name', 'last_name', 'email', 'total', 'discount',
                     'payment_method', 'payment_status', 'paid', 'created_at')
-    list_filter = ('paid', 'payment_status', 'payment_method', 'created_at')
+    list_filter = ('paid', 'payment_status', 'payment_method', 'stock_status', 'created_at')
     search_fields = ('first_name', 'last_name', 'email', 'phone', 'id')
-    readonly_fields = ('user', 'total', 'discount', 'coupon', 'payment_id', 'provider_order_id', 'created_at', 'updated_at')
+    readonly_fields = ('user', 'total', 'discount', 'coupon', 'payment_id', 'provider_order_id', 'stock_status',
+                       'created_at', 'updated_at')
     inlines = [OrderItemInline]
+    actions = ['export_orders_csv', 'export_order_items_csv']
+
+    def save_model(self, request, obj, form, change):
+        # Write only the edited fields, never in_sales_rollups (maintained by
+        # orders.rollups with queryset updates)
+        if change:
+            obj.save(update_fields=[*form.changed_data, 'updated_at'])
+        else:
+            super().save_model(request, obj, form, change)
+
+    def export_orders_csv(self, request, queryset):
+        """Stream the selected orders as CSV (date ranges: /admin/orders/export/)"""
+        return export_response('orders', queryset)
+
+    export_orders_csv.short_description = "Export selected orders as CSV"
+
+    def export_order_items_csv(self, request, queryset):
+        """Stream the items of the selected orders as CSV"""
+        return export_response('order_items', OrderItem.objects.filter(order__in=queryset))
+
+    export_order_items_csv.short_description = "Export items of selected orders as CSV"
@@ -1,6 +1,8 @@
 from django.urls import path
 from .analytics_views import sales_analytics
+from .export_views import export_data
 
 urlpatterns = [
     path('analytics/', sales_analytics, name='sales_analytics'),
+    path('export/', export_data, name='order_export'),
 ]
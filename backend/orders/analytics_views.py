@@ -1,15 +1,78 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
-from .models import Order
-from django.db.models import Sum, Count
+from django.db.models import Max, Sum
+from .models import DailySalesRollup, HourlySalesRollup
+from .rollups import day_window, local_today
+
+# Breakdowns shown on the dashboard, best sellers first
+BREAKDOWNS = [
+    ('product', 'Products'),
+    ('category', 'Categories'),
+    ('payment_method', 'Payment methods'),
+    ('coupon', 'Coupons'),
+    ('state', 'States'),
+]
+BREAKDOWN_LIMIT = 10
+
+
+def _with_aov(rows):
+    """Add the average order value to rollup sums"""
+    rows = list(rows)
+    for row in rows:
+        row['aov'] = row['revenue'] / row['orders'] if row['orders'] else 0
+    return rows
+
 
 @staff_member_required
 def sales_analytics(request):
-    total_sales = Order.objects.aggregate(Sum('total'))['total__sum'] or 0
-    total_orders = Order.objects.count()
+    """
+    Sales dashboard. Reads only the sales rollups (see orders.rollups), so
+    it costs the same however many orders there are.
+    """
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 365)
+    except ValueError:
+        days = 30
+    today = local_today()
+    first_day = today - timedelta(days=days - 1)
+
+    totals = DailySalesRollup.objects.filter(dimension='total')
+    all_time = totals.aggregate(revenue=Sum('revenue'), orders=Sum('orders'))
+    daily = _with_aov(
+        totals.filter(period__gte=first_day).order_by('period').values('period', 'revenue', 'orders', 'units')
+    )
+    period_totals = _with_aov([{
+        'revenue': sum(row['revenue'] for row in daily),
+        'orders': sum(row['orders'] for row in daily),
+        'units': sum(row['units'] for row in daily),
+    }])[0]
+
+    breakdowns = []
+    for dimension, title in BREAKDOWNS:
+        rows = (
+            DailySalesRollup.objects.filter(dimension=dimension, period__gte=first_day)
+            .values('key')
+            .annotate(label=Max('label'), revenue=Sum('revenue'), orders=Sum('orders'), units=Sum('units'))
+            .order_by('-revenue')[:BREAKDOWN_LIMIT]
+        )
+        breakdowns.append({'title': title, 'rows': _with_aov(rows)})
+
+    hourly = _with_aov(
+        HourlySalesRollup.objects.filter(dimension='total', period__gte=day_window(today - timedelta(days=1))[0])
+        .order_by('period').values('period', 'revenue', 'orders', 'units')
+    )
 
     context = {
-        'total_sales': total_sales,
-        'total_orders': total_orders,
+        'total_sales': all_time['revenue'] or 0,
+        'total_orders': all_time['orders'] or 0,
+        'days': days,
+        'period_totals': period_totals,
+        'daily': daily,
+        'hourly': hourly,
+        'breakdowns': breakdowns,
+        'zone': settings.SALES_ROLLUP_TIME_ZONE,
     }
     return render(request, 'admin/sales_analytics.html', context)
@@ -0,0 +1,14 @@
+"""
+Orders app configuration
+"""
+from django.apps import AppConfig
+
+
+class OrdersConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'orders'
+    
+    def ready(self):
+        """Import signals and register system checks when app is ready"""
+        import orders.signals
+        import orders.checks
@@ -0,0 +1,25 @@
+"""
+System checks for the orders app (run by `manage.py check --deploy`)
+"""
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_held_counter_cache(app_configs, **kwargs):
+    """
+    The held stock counters (orders.stock) must live in a cache shared by
+    every process. A per-process cache gives each gunicorn and Celery
+    process its own counters, so holds placed in one are invisible to the
+    others.
+    """
+    backend = caches['default']
+    if not isinstance(backend, (LocMemCache, DummyCache)):
+        return []
+    return [checks.Error(
+        f"The default cache ({type(backend).__name__}) is per-process, so held stock counters are not shared.",
+        hint='Set REDIS_CACHE_URL.',
+        id='orders.E001',
+    )]
@@ -0,0 +1,366 @@
+"""
+Columnar export of orders for offline analytics and finance reports.
+
+Orders, order items, shipments and tracking events are written as Parquet
+files under ORDER_EXPORT_DIR, one directory per table and month (the month
+a row was created, in SALES_ROLLUP_TIME_ZONE):
+
+    orders/month=2026-10/part-20261017T101500000000.parquet
+
+Each run streams only the rows changed since the previous run out of the
+database (server-side cursors, ORDER_EXPORT_CHUNK_SIZE rows at a time):
+orders and shipments by updated_at, tracking events by created_at, and the
+items of every exported order. Each table's high-water mark is kept next to
+its files in _watermark.json and only moved once the run's files are
+complete, so a failed run is simply repeated.
+
+A row that changes is written again into a new part of its month, so a
+month can hold several versions of a row: read_export keeps the newest, and
+compact merges a month's parts into one file. Runs stop EXPORT_SETTLE
+before now so rows of transactions still in flight are picked up by the
+next run. Deleted orders stay in the export.
+
+Requires pyarrow (and pandas to read or compact).
+"""
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from shipping.models import Shipment, TrackingEvent
+
+from .models import Order, OrderItem
+from .rollups import rollup_zone
+
+logger = logging.getLogger(__name__)
+
+EXPORT_SETTLE = timedelta(minutes=5)
+WATERMARK_FILE = '_watermark.json'
+
+# Months with more parts than this are compacted by the scheduled export
+COMPACT_AFTER_PARTS = 24
+
+# table -> (model, (column, lookup) pairs, changed-since lookup, month lookup).
+# Customer names, addresses and phone numbers are left out.
+TABLES = {
+    'orders': (Order, (
+        ('id', 'id'),
+        ('user_id', 'user_id'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+        ('total', 'total'),
+        ('discount', 'discount'),
+        ('coupon_id', 'coupon_id'),
+        ('coupon_code', 'coupon__code'),
+        ('paid', 'paid'),
+        ('payment_status', 'payment_status'),
+        ('payment_method', 'payment_method'),
+        ('stock_status', 'stock_status'),
+        ('city', 'city'),
+        ('state', 'state'),
+        ('pincode', 'pincode'),
+    ), 'updated_at', 'created_at'),
+    'order_items': (OrderItem, (
+        ('id', 'id'),
+        ('order_id', 'order_id'),
+        ('order_created_at', 'order__created_at'),
+        ('product_id', 'product_id'),
+        ('product_name', 'product_name'),
+        ('product_sku', 'product_sku'),
+        ('product_size', 'product_size'),
+        ('price', 'price'),
+        ('quantity', 'quantity'),
+    ), 'order__updated_at', 'order__created_at'),
+    'shipments': (Shipment, (
+        ('id', 'id'),
+        ('order_id', 'order_id'),
+        ('awb_number', 'awb_number'),
+        ('status', 'status'),
+        ('product_code', 'product_code'),
+        ('sub_product_code', 'sub_product_code'),
+        ('origin_area', 'origin_area'),
+        ('destination_area', 'destination_area'),
+        ('destination_pincode', 'destination_pincode'),
+        ('weight_kg', 'weight_kg'),
+        ('declared_value', 'declared_value'),
+        ('collectible_amount', 'collectible_amount'),
+        ('expected_delivery_date', 'expected_delivery_date'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+        ('shipped_at', 'shipped_at'),
+        ('delivered_at', 'delivered_at'),
+    ), 'updated_at', 'created_at'),
+    'tracking_events': (TrackingEvent, (
+        ('id', 'id'),
+        ('shipment_id', 'shipment_id'),
+        ('scan_date', 'scan_date'),
+        ('scan_code', 'scan_code'),
+        ('scan_description', 'scan_description'),
+        ('scanned_location', 'scanned_location'),
+        ('created_at', 'created_at'),
+    ), 'created_at', 'created_at'),
+}
+
+INTEGER_FIELDS = {
+    'AutoField', 'BigAutoField', 'SmallAutoField', 'IntegerField', 'BigIntegerField',
+    'SmallIntegerField', 'PositiveIntegerField', 'PositiveBigIntegerField', 'PositiveSmallIntegerField',
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImproperlyConfigured('The columnar order export requires pyarrow (pip install pyarrow)')
+    return pyarrow
+
+
+def export_root():
+    return Path(settings.ORDER_EXPORT_DIR)
+
+
+def _field(model, lookup):
+    *relations, name = lookup.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+def _arrow_type(pa, field):
+    if field.is_relation:
+        field = field.target_field
+    internal = field.get_internal_type()
+    if internal in INTEGER_FIELDS:
+        return pa.int64()
+    if internal == 'DecimalField':
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if internal == 'DateTimeField':
+        return pa.timestamp('us', tz='UTC')
+    if internal == 'DateField':
+        return pa.date32()
+    if internal == 'BooleanField':
+        return pa.bool_()
+    return pa.string()
+
+
+def table_schema(table):
+    """Arrow schema of an exported table, derived from the model fields"""
+    pa = _pyarrow()
+    model, columns, _, _ = TABLES[table]
+    return pa.schema([
+        pa.field(column, _arrow_type(pa, _field(model, lookup)))
+        for column, lookup in columns
+    ])
+
+
+def read_watermark(table):
+    """When a table was last exported up to (None if never)"""
+    path = export_root() / table / WATERMARK_FILE
+    if not path.exists():
+        return None
+    return datetime.fromisoformat(json.loads(path.read_text())['exported_until'])
+
+
+def _write_watermark(table, until):
+    path = export_root() / table / WATERMARK_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps({'exported_until': until.isoformat()}))
+    os.replace(tmp, path)
+
+
+def _month_dir(table, month):
+    return export_root() / table / f'month={month}'
+
+
+def month_parts(table, month):
+    """A month's part files, oldest first"""
+    return sorted(_month_dir(table, month).glob('part-*.parquet'))
+
+
+def export_months(table):
+    """Months a table has files for, oldest first"""
+    return sorted(
+        path.name.split('=', 1)[1]
+        for path in (export_root() / table).glob('month=*')
+        if path.is_dir()
+    )
+
+
+class _PartWriter:
+    """
+    Writes a run's rows into one new part file per month, buffering at most
+    chunk_size rows per month. Parts are written under a temporary name and
+    renamed when closed, so readers never see a partial file.
+    """
+
+    def __init__(self, table, run_name, chunk_size):
+        self.pa = _pyarrow()
+        self.table = table
+        self.schema = table_schema(table)
+        self.run_name = run_name
+        self.chunk_size = chunk_size
+        self.buffers = {}
+        self.writers = {}
+        self.rows = 0
+
+    def _paths(self, month):
+        path = _month_dir(self.table, month) / f'part-{self.run_name}.parquet'
+        return path, path.with_name(f'.{path.name}.tmp')
+
+    def add(self, month, row):
+        buffer = self.buffers.setdefault(month, [])
+        buffer.append(row)
+        if len(buffer) >= self.chunk_size:
+            self._flush(month)
+
+    def _flush(self, month):
+        rows = self.buffers.pop(month, None)
+        if not rows:
+            return
+        arrays = [
+            self.pa.array(values, type=field.type)
+            for values, field in zip(zip(*rows), self.schema)
+        ]
+        if month not in self.writers:
+            path, tmp = self._paths(month)
+            tmp.parent.mkdir(parents=True, exist_ok=True)
+            self.writers[month] = self.pa.parquet.ParquetWriter(tmp, self.schema)
+        self.writers[month].write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+        self.rows += len(rows)
+
+    def close(self):
+        """Write the remaining rows and publish the parts; returns the months written"""
+        for month in list(self.buffers):
+            self._flush(month)
+        for month, writer in self.writers.items():
+            writer.close()
+            path, tmp = self._paths(month)
+            os.replace(tmp, path)
+        return sorted(self.writers)
+
+    def abort(self):
+        for month, writer in self.writers.items():
+            writer.close()
+            self._paths(month)[1].unlink(missing_ok=True)
+
+
+def export_table(table, until=None, full=False):
+    """
+    Export a table's rows changed since its high-water mark.
+
+    Args:
+        table: Key of TABLES
+        until: Export rows changed up to this time (default: EXPORT_SETTLE ago)
+        full: Ignore the high-water mark and export every row
+
+    Returns:
+        tuple: (rows written, months written)
+    """
+    model, columns, changed, month_lookup = TABLES[table]
+    until = until or timezone.now() - EXPORT_SETTLE
+    since = None if full else read_watermark(table)
+    if since is not None and since >= until:
+        return 0, []
+
+    queryset = model.objects.filter(**{f'{changed}__lte': until})
+    if since is not None:
+        queryset = queryset.filter(**{f'{changed}__gt': since})
+    lookups = [lookup for _, lookup in columns]
+    month_index = lookups.index(month_lookup)
+    zone = rollup_zone()
+
+    writer = _PartWriter(table, until.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%S%f'),
+                         settings.ORDER_EXPORT_CHUNK_SIZE)
+    try:
+        rows = queryset.order_by().values_list(*lookups).iterator(chunk_size=settings.ORDER_EXPORT_CHUNK_SIZE)
+        for row in rows:
+            writer.add(row[month_index].astimezone(zone).strftime('%Y-%m'), row)
+        months = writer.close()
+    except Exception:
+        writer.abort()
+        raise
+
+    _write_watermark(table, until)
+    logger.info(f"Exported {writer.rows} {table} rows changed up to {until.isoformat()} ({len(months)} months)")
+    return writer.rows, months
+
+
+def export(tables=None, full=False):
+    """
+    Export every table (or the given ones) up to the same point in time.
+
+    Returns:
+        dict: table -> (rows written, months written)
+    """
+    until = timezone.now() - EXPORT_SETTLE
+    return {table: export_table(table, until=until, full=full) for table in tables or TABLES}
+
+
+def _read_parts(paths):
+    import pandas as pd
+
+    pa = _pyarrow()
+    frames = [pa.parquet.read_table(path).to_pandas() for path in paths]
+    if not frames:
+        return None
+    # Later parts hold the newer version of a row
+    return pd.concat(frames, ignore_index=True).drop_duplicates(subset='id', keep='last')
+
+
+def read_export(table, first_month=None, last_month=None):
+    """
+    Load an exported table into a pandas DataFrame, newest version of each row.
+
+    Args:
+        table: Key of TABLES
+        first_month: First month to read ('YYYY-MM', default: all)
+        last_month: Last month to read ('YYYY-MM', default: all)
+
+    Returns:
+        DataFrame
+    """
+    paths = [
+        path
+        for month in export_months(table)
+        if (first_month is None or month >= first_month) and (last_month is None or month <= last_month)
+        for path in month_parts(table, month)
+    ]
+    frame = _read_parts(paths)
+    if frame is None:
+        return table_schema(table).empty_table().to_pandas()
+    return frame.reset_index(drop=True)
+
+
+def compact(table, month):
+    """
+    Merge a month's parts into one file holding the newest version of each row.
+
+    The merged file takes the name of the newest part, so parts written by a
+    run in the meantime still sort after it.
+
+    Returns:
+        int: Number of parts merged
+    """
+    pa = _pyarrow()
+    parts = month_parts(table, month)
+    if len(parts) < 2:
+        return 0
+
+    frame = _read_parts(parts)
+    target = parts[-1]
+    tmp = target.with_name(f'.{target.name}.tmp')
+    pa.parquet.write_table(
+        pa.Table.from_pandas(frame, schema=table_schema(table), preserve_index=False), tmp
+    )
+    os.replace(tmp, target)
+    for part in parts[:-1]:
+        part.unlink()
+    logger.info(f"Compacted {len(parts)} parts of {table} {month}")
+    return len(parts)
@@ -0,0 +1,51 @@
+from datetime import date
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import render
+
+from .exports import DATASETS, FORMATS, export_response, filter_dates
+from .rollups import local_today
+
+
+def _parse_day(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def _can_export(user, dataset):
+    """Exports need view permission on the dataset's model"""
+    opts = DATASETS[dataset][0]._meta
+    return user.has_perm(f'{opts.app_label}.view_{opts.model_name}')
+
+
+@staff_member_required
+def export_data(request):
+    """
+    Export page for orders, order items and shipments. The form submits
+    back here with `dataset`, which streams the download (see orders.exports).
+    Only datasets the user may view are offered or exported.
+    """
+    dataset = request.GET.get('dataset')
+    first_day = _parse_day(request.GET.get('from'))
+    last_day = _parse_day(request.GET.get('to'))
+    export_format = request.GET.get('format', 'csv')
+
+    if dataset in DATASETS and export_format in FORMATS:
+        if not _can_export(request.user, dataset):
+            raise PermissionDenied
+        model = DATASETS[dataset][0]
+        queryset = filter_dates(dataset, model.objects.all(), first_day, last_day)
+        return export_response(dataset, queryset, export_format, compress=bool(request.GET.get('gzip')))
+
+    context = {
+        'datasets': [
+            (name, name.replace('_', ' ').capitalize()) for name in DATASETS if _can_export(request.user, name)
+        ],
+        'formats': [(name, name.upper()) for name in FORMATS],
+        'from': first_day or local_today().replace(day=1),
+        'to': last_day or local_today(),
+    }
+    return render(request, 'admin/order_export.html', context)
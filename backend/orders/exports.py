@@ -0,0 +1,206 @@
+"""
+Streaming CSV / NDJSON exports of orders, order items and shipments for the
+admin (see export_views and the OrderAdmin / ShipmentAdmin actions).
+
+Rows are read with .values_list(...).iterator(), joining the related columns
+in the same query, and written to a StreamingHttpResponse as they arrive,
+optionally gzipped on the fly. Memory stays flat however many rows are
+exported, and the first bytes go out before the query has finished.
+CSV cells that a spreadsheet would evaluate as formulas are prefixed with
+an apostrophe.
+"""
+import csv
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from shipping.models import Shipment
+
+from .models import Order, OrderItem
+from .rollups import day_window, rollup_zone
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+# Bytes collected before a chunk is sent (or handed to the compressor)
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Spreadsheet apps evaluate CSV cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# dataset -> (model, (column, lookup) pairs, date-range lookup)
+DATASETS = {
+    'orders': (Order, (
+        ('order_id', 'id'),
+        ('created_at', 'created_at'),
+        ('first_name', 'first_name'),
+        ('last_name', 'last_name'),
+        ('email', 'email'),
+        ('phone', 'phone'),
+        ('address', 'address'),
+        ('city', 'city'),
+        ('state', 'state'),
+        ('pincode', 'pincode'),
+        ('total', 'total'),
+        ('discount', 'discount'),
+        ('coupon', 'coupon__code'),
+        ('payment_method', 'payment_method'),
+        ('payment_status', 'payment_status'),
+        ('paid', 'paid'),
+        ('payment_id', 'payment_id'),
+        ('stock_status', 'stock_status'),
+        ('awb_number', 'shipment__awb_number'),
+        ('shipment_status', 'shipment__status'),
+    ), 'created_at'),
+    'order_items': (OrderItem, (
+        ('order_id', 'order_id'),
+        ('order_created_at', 'order__created_at'),
+        ('payment_status', 'order__payment_status'),
+        ('product_id', 'product_id'),
+        ('product_name', 'product_name'),
+        ('product_sku', 'product_sku'),
+        ('product_size', 'product_size'),
+        ('price', 'price'),
+        ('quantity', 'quantity'),
+    ), 'order__created_at'),
+    'shipments': (Shipment, (
+        ('order_id', 'order_id'),
+        ('awb_number', 'awb_number'),
+        ('status', 'status'),
+        ('first_name', 'order__first_name'),
+        ('last_name', 'order__last_name'),
+        ('destination_pincode', 'destination_pincode'),
+        ('destination_area', 'destination_area'),
+        ('weight_kg', 'weight_kg'),
+        ('declared_value', 'declared_value'),
+        ('collectible_amount', 'collectible_amount'),
+        ('created_at', 'created_at'),
+        ('shipped_at', 'shipped_at'),
+        ('expected_delivery_date', 'expected_delivery_date'),
+        ('delivered_at', 'delivered_at'),
+    ), 'created_at'),
+}
+
+
+def filter_dates(dataset, queryset, first_day=None, last_day=None):
+    """Limit a dataset's queryset to local days first_day..last_day (inclusive)"""
+    date_lookup = DATASETS[dataset][2]
+    if first_day:
+        queryset = queryset.filter(**{f'{date_lookup}__gte': day_window(first_day)[0]})
+    if last_day:
+        queryset = queryset.filter(**{f'{date_lookup}__lt': day_window(last_day)[1]})
+    return queryset
+
+
+def _value(value, zone):
+    if isinstance(value, datetime):
+        return value.astimezone(zone).isoformat(timespec='seconds')
+    if isinstance(value, (date, Decimal)):
+        return str(value)
+    return value
+
+
+def _csv_cell(value):
+    """A CSV cell, with text that would run as a formula prefixed by an apostrophe"""
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def _csv_lines(columns, rows):
+    class _Echo:
+        def write(self, value):
+            return value
+
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+def _ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n'
+
+
+def _chunked(lines):
+    """Join lines into chunks of about STREAM_CHUNK_BYTES"""
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= STREAM_CHUNK_BYTES:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_rows(dataset, queryset):
+    """
+    Stream a dataset's rows as tuples of export values.
+
+    Args:
+        dataset: Key of DATASETS
+        queryset: Queryset of the dataset's model (filtered by the caller)
+
+    Returns:
+        tuple: (column names, row iterator)
+    """
+    _, columns, _ = DATASETS[dataset]
+    zone = rollup_zone()
+    rows = (
+        queryset.order_by('pk')
+        .values_list(*[lookup for _, lookup in columns])
+        .iterator(chunk_size=settings.ORDER_EXPORT_CHUNK_SIZE)
+    )
+    names = [column for column, _ in columns]
+    return names, (tuple(_value(value, zone) for value in row) for row in rows)
+
+
+def export_response(dataset, queryset, export_format='csv', compress=False):
+    """
+    Build a streaming download of a dataset.
+
+    Args:
+        dataset: Key of DATASETS
+        queryset: Queryset of the dataset's model (filtered by the caller)
+        export_format: Key of FORMATS
+        compress: Gzip the download
+
+    Returns:
+        StreamingHttpResponse
+    """
+    content_type, extension = FORMATS[export_format]
+    columns, rows = export_rows(dataset, queryset)
+    lines = _csv_lines(columns, rows) if export_format == 'csv' else _ndjson_lines(columns, rows)
+    content = _chunked(lines)
+
+    filename = f"{dataset}-{timezone.now().astimezone(rollup_zone()):%Y%m%d-%H%M}.{extension}"
+    if compress:
+        content = _gzipped(content)
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from orders.columnar import TABLES, compact, export, export_months, export_root
+
+
+class Command(BaseCommand):
+    help = 'Exports orders, order items, shipments and tracking events changed since the last run to monthly Parquet files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', action='append', choices=list(TABLES),
+                            help='Export only this table (repeatable, default: all)')
+        parser.add_argument('--full', action='store_true',
+                            help='Ignore the high-water marks and export every row again')
+        parser.add_argument('--compact', action='store_true',
+                            help='Afterwards merge each month into a single file')
+
+    def handle(self, *args, **options):
+        tables = options['table'] or list(TABLES)
+        for table, (rows, months) in export(tables, full=options['full']).items():
+            self.stdout.write(f'{table}: {rows} rows in {len(months)} months')
+
+        if options['compact']:
+            for table in tables:
+                merged = sum(compact(table, month) for month in export_months(table))
+                self.stdout.write(f'{table}: compacted {merged} parts')
+
+        self.stdout.write(self.style.SUCCESS(f'Export written to {export_root()}'))
@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.models import Order
+from orders.rollups import local_today, rebuild, rollup_zone
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily and hourly sales rollups behind the analytics dashboard from the orders table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First day to rebuild (YYYY-MM-DD, default: first order)')
+        parser.add_argument('--days', type=int, help='Rebuild only the last N days')
+
+    def handle(self, *args, **options):
+        last_day = local_today()
+        if options['days']:
+            first_day = last_day - timedelta(days=options['days'] - 1)
+        elif options['since']:
+            try:
+                first_day = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['since']}")
+        else:
+            first_order = Order.objects.order_by('created_at').values_list('created_at', flat=True).first()
+            if first_order is None:
+                self.stdout.write('No orders.')
+                return
+            first_day = first_order.astimezone(rollup_zone()).date()
+
+        counted = rebuild(first_day, last_day)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {first_day} to {last_day}: {counted} completed orders.'))
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_payment_method'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('provider_order_id__isnull', False)), fields=['provider_order_id'], name='order_provider_order_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:45
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_snapshots(apps, schema_editor):
+    """Copy the current product details onto existing order lines"""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('products', 'Product')
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    OrderItem.objects.update(
+        product_name=Subquery(product.values('name')[:1]),
+        product_sku=Subquery(product.values('sku')[:1]),
+        product_image=Subquery(product.values('image_main')[:1]),
+        product_size=Subquery(product.values('size')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_stock_status_stockreservation'),
+        ('products', '0008_product_stock_shards_stockshard_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_image',
+            field=models.ImageField(blank=True, default='', upload_to='products/'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_size',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_sku',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_orderitem_product_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'All orders'), ('product', 'Product'), ('category', 'Category'), ('payment_method', 'Payment method'), ('coupon', 'Coupon'), ('state', 'State')], max_length=20)),
+                ('key', models.CharField(blank=True, default='', max_length=100)),
+                ('label', models.CharField(blank=True, default='', max_length=255)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('period', models.DateField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='in_sales_rollups',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.CreateModel(
+            name='HourlySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'All orders'), ('product', 'Product'), ('category', 'Category'), ('payment_method', 'Payment method'), ('coupon', 'Coupon'), ('state', 'State')], max_length=20)),
+                ('key', models.CharField(blank=True, default='', max_length=100)),
+                ('label', models.CharField(blank=True, default='', max_length=255)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('period', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dimension', 'period'], name='hourly_sales_dimension_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='hourlysalesrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'dimension', 'key'), name='hourly_sales_rollup_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='dailysalesrollup',
+            index=models.Index(fields=['dimension', 'period'], name='daily_sales_dimension_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'dimension', 'key'), name='daily_sales_rollup_uniq'),
+        ),
+    ]
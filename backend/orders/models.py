@@ -31,9 +31,33 @@ class Order(models.Model):
         ('PREPAID', 'Prepaid'),
         ('COD', 'Cash on Delivery'),
     ])
+    # How the order's items count against stock: DEDUCTED once stock has been
+    # taken, RESERVED while a prepaid order holds it (see orders.stock),
+    # RELEASED when the hold expired or the payment failed
+    stock_status = models.CharField(max_length=20, default='DEDUCTED', choices=[
+        ('RESERVED', 'Reserved'),
+        ('DEDUCTED', 'Deducted'),
+        ('RELEASED', 'Released'),
+    ])
+    # Whether the order is currently counted in the sales rollups. Only
+    # orders.rollups writes it, with queryset updates, so save loaded orders
+    # with update_fields to avoid writing back a stale value
+    in_sales_rollups = models.BooleanField(default=False, editable=False)
 
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            # A customer's order history, newest first
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            # Payment callbacks look orders up by the gateway transaction id
+            models.Index(
+                fields=['provider_order_id'],
+                condition=models.Q(provider_order_id__isnull=False),
+                name='order_provider_order_idx',
+            ),
+            # Incremental columnar export (orders.columnar)
+            models.Index(fields=['updated_at'], name='order_updated_idx'),
+        ]
 
     def __str__(self):
         return f'Order {self.id}'
@@ -47,6 +71,96 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=1)
+    # Product as it was at checkout, so order history, emails and the admin
+    # don't read (or change with) the live catalog
+    product_name = models.CharField(max_length=255, blank=True, default='')
+    product_sku = models.CharField(max_length=100, blank=True, default='')
+    product_image = models.ImageField(upload_to='products/', blank=True, default='')
+    product_size = models.CharField(max_length=50, blank=True, default='')
 
     def __str__(self):
         return str(self.id)
+
+    @classmethod
+    def from_product(cls, product, **kwargs):
+        """An order line for a product with its snapshot columns filled in"""
+        return cls(
+            product=product,
+            product_name=product.name,
+            product_sku=product.sku,
+            product_image=product.image_main.name if product.image_main else '',
+            product_size=product.size,
+            **kwargs
+        )
+
+class StockReservation(models.Model):
+    """Stock held for an unpaid prepaid order until it is paid or the hold expires"""
+    order = models.ForeignKey(Order, related_name='reservations', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Active holds per product (available-to-sell) and the expiry sweep
+            models.Index(fields=['product', 'expires_at'], name='reservation_product_exp_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id} for order {self.order_id}'
+
+
+ROLLUP_DIMENSIONS = [
+    ('total', 'All orders'),
+    ('product', 'Product'),
+    ('category', 'Category'),
+    ('payment_method', 'Payment method'),
+    ('coupon', 'Coupon'),
+    ('state', 'State'),
+]
+
+
+class SalesRollup(models.Model):
+    """
+    Sales of completed orders in one period, broken down by one dimension
+    (see orders.rollups). AOV is revenue / orders.
+    """
+    dimension = models.CharField(max_length=20, choices=ROLLUP_DIMENSIONS)
+    key = models.CharField(max_length=100, blank=True, default='')
+    label = models.CharField(max_length=255, blank=True, default='')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average_order_value(self):
+        return self.revenue / self.orders if self.orders else 0
+
+
+class DailySalesRollup(SalesRollup):
+    period = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'dimension', 'key'], name='daily_sales_rollup_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['dimension', 'period'], name='daily_sales_dimension_idx'),
+        ]
+
+
+class HourlySalesRollup(SalesRollup):
+    period = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'dimension', 'key'], name='hourly_sales_rollup_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['dimension', 'period'], name='hourly_sales_dimension_idx'),
+        ]
@@ -0,0 +1,225 @@
+"""
+Sales rollups behind the admin analytics dashboard.
+
+Completed orders (payment_status COMPLETED) are summed into DailySalesRollup
+and HourlySalesRollup rows per period and dimension: all orders, product,
+category, payment method, coupon and state. The dashboard reads only these
+rows, so its cost grows with the number of days shown, not with the number
+of orders. Periods are in SALES_ROLLUP_TIME_ZONE.
+
+An order's contribution is added when it becomes completed and removed when
+it stops being completed or is deleted (orders.signals), and
+Order.in_sales_rollups records whether it is counted. The
+reconcile_sales_rollups task rebuilds recent days from the orders table to
+correct anything the signals can't see (queryset updates, lost tasks); the
+rebuild_sales_rollups command rebuilds any range, and is run once after the
+deploy that introduces the rollups to count earlier orders (see README).
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import DailySalesRollup, HourlySalesRollup, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_METHOD_LABELS = dict(Order._meta.get_field('payment_method').choices)
+
+
+def rollup_zone():
+    return ZoneInfo(settings.SALES_ROLLUP_TIME_ZONE)
+
+
+def local_today():
+    return datetime.now(rollup_zone()).date()
+
+
+def day_window(day):
+    """Aware start and end datetimes of a local day"""
+    start = datetime.combine(day, time.min, tzinfo=rollup_zone())
+    return start, start + timedelta(days=1)
+
+
+def is_counted(order):
+    """Whether an order belongs in the sales rollups"""
+    return order.payment_status == 'COMPLETED'
+
+
+def _order_items(order_ids):
+    """Order id -> item rows (with product category) for several orders, in one query"""
+    items = defaultdict(list)
+    rows = OrderItem.objects.filter(order_id__in=order_ids).values(
+        'order_id', 'product_id', 'product_name', 'price', 'quantity',
+        'product__category_id', 'product__category__name',
+    )
+    for row in rows:
+        items[row['order_id']].append(row)
+    return items
+
+
+def order_contributions(order, items):
+    """
+    What one order adds to the rollups.
+
+    Product and category revenue is the line total less the order's
+    discount, so every dimension adds up to the order totals.
+
+    Args:
+        order: Order with coupon loaded
+        items: Item rows from _order_items
+
+    Returns:
+        list: (dimension, key, label, revenue, orders, units) tuples
+    """
+    units = sum(item['quantity'] for item in items)
+    factor = Decimal(100 - order.discount) / 100
+
+    rows = [
+        ('total', '', 'All orders', order.total, 1, units),
+        ('payment_method', order.payment_method,
+         PAYMENT_METHOD_LABELS.get(order.payment_method, order.payment_method), order.total, 1, units),
+        ('state', order.state.strip().upper(), order.state.strip().title(), order.total, 1, units),
+    ]
+    if order.coupon_id:
+        rows.append(('coupon', str(order.coupon_id), order.coupon.code, order.total, 1, units))
+
+    for dimension, key_field, label_field in (
+        ('product', 'product_id', 'product_name'),
+        ('category', 'product__category_id', 'product__category__name'),
+    ):
+        grouped = {}
+        for item in items:
+            key = str(item[key_field] or '')
+            revenue, quantity, label = grouped.get(key, (Decimal(0), 0, item[label_field] or ''))
+            grouped[key] = (revenue + item['price'] * item['quantity'] * factor, quantity + item['quantity'], label)
+        for key, (revenue, quantity, label) in grouped.items():
+            rows.append((dimension, key, label, revenue.quantize(Decimal('0.01')), 1, quantity))
+    return rows
+
+
+def _periods(order):
+    local = order.created_at.astimezone(rollup_zone())
+    return {
+        DailySalesRollup: local.date(),
+        HourlySalesRollup: local.replace(minute=0, second=0, microsecond=0),
+    }
+
+
+def _apply(order, items, sign):
+    """Add (sign=1) or remove (sign=-1) an order's contribution"""
+    contributions = order_contributions(order, items)
+    for model, period in _periods(order).items():
+        for dimension, key, label, revenue, orders, units in contributions:
+            changes = {
+                'revenue': F('revenue') + revenue * sign,
+                'orders': F('orders') + orders * sign,
+                'units': F('units') + units * sign,
+            }
+            lookup = {'period': period, 'dimension': dimension, 'key': key}
+            if model.objects.filter(**lookup).update(**changes):
+                continue
+            try:
+                with transaction.atomic():
+                    model.objects.create(
+                        label=label, revenue=revenue * sign, orders=orders * sign, units=units * sign, **lookup
+                    )
+            except IntegrityError:
+                # Created by a concurrent order in between
+                model.objects.filter(**lookup).update(**changes)
+
+
+@transaction.atomic
+def sync_order(order_id):
+    """
+    Bring one order's contribution in line with its current state.
+
+    Returns:
+        bool: Whether the rollups changed
+    """
+    order = Order.objects.select_for_update(of=('self',)).select_related('coupon').filter(pk=order_id).first()
+    if order is None:
+        return False
+
+    counted = is_counted(order)
+    if counted == order.in_sales_rollups:
+        return False
+
+    _apply(order, _order_items([order.pk])[order.pk], 1 if counted else -1)
+    Order.objects.filter(pk=order.pk).update(in_sales_rollups=counted)
+    return True
+
+
+def remove_order(order):
+    """Take a counted order out of the rollups (before it is deleted)"""
+    counted = Order.objects.select_for_update().filter(pk=order.pk, in_sales_rollups=True).exists()
+    if counted:
+        _apply(order, _order_items([order.pk])[order.pk], -1)
+
+
+def rebuild_day(day):
+    """
+    Recompute one local day's rollups from its orders.
+
+    Returns:
+        int: Number of completed orders in the day
+    """
+    start, end = day_window(day)
+    with transaction.atomic():
+        # Locked so an order can't be synced while its day is rebuilt
+        orders = list(
+            Order.objects.select_for_update(of=('self',))
+            .select_related('coupon')
+            .filter(created_at__gte=start, created_at__lt=end)
+        )
+        counted = [order for order in orders if is_counted(order)]
+        items = _order_items([order.pk for order in counted])
+
+        totals = defaultdict(lambda: [None, Decimal(0), 0, 0])
+        for order in counted:
+            periods = _periods(order)
+            for dimension, key, label, revenue, order_count, units in order_contributions(order, items[order.pk]):
+                for model, period in periods.items():
+                    row = totals[(model, period, dimension, key)]
+                    row[0] = label
+                    row[1] += revenue
+                    row[2] += order_count
+                    row[3] += units
+
+        DailySalesRollup.objects.filter(period=day).delete()
+        HourlySalesRollup.objects.filter(period__gte=start, period__lt=end).delete()
+        for model in (DailySalesRollup, HourlySalesRollup):
+            model.objects.bulk_create([
+                model(period=period, dimension=dimension, key=key, label=label,
+                      revenue=revenue, orders=order_count, units=units)
+                for (row_model, period, dimension, key), (label, revenue, order_count, units) in totals.items()
+                if row_model is model
+            ])
+
+        counted_ids = [order.pk for order in counted]
+        Order.objects.filter(pk__in=counted_ids).exclude(in_sales_rollups=True).update(in_sales_rollups=True)
+        Order.objects.filter(created_at__gte=start, created_at__lt=end, in_sales_rollups=True).exclude(
+            pk__in=counted_ids
+        ).update(in_sales_rollups=False)
+    return len(counted)
+
+
+def rebuild(first_day, last_day):
+    """
+    Recompute the rollups of every local day in a range (inclusive).
+
+    Returns:
+        int: Number of completed orders counted
+    """
+    counted = 0
+    day = first_day
+    while day <= last_day:
+        counted += rebuild_day(day)
+        day += timedelta(days=1)
+    logger.info(f"Rebuilt sales rollups {first_day} to {last_day}: {counted} orders")
+    return counted
@@ -1,16 +1,16 @@
 from rest_framework import serializers
 from .models import Order, OrderItem
-from products.serializers import ProductSerializer
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
-    product_name = serializers.CharField(source='product.name', read_only=True)
-    product_image = serializers.ImageField(source='product.image_main', read_only=True)
-    
+    """An order line as it was bought (snapshot columns, no catalog reads)"""
+
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'product_name', 'product_image', 'price', 'quantity']
+        fields = [
+            'id', 'product', 'product_name', 'product_sku', 'product_image', 'product_size',
+            'price', 'quantity',
+        ]
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -20,6 +20,8 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = '__all__'
+        # Maintained by orders.stock and orders.rollups only
+        read_only_fields = ['stock_status', 'in_sales_rollups']
     
     def get_shipment(self, obj):
         """Get shipment details if available"""
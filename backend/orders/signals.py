@@ -0,0 +1,38 @@
+"""
+Django signals keeping the sales rollups current (see orders.rollups)
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+import logging
+
+from .models import Order
+from .rollups import remove_order
+
+logger = logging.getLogger(__name__)
+
+
+def queue_rollup_sync(order_id):
+    """Update the rollups for an order via Celery (non-blocking)."""
+    try:
+        from .tasks import sync_order_rollups
+        sync_order_rollups.delay(order_id)
+    except Exception as e:
+        # The next reconciliation picks the order up
+        logger.error(f"Failed to queue sales rollup update for order #{order_id}: {e}")
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, **kwargs):
+    """
+    Count or uncount a saved order once its transaction commits (checkout
+    creates the items after the order).
+    """
+    order_id = instance.pk
+    transaction.on_commit(lambda: queue_rollup_sync(order_id))
+
+
+@receiver(pre_delete, sender=Order)
+def remove_from_sales_rollups(sender, instance, **kwargs):
+    """Take a deleted order out of the rollups while its items still exist"""
+    remove_order(instance)
@@ -0,0 +1,459 @@
+"""
+Stock taking and reservations.
+
+COD orders take stock at checkout. Prepaid orders don't: each item is held
+in StockReservation for STOCK_HOLD_MINUTES while the customer pays.
+- A successful payment turns the holds into a stock decrement
+  (deduct_order_stock)
+- A failed payment releases them (release_order_stock)
+- Holds of abandoned payment sessions expire and are released by the
+  release_expired_reservations task; paying again re-reserves
+  (refresh_order_reservation)
+
+Available-to-sell is stock_quantity minus the quantity held.
+The held quantity per unsharded product is a counter in the shared cache, incremented
+when a hold is placed and decremented when it goes, so product serializers
+and cart checks don't query the reservation table. The counters must be
+shared by every web and worker process (see the orders.E001 deploy check).
+Holds and COD deductions check and move
+stock under the product row locks, so they can't both sell the last unit.
+Counters expire after HELD_COUNTER_TIMEOUT and are rebuilt from the table,
+which bounds any drift.
+
+Stock of sharded products (products.shards) is taken from and returned to
+their shards, and their live shard total is used as the stock. A hold on a
+sharded product takes its quantity out of the shards straight away, so the
+shards' own atomic decrement is the availability check and no counter is
+kept; releasing the hold puts the stock back.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from products.models import Product
+from products.shards import return_to_shards, shard_totals, take_from_shards
+from .models import Order, StockReservation
+
+logger = logging.getLogger(__name__)
+
+HELD_KEY_PREFIX = 'stock:held:'
+HELD_COUNTER_TIMEOUT = 3600
+
+
+class InsufficientStock(ValueError):
+    """Raised when a hold or deduction asks for more than is available"""
+
+    def __init__(self, items):
+        self.items = items
+        super().__init__(f"{items[0]['product']} is now out of stock")
+
+
+def _held_key(product_id):
+    return f"{HELD_KEY_PREFIX}{product_id}"
+
+
+def _held_from_db(product_ids):
+    # Expired holds count until the sweep deletes them, which is also when
+    # their counters are decremented. Holds on sharded products are already
+    # out of the shards
+    rows = (
+        StockReservation.objects
+        .filter(product_id__in=product_ids, product__stock_shards=0)
+        .values('product_id')
+        .annotate(held=Sum('quantity'))
+        .values_list('product_id', 'held')
+    )
+    return dict(rows)
+
+
+def held_quantities(product_ids):
+    """
+    Quantity held by reservations for each product (always 0 for sharded
+    products, whose holds are already taken out of the shards).
+
+    Args:
+        product_ids: Iterable of product ids
+
+    Returns:
+        dict: product id -> held quantity (0 for products without holds)
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return {}
+
+    cached = cache.get_many([_held_key(product_id) for product_id in product_ids])
+    held = {}
+    missing = []
+    for product_id in product_ids:
+        value = cached.get(_held_key(product_id))
+        if value is None:
+            missing.append(product_id)
+        else:
+            held[product_id] = max(value, 0)
+
+    if missing:
+        from_db = _held_from_db(missing)
+        for product_id in missing:
+            held[product_id] = from_db.get(product_id, 0)
+            cache.add(_held_key(product_id), held[product_id], timeout=HELD_COUNTER_TIMEOUT)
+    return held
+
+
+def available_quantities(products):
+    """
+    Available-to-sell for each product (stock minus held quantity).
+
+    Args:
+        products: Product instances with stock_quantity and stock_shards loaded
+
+    Returns:
+        dict: product id -> available quantity
+    """
+    products = list(products)
+    held = held_quantities(product.pk for product in products)
+    sharded = shard_totals(products)
+    return {
+        product.pk: max(sharded.get(product.pk, product.stock_quantity) - held[product.pk], 0)
+        for product in products
+    }
+
+
+def _change_held(quantities, sign):
+    """
+    Add to (sign=1) or take from (sign=-1) the held counters. The reservation
+    table must already reflect the change (in the current transaction or
+    committed), since a missing counter is rebuilt from it.
+    """
+    for product_id, quantity in sorted(quantities.items()):
+        key = _held_key(product_id)
+        try:
+            cache.incr(key, quantity * sign)
+        except ValueError:
+            cache.set(key, _held_from_db([product_id]).get(product_id, 0), timeout=HELD_COUNTER_TIMEOUT)
+
+
+def _release_holds(quantities, restock=True):
+    """
+    Account for deleted holds: give the unsharded products' counters back on
+    commit and return the sharded products' stock to their shards.
+
+    Args:
+        quantities: Dict of product id -> quantity no longer held
+        restock: False when the order is being paid, which keeps the stock
+            its holds took from the shards
+
+    Returns:
+        dict: Sharded product id -> quantity its holds had taken
+    """
+    sharded = _shard_counts(quantities)
+    if restock:
+        for product_id in sorted(sharded):
+            return_to_shards(product_id, sharded[product_id], quantities[product_id])
+    held = {product_id: quantity for product_id, quantity in quantities.items() if product_id not in sharded}
+    if held:
+        transaction.on_commit(lambda: _change_held(held, -1))
+    return {product_id: quantities[product_id] for product_id in sharded}
+
+
+def _update_stock(quantities, sign):
+    """Change the stock of several unsharded products in a single UPDATE"""
+    if not quantities:
+        return 0
+    delta = Case(
+        *[When(pk=product_id, then=Value(quantity * sign)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    return Product.objects.filter(pk__in=list(quantities)).update(
+        stock_quantity=F('stock_quantity') + delta
+    )
+
+
+def _shard_counts(product_ids):
+    """Product id -> stock_shards for the sharded products among product_ids"""
+    return dict(
+        Product.objects.filter(pk__in=list(product_ids), stock_shards__gt=0).values_list('pk', 'stock_shards')
+    )
+
+
+def adjust_stock(quantities, sign):
+    """
+    Change the stock of several products: one UPDATE for unsharded products,
+    a shard update per sharded product. Taking stock never fails; it may
+    leave a product below zero.
+
+    Args:
+        quantities: Dict of product id -> quantity
+        sign: -1 to take stock, 1 to put it back
+    """
+    if not quantities:
+        return
+    sharded = _shard_counts(quantities)
+    for product_id in sorted(sharded):
+        if sign < 0:
+            take_from_shards(product_id, sharded[product_id], quantities[product_id], allow_negative=True)
+        else:
+            return_to_shards(product_id, sharded[product_id], quantities[product_id])
+    _update_stock({
+        product_id: quantity for product_id, quantity in quantities.items() if product_id not in sharded
+    }, sign)
+
+
+def order_quantities(order):
+    """Product id -> total quantity for an order's items"""
+    quantities = {}
+    for product_id, quantity in order.items.values_list('product_id', 'quantity'):
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def _lock_and_check(quantities, sharded):
+    """
+    Lock the unsharded products among quantities in primary-key order (so
+    concurrent checkouts sharing products can't deadlock) and check every
+    product can cover its quantity.
+
+    Returns:
+        list: The locked unsharded products
+
+    Raises:
+        InsufficientStock: If any product can't cover its quantity
+    """
+    locked = list(
+        Product.objects.select_for_update()
+        .filter(pk__in=list(quantities), stock_shards=0)
+        .order_by('pk')
+        .only('id', 'name', 'stock_quantity', 'stock_shards')
+    )
+    available = available_quantities(locked + sharded)
+    short = [
+        {'product': product.name, 'available': available[product.pk], 'requested': quantities[product.pk]}
+        for product in locked + sharded
+        if available[product.pk] < quantities[product.pk]
+    ]
+    if short:
+        raise InsufficientStock(short)
+    return locked
+
+
+def _take_sharded(quantities, sharded):
+    """Take sharded products' quantities from their shards"""
+    for product in sorted(sharded, key=lambda product: product.pk):
+        if not take_from_shards(product.pk, product.stock_shards, quantities[product.pk]):
+            raise InsufficientStock([{'product': product.name, 'available': 0, 'requested': quantities[product.pk]}])
+
+
+def take_stock(quantities, products):
+    """
+    Deduct stock for a COD checkout. Must run inside a transaction.
+
+    Unsharded products are checked and updated under a row lock; sharded
+    products are taken from one shard each without locking the product.
+    Stock held by prepaid orders is not available.
+
+    Args:
+        quantities: Dict of product id -> quantity
+        products: Dict of product id -> Product (with stock_shards loaded)
+
+    Raises:
+        InsufficientStock: If any product can't cover its quantity
+    """
+    sharded = [products[product_id] for product_id in quantities if products[product_id].stock_shards]
+    locked = _lock_and_check(quantities, sharded)
+    _update_stock({product.pk: quantities[product.pk] for product in locked}, -1)
+    _take_sharded(quantities, sharded)
+
+
+def reserve_stock(order, quantities):
+    """
+    Hold stock for a prepaid order. Must run inside a transaction, as its
+    last write.
+
+    Like take_stock, unsharded products are checked under their row locks
+    and sharded products' quantities are taken from their shards, so
+    concurrent holds and COD deductions can't oversell. The held counters
+    of the unsharded products are incremented last, before the transaction
+    commits, so callers that write anything after this undo them with
+    unreserve_counters() if the transaction rolls back.
+
+    Returns:
+        dict: Product id -> quantity added to the held counters
+
+    Raises:
+        InsufficientStock: If any product can't cover its quantity
+    """
+    sharded = list(
+        Product.objects.filter(pk__in=list(quantities), stock_shards__gt=0)
+        .only('id', 'name', 'stock_quantity', 'stock_shards')
+    )
+    locked = _lock_and_check(quantities, sharded)
+    _take_sharded(quantities, sharded)
+
+    expires_at = timezone.now() + timedelta(minutes=settings.STOCK_HOLD_MINUTES)
+    StockReservation.objects.bulk_create([
+        StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in quantities.items()
+    ])
+    if order.stock_status != 'RESERVED':
+        _set_stock_status(order, 'RESERVED')
+    held = {product.pk: quantities[product.pk] for product in locked}
+    _change_held(held, 1)
+    return held
+
+
+def unreserve_counters(held):
+    """Give back held counters taken by reserve_stock() in a rolled back transaction"""
+    _change_held(held, -1)
+
+
+def reset_held_counters(product_ids):
+    """Drop held counters so they are rebuilt from the table (e.g. after sharding a product)"""
+    cache.delete_many([_held_key(product_id) for product_id in product_ids])
+
+
+def _drop_reservations(order, restock=True):
+    """
+    Delete an order's holds and release them (see _release_holds).
+
+    Returns:
+        dict: Sharded product id -> quantity its holds had taken
+    """
+    # Locking the rows waits out a sweep releasing the same holds, so they
+    # are not given back twice
+    holds = list(
+        StockReservation.objects.select_for_update()
+        .filter(order=order)
+        .values_list('pk', 'product_id', 'quantity')
+    )
+    quantities = {}
+    for _, product_id, quantity in holds:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+    StockReservation.objects.filter(pk__in=[hold[0] for hold in holds]).delete()
+    return _release_holds(quantities, restock=restock)
+
+
+def _lock_order(order):
+    """Re-read an order's stock status under a row lock"""
+    order.stock_status = Order.objects.select_for_update().values_list(
+        'stock_status', flat=True
+    ).get(pk=order.pk)
+    return order.stock_status
+
+
+def _set_stock_status(order, stock_status):
+    order.stock_status = stock_status
+    Order.objects.filter(pk=order.pk).update(stock_status=stock_status, updated_at=timezone.now())
+
+
+@transaction.atomic
+def refresh_order_reservation(order):
+    """
+    Make sure an unpaid prepaid order holds its stock before the customer is
+    sent to pay again: extend active holds, or reserve again if they were
+    released.
+
+    Raises:
+        InsufficientStock: If released stock is no longer available
+    """
+    stock_status = _lock_order(order)
+    if stock_status == 'RESERVED':
+        expires_at = timezone.now() + timedelta(minutes=settings.STOCK_HOLD_MINUTES)
+        if StockReservation.objects.filter(order=order).update(expires_at=expires_at):
+            return
+    elif stock_status != 'RELEASED':
+        return
+
+    _drop_reservations(order)
+    reserve_stock(order, order_quantities(order))
+
+
+@transaction.atomic
+def deduct_order_stock(order):
+    """
+    Take stock for a paid order, turning its holds into a deduction.
+
+    Stock is taken even if the holds had already expired, since the customer
+    has paid; the product may then go below zero, which is logged. Holds on
+    sharded products already took their stock, so that part is kept.
+    """
+    stock_status = _lock_order(order)
+    if stock_status == 'DEDUCTED':
+        return
+
+    if stock_status == 'RELEASED':
+        logger.warning(f"Order #{order.id} was paid after its stock hold was released; deducting anyway")
+
+    quantities = order_quantities(order)
+    taken = _drop_reservations(order, restock=False)
+    adjust_stock({
+        product_id: quantity - taken.get(product_id, 0)
+        for product_id, quantity in quantities.items()
+        if quantity > taken.get(product_id, 0)
+    }, -1)
+    _set_stock_status(order, 'DEDUCTED')
+
+    oversold = Product.objects.filter(pk__in=list(quantities), stock_quantity__lt=0).values_list('name', flat=True)
+    for name in oversold:
+        logger.warning(f"{name} oversold by order #{order.id}")
+
+
+@transaction.atomic
+def release_order_stock(order):
+    """
+    Give back what a failed order counts against stock: release its holds,
+    or restore stock it already took.
+    """
+    stock_status = _lock_order(order)
+    if stock_status == 'RESERVED':
+        _drop_reservations(order)
+    elif stock_status == 'DEDUCTED':
+        adjust_stock(order_quantities(order), 1)
+        logger.info(f"Stock restored for order #{order.id}")
+    else:
+        return
+    _set_stock_status(order, 'RELEASED')
+
+
+def release_expired_reservations(batch_size=500):
+    """
+    Delete expired holds and mark orders left without holds as released.
+
+    Orders are locked before their holds, in the same order as the payment
+    paths (_lock_order, then _drop_reservations), so the two can't
+    deadlock; orders locked by a payment in progress are skipped.
+
+    Returns:
+        int: Number of holds released
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            order_ids = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(pk__in=StockReservation.objects.filter(expires_at__lte=now).values('order_id'))
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                return released
+
+            expired = list(
+                StockReservation.objects.select_for_update()
+                .filter(order_id__in=order_ids, expires_at__lte=now)
+                .values_list('pk', 'product_id', 'quantity')
+            )
+            quantities = {}
+            for _, product_id, quantity in expired:
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+            StockReservation.objects.filter(pk__in=[row[0] for row in expired]).delete()
+            Order.objects.filter(pk__in=order_ids, stock_status='RESERVED').exclude(
+                reservations__isnull=False
+            ).update(stock_status='RELEASED', updated_at=timezone.now())
+            _release_holds(quantities)
+            released += len(expired)
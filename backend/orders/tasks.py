@@ -0,0 +1,67 @@
+"""
+Celery tasks for orders
+"""
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def release_expired_reservations():
+    """
+    Release stock held by prepaid orders whose payment was not completed in
+    time (see orders.stock).
+    
+    Scheduled via Celery Beat: Every minute.
+    """
+    from .stock import release_expired_reservations as release
+    
+    released = release()
+    if released:
+        logger.info(f"Released {released} expired stock holds")
+    return released
+
+
+@shared_task(max_retries=3, default_retry_delay=60)
+def sync_order_rollups(order_id):
+    """Add or remove one order's contribution to the sales rollups."""
+    from .rollups import sync_order
+    
+    return sync_order(order_id)
+
+
+@shared_task
+def reconcile_sales_rollups():
+    """
+    Rebuild the sales rollups of the last SALES_ROLLUP_RECONCILE_DAYS days
+    from the orders table, correcting anything the signals missed.
+    
+    Scheduled via Celery Beat: Every hour.
+    """
+    from datetime import timedelta
+    from django.conf import settings
+    from .rollups import local_today, rebuild
+    
+    today = local_today()
+    return rebuild(today - timedelta(days=settings.SALES_ROLLUP_RECONCILE_DAYS - 1), today)
+
+
+@shared_task
+def export_orders_columnar():
+    """
+    Write orders, items, shipments and tracking events changed since the
+    last run to the monthly Parquet files (see orders.columnar), compacting
+    months that have collected many parts.
+    
+    Scheduled via Celery Beat: Every hour.
+    """
+    from .columnar import COMPACT_AFTER_PARTS, compact, export, month_parts
+    
+    written = {}
+    for table, (rows, months) in export().items():
+        written[table] = rows
+        for month in months:
+            if len(month_parts(table, month)) > COMPACT_AFTER_PARTS:
+                compact(table, month)
+    return written
@@ -0,0 +1,837 @@
+import csv
+import json
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipIf
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core import mail
+from django.core.cache import cache
+from django.core.checks import run_checks
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.pagination import CursorPagination
+from rest_framework.test import APIClient
+
+from accounts.email_service import send_order_confirmation_email
+from cart.models import Cart, CartItem
+from coupons.models import Coupon
+from orders import columnar
+from orders.checks import check_held_counter_cache
+from orders.models import DailySalesRollup, HourlySalesRollup, Order, OrderItem, StockReservation
+from orders.rollups import rollup_zone, sync_order
+from orders.stock import (
+    InsufficientStock, available_quantities, deduct_order_stock, held_quantities,
+    release_expired_reservations, release_order_stock, reserve_stock, take_stock,
+)
+from products.models import Product
+from products.shards import shard_stock, shard_totals
+from shipping.models import Shipment
+
+try:
+    import pandas
+    import pyarrow
+except ImportError:
+    pandas = pyarrow = None
+from products.tests import make_product
+
+
+def make_user(username='asha', **fields):
+    return get_user_model().objects.create_user(
+        username=username, email=f'{username}@example.com', password='pw', **fields
+    )
+
+
+def make_order(user, products, quantity=1, **fields):
+    """Order with one line per product, as checkout writes it"""
+    fields.setdefault('total', sum(product.price for product in products) * quantity)
+    order = Order.objects.create(user=user, **{
+        'first_name': 'Asha', 'last_name': 'Rao', 'email': 'asha@example.com', 'phone': '9999999999',
+        'address': '12 MG Road', 'city': 'Bengaluru', 'state': 'Karnataka', 'pincode': '560001', **fields,
+    })
+    OrderItem.objects.bulk_create([
+        OrderItem.from_product(product, order=order, price=product.price, quantity=quantity)
+        for product in products
+    ])
+    return order
+
+
+class OrderCursorPaginationTests(TestCase):
+    url = '/api/orders/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        product = make_product('Foaming Face Wash')
+        self.orders = [make_order(self.user, [product]) for _ in range(5)]
+        make_order(make_user('ravi'), [product])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_pages_list_the_users_orders_newest_first(self):
+        order_ids = []
+        with mock.patch.object(CursorPagination, 'page_size', 2):
+            data = self.client.get(self.url, {'pagination': 'cursor'}).json()
+            while True:
+                self.assertNotIn('count', data)
+                self.assertLessEqual(len(data['results']), 2)
+                order_ids += [order['id'] for order in data['results']]
+                if not data['next']:
+                    break
+                data = self.client.get(data['next']).json()
+
+        self.assertEqual(order_ids, [order.pk for order in reversed(self.orders)])
+
+    def test_page_numbers_stay_the_default(self):
+        data = self.client.get(self.url).json()
+
+        self.assertEqual(data['count'], 5)
+
+
+class OrderHistoryTests(TestCase):
+    url = '/api/orders/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.products = [make_product(f'Serum {index}') for index in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_orders(self, count):
+        for _ in range(count):
+            order = make_order(self.user, self.products)
+            Shipment.objects.create(
+                order=order, awb_number=f'AWB{order.pk}', destination_pincode='560001',
+                weight_kg=Decimal('0.50'), declared_value=order.total,
+            )
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), [query['sql'] for query in queries]
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self.add_orders(2)
+        _, few = self.list_queries()
+        self.add_orders(6)
+        data, many = self.list_queries()
+
+        self.assertEqual(len(data['results']), 8)
+        self.assertEqual(len(few), len(many))
+
+    def test_history_does_not_read_the_catalog(self):
+        self.add_orders(2)
+
+        data, queries = self.list_queries()
+
+        self.assertFalse([sql for sql in queries if 'products_product' in sql])
+        order = data['results'][0]
+        self.assertEqual([item['product_name'] for item in order['items']], [p.name for p in self.products])
+        self.assertEqual(order['shipment']['awb_number'], f"AWB{order['id']}")
+
+    def test_order_detail_loads_in_two_queries(self):
+        self.add_orders(1)
+        order = Order.objects.get()
+
+        with self.assertNumQueries(2):
+            response = self.client.get(f'{self.url}{order.pk}/')
+
+        self.assertEqual(len(response.json()['items']), 3)
+
+
+class OrderItemSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.product = make_product('Vitamin C Serum', sku='VC-30', size='30 ml', image_main='products/vc.jpg')
+        self.order = make_order(self.user, [self.product])
+        Product.objects.filter(pk=self.product.pk).update(name='Vitamin C Serum (New)', sku='VC-30N', size='50 ml')
+
+    def test_lines_keep_the_product_as_it_was_bought(self):
+        item = OrderItem.objects.get()
+
+        self.assertEqual(
+            (item.product_name, item.product_sku, item.product_size, item.product_image.name),
+            ('Vitamin C Serum', 'VC-30', '30 ml', 'products/vc.jpg'),
+        )
+
+    def test_order_history_shows_the_snapshot(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        item = client.get(f'/api/orders/{self.order.pk}/').json()['items'][0]
+
+        self.assertEqual((item['product_name'], item['product_sku']), ('Vitamin C Serum', 'VC-30'))
+        self.assertTrue(item['product_image'].endswith('products/vc.jpg'))
+
+    def test_confirmation_email_does_not_read_the_catalog(self):
+        order = Order.objects.get()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(send_order_confirmation_email(order))
+
+        self.assertFalse([query for query in queries if 'products_product' in query['sql']])
+        self.assertIn('Vitamin C Serum', mail.outbox[0].alternatives[0][0])
+        self.assertNotIn('(New)', mail.outbox[0].alternatives[0][0])
+
+
+@override_settings(CART_STORE='database')
+@mock.patch('shipping.signals.generate_shipment_for_order')
+@mock.patch('orders.views.send_order_email_async')
+class CheckoutTests(TestCase):
+    url = '/api/orders/'
+    shipping_info = {
+        'first_name': 'Asha', 'last_name': 'Rao', 'email': 'asha@example.com', 'phone': '9999999999',
+        'address': '12 MG Road', 'city': 'Bengaluru', 'state': 'Karnataka', 'pincode': '560001',
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.cart = Cart.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, count, quantity=2, stock=10):
+        start = Product.objects.count()
+        products = [make_product(f'Serum {index}', stock_quantity=stock) for index in range(start, start + count)]
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=quantity) for product in products
+        ])
+        return products
+
+    def checkout(self, payment_method='COD', **data):
+        return self.client.post(
+            self.url, {'shipping_info': self.shipping_info, 'payment_method': payment_method, **data},
+            format='json',
+        )
+
+    def checkout_queries(self, count):
+        self.cart.items.all().delete()
+        self.fill_cart(count)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_the_cart(self, *_):
+        self.assertEqual(self.checkout_queries(1), self.checkout_queries(4))
+
+    def test_cod_order_takes_stock_and_empties_the_cart(self, send_email, _):
+        products = self.fill_cart(3)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual((order.payment_status, order.stock_status), ('COMPLETED', 'DEDUCTED'))
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in products]).values_list('stock_quantity', flat=True)),
+            [8, 8, 8],
+        )
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertFalse(self.cart.items.exists())
+        send_email.assert_called_once_with(order.pk)
+
+    def test_prepaid_order_holds_stock(self, *_):
+        products = self.fill_cart(2)
+
+        response = self.checkout('PREPAID')
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual((order.payment_status, order.stock_status), ('PENDING', 'RESERVED'))
+        self.assertEqual(
+            dict(StockReservation.objects.filter(order=order).values_list('product_id', 'quantity')),
+            {product.pk: 2 for product in products},
+        )
+        self.assertEqual(Product.objects.get(pk=products[0].pk).stock_quantity, 10)
+        self.assertEqual(held_quantities([product.pk for product in products]), {product.pk: 2 for product in products})
+
+    def test_coupon_is_applied_and_counted(self, *_):
+        self.fill_cart(1)
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code='GLOW10', valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1),
+            discount=10, active=True,
+        )
+
+        response = self.checkout(coupon_code='glow10')
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual((order.coupon, order.total), (coupon, Decimal('898.20')))
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.used_count, 1)
+
+    def test_short_stock_is_rejected_without_writing(self, *_):
+        products = self.fill_cart(2, quantity=3, stock=2)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [item['product'] for item in response.json()['items']], [product.name for product in products]
+        )
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+        self.assertEqual(Product.objects.get(pk=products[0].pk).stock_quantity, 2)
+
+    def test_stock_held_by_prepaid_orders_is_not_for_sale(self, *_):
+        product = make_product('Night Cream', stock_quantity=3)
+        other = make_order(make_user('ravi'), [product], quantity=2, payment_method='PREPAID', stock_status='RESERVED')
+        with transaction.atomic():
+            reserve_stock(other, {product.pk: 2})
+        CartItem.objects.create(cart=self.cart, product=product, quantity=2)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['items'][0]['available'], 1)
+
+
+class HeldStockTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = make_product('Night Cream', stock_quantity=5)
+        self.order = make_order(make_user(), [self.product], quantity=2, payment_method='PREPAID', stock_status='RESERVED')
+
+    def reserve(self, order, quantity):
+        with transaction.atomic():
+            reserve_stock(order, {self.product.pk: quantity})
+
+    def test_reserving_more_than_is_available_fails(self):
+        self.reserve(self.order, 4)
+        other = make_order(make_user('ravi'), [self.product], payment_method='PREPAID', stock_status='RESERVED')
+
+        with self.assertRaises(InsufficientStock) as raised:
+            self.reserve(other, 2)
+
+        self.assertEqual(raised.exception.items[0]['available'], 1)
+        self.assertFalse(StockReservation.objects.filter(order=other).exists())
+        self.assertEqual(held_quantities([self.product.pk]), {self.product.pk: 4})
+
+    def test_counters_are_rebuilt_from_the_reservations(self):
+        self.reserve(self.order, 2)
+        cache.clear()
+
+        self.assertEqual(held_quantities([self.product.pk]), {self.product.pk: 2})
+        cache.clear()
+        other = make_order(make_user('ravi'), [self.product], payment_method='PREPAID', stock_status='RESERVED')
+        self.reserve(other, 1)
+        self.assertEqual(held_quantities([self.product.pk]), {self.product.pk: 3})
+
+    def test_sweeper_releases_expired_holds(self):
+        self.reserve(self.order, 2)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            released = release_expired_reservations()
+
+        self.assertEqual(released, 1)
+        self.assertFalse(StockReservation.objects.exists())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.stock_status, 'RELEASED')
+        self.assertEqual(held_quantities([self.product.pk]), {self.product.pk: 0})
+
+    def test_paying_turns_the_hold_into_a_deduction(self):
+        self.reserve(self.order, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deduct_order_stock(self.order)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 3)
+        self.assertEqual(held_quantities([self.product.pk]), {self.product.pk: 0})
+
+    def test_customers_cannot_change_the_stock_status(self):
+        self.reserve(self.order, 2)
+        client = APIClient()
+        client.force_authenticate(self.order.user)
+
+        response = client.patch(
+            f'/api/orders/{self.order.pk}/', {'stock_status': 'DEDUCTED', 'in_sales_rollups': True}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.stock_status, self.order.in_sales_rollups), ('RESERVED', False))
+
+    def test_deploy_check_refuses_a_per_process_cache(self):
+        errors = check_held_counter_cache(None)
+
+        self.assertEqual([error.id for error in errors], ['orders.E001'])
+        self.assertIn(errors[0], run_checks(include_deployment_checks=True, tags=['caches']))
+        self.assertNotIn(errors[0], run_checks(tags=['caches']))
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/1',
+    }})
+    def test_deploy_check_accepts_a_shared_cache(self):
+        self.assertEqual(check_held_counter_cache(None), [])
+
+
+class ShardedHeldStockTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = make_product('Night Cream', stock_quantity=6)
+        shard_stock(self.product, 3)
+        self.order = make_order(make_user(), [self.product], quantity=2, payment_method='PREPAID', stock_status='RESERVED')
+
+    def shard_total(self):
+        return shard_totals([self.product])[self.product.pk]
+
+    def reserve(self):
+        with transaction.atomic():
+            return reserve_stock(self.order, {self.product.pk: 2})
+
+    def test_hold_takes_stock_from_the_shards(self):
+        self.assertEqual(self.reserve(), {})
+
+        self.assertEqual(self.shard_total(), 4)
+        self.assertEqual(held_quantities([self.product.pk]), {self.product.pk: 0})
+        self.assertEqual(available_quantities([self.product]), {self.product.pk: 4})
+
+    def test_hold_cannot_take_more_than_the_shards_have(self):
+        with self.assertRaises(InsufficientStock):
+            with transaction.atomic():
+                reserve_stock(self.order, {self.product.pk: 7})
+
+        self.assertEqual(self.shard_total(), 6)
+
+    def test_failed_payment_returns_the_stock(self):
+        self.reserve()
+
+        release_order_stock(self.order)
+
+        self.assertEqual(self.shard_total(), 6)
+
+    def test_paying_keeps_the_stock_the_hold_took(self):
+        self.reserve()
+
+        deduct_order_stock(self.order)
+
+        self.assertEqual(self.shard_total(), 4)
+
+    def test_paying_after_the_hold_expired_takes_the_stock_again(self):
+        self.reserve()
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        release_expired_reservations()
+        self.assertEqual(self.shard_total(), 6)
+        deduct_order_stock(self.order)
+
+        self.assertEqual(self.shard_total(), 4)
+
+    def test_sharding_and_merging_keep_held_units_out_of_the_shards(self):
+        product = make_product('Day Cream', stock_quantity=10)
+        order = make_order(make_user('ravi'), [product], quantity=3, payment_method='PREPAID', stock_status='RESERVED')
+        with transaction.atomic():
+            reserve_stock(order, {product.pk: 3})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            shard_stock(product, 4)
+        self.assertEqual((shard_totals([product])[product.pk], product.stock_quantity), (7, 7))
+        self.assertEqual(available_quantities([product]), {product.pk: 7})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            shard_stock(product, 0)
+        self.assertEqual(product.stock_quantity, 10)
+        self.assertEqual(available_quantities([product]), {product.pk: 7})
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentHeldStockTests(TransactionTestCase):
+    """Holds and COD deductions racing for the last units"""
+
+    def setUp(self):
+        cache.clear()
+        rollup_sync = mock.patch('orders.signals.queue_rollup_sync')
+        rollup_sync.start()
+        self.addCleanup(rollup_sync.stop)
+        self.product = make_product('Night Cream', stock_quantity=1)
+        self.order = make_order(make_user(), [self.product], payment_method='PREPAID', stock_status='RESERVED')
+
+    def race(self, *steps):
+        """Run each step in its own thread and transaction; returns which raised InsufficientStock"""
+        barrier = threading.Barrier(len(steps))
+        outcomes = [None] * len(steps)
+
+        def run(index, step):
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    step()
+                outcomes[index] = 'ok'
+            except InsufficientStock:
+                outcomes[index] = 'short'
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(index, step)) for index, step in enumerate(steps)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(outcomes)
+
+    def test_hold_and_cod_checkout_cannot_both_take_the_last_unit(self):
+        quantities = {self.product.pk: 1}
+        outcomes = self.race(
+            lambda: reserve_stock(self.order, quantities),
+            lambda: take_stock(quantities, {self.product.pk: self.product}),
+        )
+
+        self.assertEqual(outcomes, ['ok', 'short'])
+        self.product.refresh_from_db()
+        held = held_quantities([self.product.pk])[self.product.pk]
+        self.assertEqual(self.product.stock_quantity - held, 0)
+
+    def test_sweeper_skips_orders_locked_by_a_payment(self):
+        with transaction.atomic():
+            reserve_stock(self.order, {self.product.pk: 1})
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        locked, done = threading.Event(), threading.Event()
+
+        def pay():
+            try:
+                with transaction.atomic():
+                    Order.objects.select_for_update().get(pk=self.order.pk)
+                    locked.set()
+                    done.wait(10)
+            finally:
+                connection.close()
+
+        payment = threading.Thread(target=pay)
+        payment.start()
+        locked.wait(10)
+        outcome = []
+        sweep = threading.Thread(target=lambda: (outcome.append(release_expired_reservations()), connection.close()))
+        sweep.start()
+        sweep.join(5)
+        swept_while_locked = not sweep.is_alive()
+        done.set()
+        payment.join()
+        sweep.join()
+
+        self.assertTrue(swept_while_locked)
+        self.assertEqual(outcome, [0])
+        self.assertEqual(release_expired_reservations(), 1)
+
+    def test_two_holds_cannot_both_take_the_last_unit(self):
+        other = make_order(make_user('ravi'), [self.product], payment_method='PREPAID', stock_status='RESERVED')
+        outcomes = self.race(
+            lambda: reserve_stock(self.order, {self.product.pk: 1}),
+            lambda: reserve_stock(other, {self.product.pk: 1}),
+        )
+
+        self.assertEqual(outcomes, ['ok', 'short'])
+        self.assertEqual(StockReservation.objects.count(), 1)
+        self.assertEqual(held_quantities([self.product.pk]), {self.product.pk: 1})
+
+    def test_holds_and_cod_checkouts_cannot_oversell_a_sharded_product(self):
+        self.product.stock_quantity = 2
+        self.product.save()
+        shard_stock(self.product, 2)
+        orders = [
+            make_order(make_user(f'buyer{index}'), [self.product], payment_method='PREPAID', stock_status='RESERVED')
+            for index in range(2)
+        ]
+        quantities = {self.product.pk: 1}
+        outcomes = self.race(
+            lambda: take_stock(quantities, {self.product.pk: self.product}),
+            lambda: reserve_stock(orders[0], quantities),
+            lambda: reserve_stock(orders[1], quantities),
+        )
+
+        self.assertEqual(outcomes, ['ok', 'ok', 'short'])
+        self.assertEqual(shard_totals([self.product])[self.product.pk], 0)
+
+
+@mock.patch('orders.signals.queue_rollup_sync')
+@mock.patch('shipping.signals.generate_shipment_for_order')
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.products = [make_product('Night Cream'), make_product('Day Cream', price=Decimal('299.00'))]
+
+    def completed_order(self, **fields):
+        order = make_order(self.user, self.products, quantity=2, payment_status='COMPLETED', **fields)
+        sync_order(order.pk)
+        return order
+
+    def totals(self, model=DailySalesRollup, dimension='total'):
+        return {
+            row.key: (row.revenue, row.orders, row.units)
+            for row in model.objects.filter(dimension=dimension)
+        }
+
+    def test_completed_orders_are_counted_in_every_dimension(self, *_):
+        self.completed_order(state=' karnataka ')
+
+        self.assertEqual(self.totals(), {'': (Decimal('1596.00'), 1, 4)})
+        self.assertEqual(self.totals(HourlySalesRollup), {'': (Decimal('1596.00'), 1, 4)})
+        self.assertEqual(self.totals(dimension='state'), {'KARNATAKA': (Decimal('1596.00'), 1, 4)})
+        self.assertEqual(self.totals(dimension='product'), {
+            str(self.products[0].pk): (Decimal('998.00'), 1, 2),
+            str(self.products[1].pk): (Decimal('598.00'), 1, 2),
+        })
+
+    def test_pending_orders_are_not_counted(self, *_):
+        order = make_order(self.user, self.products)
+
+        self.assertFalse(sync_order(order.pk))
+        self.assertEqual(self.totals(), {})
+
+    def test_failed_payment_takes_the_order_out(self, *_):
+        order = self.completed_order()
+        order.payment_status = 'FAILED'
+        order.save(update_fields=['payment_status', 'updated_at'])
+
+        self.assertTrue(sync_order(order.pk))
+        self.assertEqual(self.totals(), {'': (Decimal('0.00'), 0, 0)})
+
+    def test_saving_a_loaded_order_keeps_the_rollup_flag(self, *_):
+        order = Order.objects.get(pk=make_order(self.user, self.products, payment_status='COMPLETED').pk)
+        sync_order(order.pk)
+
+        order.payment_id = 'T1'
+        order.save(update_fields=['payment_id', 'updated_at'])
+
+        self.assertTrue(Order.objects.get(pk=order.pk).in_sales_rollups)
+        self.assertFalse(sync_order(order.pk))
+        self.assertEqual(self.totals()[''][1], 1)
+
+    def test_api_updates_keep_the_rollups_correct(self, *_):
+        order = self.completed_order()  # loaded before the sync counted it
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with mock.patch('orders.views.OrderViewSet.get_object', return_value=order):
+            response = client.patch(f'/api/orders/{order.pk}/', {'phone': '8888888888'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        order = Order.objects.get(pk=order.pk)
+        self.assertEqual((order.phone, order.in_sales_rollups), ('8888888888', True))
+        self.assertFalse(sync_order(order.pk))
+        self.assertEqual(self.totals()[''][1], 1)
+
+    def test_saving_queues_a_sync_on_commit(self, _, queue_rollup_sync):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = make_order(self.user, self.products)
+
+        queue_rollup_sync.assert_called_with(order.pk)
+
+    def test_deleting_a_counted_order_takes_it_out(self, *_):
+        self.completed_order().delete()
+
+        self.assertEqual(self.totals(), {'': (Decimal('0.00'), 0, 0)})
+
+    def test_rebuild_command_recomputes_the_rollups(self, *_):
+        self.completed_order()
+        self.completed_order(discount=10)
+        make_order(self.user, self.products)
+        expected = {dimension: self.totals(dimension=dimension) for dimension in ('total', 'product', 'category')}
+        DailySalesRollup.objects.all().delete()
+        HourlySalesRollup.objects.all().delete()
+        Order.objects.update(in_sales_rollups=False)
+
+        out = StringIO()
+        call_command('rebuild_sales_rollups', stdout=out)
+
+        self.assertIn('2 completed orders', out.getvalue())
+        for dimension, totals in expected.items():
+            self.assertEqual(self.totals(dimension=dimension), totals)
+        self.assertEqual(Order.objects.filter(in_sales_rollups=True).count(), 2)
+
+    def test_rebuild_command_rejects_a_bad_date(self, *_):
+        with self.assertRaises(CommandError):
+            call_command('rebuild_sales_rollups', since='yesterday', stdout=StringIO())
+
+    def test_dashboard_labels_completed_sales(self, *_):
+        self.completed_order()
+        staff = make_user('admin', is_staff=True)
+        self.client.force_login(staff)
+
+        response = self.client.get('/admin/orders/analytics/')
+
+        self.assertContains(response, 'Completed Sales')
+        self.assertEqual(response.context['total_sales'], Decimal('1596.00'))
+
+
+@skipIf(pyarrow is None or pandas is None, 'pyarrow and pandas are not installed')
+class ColumnarExportTests(TestCase):
+    def setUp(self):
+        export_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(export_dir.cleanup)
+        settings_override = override_settings(ORDER_EXPORT_DIR=export_dir.name, ORDER_EXPORT_CHUNK_SIZE=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = make_user()
+        self.product = make_product('Night Cream')
+        self.orders = [make_order(self.user, [self.product]) for _ in range(3)]
+
+    def export(self, table='orders', **kwargs):
+        return columnar.export_table(table, until=timezone.now(), **kwargs)
+
+    def this_month(self):
+        return timezone.now().astimezone(rollup_zone()).strftime('%Y-%m')
+
+    def test_exports_rows_up_to_the_watermark(self):
+        rows, months = self.export()
+
+        self.assertEqual((rows, months), (3, [self.this_month()]))
+        frame = columnar.read_export('orders')
+        self.assertEqual(sorted(frame['id']), [order.pk for order in self.orders])
+        self.assertNotIn('first_name', frame.columns)
+        self.assertIsNotNone(columnar.read_watermark('orders'))
+
+    def test_rows_changed_after_the_run_are_left_for_the_next(self):
+        until = timezone.now()
+        make_order(self.user, [self.product])
+
+        rows, _ = columnar.export_table('orders', until=until - timedelta(microseconds=1))
+
+        self.assertEqual(rows, 3)
+
+    def test_next_run_exports_only_changed_rows(self):
+        self.export()
+        self.assertEqual(self.export(), (0, []))
+
+        order = self.orders[0]
+        order.payment_status = 'FAILED'
+        order.save(update_fields=['payment_status', 'updated_at'])
+        rows, _ = self.export()
+
+        self.assertEqual(rows, 1)
+        self.assertEqual(len(columnar.month_parts('orders', self.this_month())), 2)
+
+    def test_reads_keep_the_newest_version_of_a_row(self):
+        self.export()
+        order = self.orders[0]
+        order.payment_status = 'FAILED'
+        order.save(update_fields=['payment_status', 'updated_at'])
+        self.export()
+
+        frame = columnar.read_export('orders')
+
+        self.assertEqual(len(frame), 3)
+        self.assertEqual(frame.set_index('id').loc[order.pk, 'payment_status'], 'FAILED')
+
+    def test_compaction_merges_a_month_into_one_part(self):
+        self.export()
+        order = self.orders[0]
+        order.payment_status = 'FAILED'
+        order.save(update_fields=['payment_status', 'updated_at'])
+        self.export()
+        parts = columnar.month_parts('orders', self.this_month())
+
+        merged = columnar.compact('orders', self.this_month())
+
+        self.assertEqual(merged, 2)
+        self.assertEqual(columnar.month_parts('orders', self.this_month()), parts[-1:])
+        frame = columnar.read_export('orders')
+        self.assertEqual(len(frame), 3)
+        self.assertEqual(frame.set_index('id').loc[order.pk, 'payment_status'], 'FAILED')
+        self.assertEqual(columnar.compact('orders', self.this_month()), 0)
+
+    def test_rows_are_split_by_the_month_they_were_created(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(created_at=timezone.now() - timedelta(days=62))
+
+        _, months = self.export()
+        _, item_months = self.export('order_items')
+
+        self.assertEqual(len(months), 2)
+        self.assertEqual(item_months, months)
+        self.assertEqual(len(columnar.read_export('order_items', first_month=months[1])), 2)
+
+    def test_full_export_ignores_the_watermark(self):
+        self.export()
+
+        self.assertEqual(self.export(full=True)[0], 3)
+
+    def test_failed_run_leaves_no_parts_and_keeps_the_watermark(self):
+        self.export()
+        watermark = columnar.read_watermark('orders')
+        Order.objects.update(payment_status='FAILED', updated_at=timezone.now())
+
+        with mock.patch.object(columnar._PartWriter, 'close', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.export()
+
+        self.assertEqual(columnar.read_watermark('orders'), watermark)
+        month_dir = columnar.export_root() / 'orders' / f'month={self.this_month()}'
+        self.assertEqual([path.name.startswith('part-') for path in month_dir.iterdir()], [True])
+
+    def test_command_exports_and_compacts(self):
+        with mock.patch.object(columnar, 'EXPORT_SETTLE', timedelta(0)):
+            call_command('export_orders_columnar', '--table', 'orders', stdout=StringIO())
+            Order.objects.update(payment_status='FAILED', updated_at=timezone.now())
+            out = StringIO()
+            call_command('export_orders_columnar', '--table', 'orders', '--compact', stdout=out)
+
+        self.assertIn('orders: 3 rows in 1 months', out.getvalue())
+        self.assertIn('orders: compacted 2 parts', out.getvalue())
+        self.assertEqual(set(columnar.read_export('orders')['payment_status']), {'FAILED'})
+
+
+class OrderExportTests(TestCase):
+    url = '/admin/orders/export/'
+
+    def setUp(self):
+        self.staff = make_user('staff', is_staff=True)
+        self.client.force_login(self.staff)
+        self.order = make_order(
+            make_user(), [make_product('Night Cream')], first_name='=HYPERLINK("http://x")', phone='+919999999999',
+        )
+
+    def grant(self, *codenames):
+        self.staff.user_permissions.add(*Permission.objects.filter(codename__in=codenames))
+
+    def download(self, dataset='orders', **params):
+        return self.client.get(self.url, {'dataset': dataset, **params})
+
+    def test_exports_need_the_view_permission(self):
+        for dataset in ('orders', 'order_items', 'shipments'):
+            self.assertEqual(self.download(dataset).status_code, 403)
+
+        self.grant('view_order')
+
+        self.assertEqual(self.download('orders').status_code, 200)
+        self.assertEqual(self.download('order_items').status_code, 403)
+        self.assertEqual(self.download('shipments').status_code, 403)
+
+    def test_form_offers_only_permitted_datasets(self):
+        self.grant('view_order', 'view_shipment')
+
+        response = self.client.get(self.url)
+
+        self.assertEqual([name for name, _ in response.context['datasets']], ['orders', 'shipments'])
+
+    def test_csv_cells_cannot_run_as_formulas(self):
+        self.grant('view_order')
+
+        content = b''.join(self.download('orders').streaming_content).decode()
+
+        row = next(csv.DictReader(StringIO(content)))
+        self.assertEqual(row['first_name'], '\'=HYPERLINK("http://x")')
+        self.assertEqual(row['phone'], "'+919999999999")
+        self.assertEqual(row['total'], '499.00')
+
+    def test_ndjson_keeps_the_values(self):
+        self.grant('view_order')
+
+        content = b''.join(self.download('orders', format='ndjson').streaming_content).decode()
+
+        self.assertEqual(json.loads(content.splitlines()[0])['first_name'], '=HYPERLINK("http://x")')
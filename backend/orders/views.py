@@ -4,8 +4,14 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from .models import Order, OrderItem
 from .serializers import OrderSerializer
+from lefoyer.pagination import CursorOrPageNumberPagination
 from cart.models import Cart
+from cart.storage import get_cart_store, user_owner
 from coupons.models import Coupon
+from .stock import (
+    InsufficientStock, available_quantities, deduct_order_stock, refresh_order_reservation,
+    release_order_stock, reserve_stock, take_stock, unreserve_counters,
+)
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import F
@@ -25,28 +31,42 @@ def send_order_email_async(order_id):
 
 def get_effective_price(product):
     """Return discount_price if set, otherwise regular price."""
-    if product.discount_price and product.discount_price > 0:
-        return product.discount_price
-    return product.price
-
-
-def restore_stock_for_order(order):
-    """Restore stock quantities for all items in an order."""
-    for item in order.items.select_related('product').all():
-        item.product.__class__.objects.filter(pk=item.product.pk).update(
-            stock_quantity=F('stock_quantity') + item.quantity
-        )
-    logger.info(f"Stock restored for order #{order.id}")
+    return product.effective_price
 
 
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CursorOrPageNumberPagination
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        queryset = Order.objects.filter(user=self.request.user)
+        if self.action in ('list', 'retrieve'):
+            queryset = self.history_queryset(queryset)
+        return queryset
+
+    def perform_update(self, serializer):
+        # Write only the submitted fields, never in_sales_rollups, which
+        # orders.rollups maintains with queryset updates
+        order = serializer.instance
+        for field, value in serializer.validated_data.items():
+            setattr(order, field, value)
+        order.save(update_fields=[*serializer.validated_data, 'updated_at'])
+
+    @staticmethod
+    def history_queryset(queryset):
+        """
+        Load orders with their shipment joined and their items prefetched, so
+        a page of orders costs a constant number of queries. Items carry their
+        own product snapshot, so the catalog is not read.
+        """
+        return queryset.select_related('shipment').prefetch_related('items')
 
     def create(self, request, *args, **kwargs):
+        # Write the (possibly Redis-held) cart through to the tables first
+        cart_store = get_cart_store()
+        cart_store.flush(user_owner(request.user.id))
+
         # Get cart
         try:
             cart = Cart.objects.get(user=request.user)
@@ -56,21 +76,22 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if cart has items
-        cart_items = cart.items.select_related('product').all()
-        if not cart_items.exists():
+        # Check if cart has items (loaded once and reused below)
+        cart_items = list(cart.items.select_related('product'))
+        if not cart_items:
             return Response(
                 {'error': 'Cart is empty'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Validate stock availability
+        # Validate stock availability (stock held by unpaid orders excluded)
+        available = available_quantities(item.product for item in cart_items)
         out_of_stock = []
         for item in cart_items:
-            if item.product.stock_quantity < item.quantity:
+            if available[item.product_id] < item.quantity:
                 out_of_stock.append({
                     'product': item.product.name,
-                    'available': item.product.stock_quantity,
+                    'available': available[item.product_id],
                     'requested': item.quantity
                 })
         
@@ -106,7 +127,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         discount = 0
         if coupon_code:
             try:
-                coupon = Coupon.objects.get(code__iexact=coupon_code)
+                coupon = Coupon.objects.with_code(coupon_code).get()
                 
                 if not coupon.is_valid():
                     return Response(
@@ -135,7 +156,13 @@ class OrderViewSet(viewsets.ModelViewSet):
         payment_method = request.data.get('payment_method', 'PREPAID')
         model_payment_method = 'COD' if payment_method.upper() == 'COD' else 'PREPAID'
 
-        # Wrap order creation in an atomic transaction
+        quantities = {}
+        for item in cart_items:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+        # Wrap order creation in an atomic transaction. COD orders take stock
+        # now; prepaid orders hold it until the payment callback (see orders.stock)
+        reserved = {}
         try:
             with transaction.atomic():
                 order = Order.objects.create(
@@ -155,34 +182,41 @@ class OrderViewSet(viewsets.ModelViewSet):
                     # COD orders are immediately confirmed
                     paid=model_payment_method == 'COD',
                     payment_status='COMPLETED' if model_payment_method == 'COD' else 'PENDING',
+                    stock_status='DEDUCTED' if model_payment_method == 'COD' else 'RESERVED',
                 )
 
-                for item in cart_items:
-                    OrderItem.objects.create(
+                OrderItem.objects.bulk_create([
+                    OrderItem.from_product(
+                        item.product,
                         order=order,
-                        product=item.product,
                         price=get_effective_price(item.product),
                         quantity=item.quantity
                     )
-                    # Reduce stock quantity atomically
-                    updated = item.product.__class__.objects.filter(
-                        pk=item.product.pk,
-                        stock_quantity__gte=item.quantity
-                    ).update(stock_quantity=F('stock_quantity') - item.quantity)
-                    
-                    if not updated:
-                        raise ValueError(f'{item.product.name} is now out of stock')
+                    for item in cart_items
+                ])
+
+                if model_payment_method == 'COD':
+                    take_stock(quantities, {item.product_id: item.product for item in cart_items})
 
                 # Increment coupon usage
                 if coupon:
                     Coupon.objects.filter(pk=coupon.pk).update(used_count=F('used_count') + 1)
 
                 cart.items.all().delete()
-        except ValueError as e:
+                transaction.on_commit(lambda: cart_store.clear(user_owner(request.user.id)))
+
+                # Last write, so little can fail after the hold counters move
+                if model_payment_method != 'COD':
+                    reserved = reserve_stock(order, quantities)
+        except InsufficientStock as e:
             return Response(
-                {'error': str(e)},
+                {'error': 'Some items are out of stock', 'items': e.items},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        except Exception:
+            if reserved:
+                unreserve_counters(reserved)
+            raise
 
         # NOTE: Shipment generation is handled automatically by the post_save signal
         # in shipping/signals.py when payment_status='COMPLETED'
@@ -190,7 +224,8 @@ class OrderViewSet(viewsets.ModelViewSet):
         # Send order confirmation email asynchronously via Celery
         send_order_email_async(order.id)
 
-        serializer = OrderSerializer(order)
+        order = self.history_queryset(Order.objects.filter(pk=order.pk)).get()
+        serializer = OrderSerializer(order, context=self.get_serializer_context())
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
     @action(detail=True, methods=['post'])
@@ -215,13 +250,14 @@ class OrderViewSet(viewsets.ModelViewSet):
         # Update payment method if changed
         if order.payment_method != payment_method:
             order.payment_method = payment_method
-            order.save()
+            order.save(update_fields=['payment_method', 'updated_at'])
         
         # For COD, mark as confirmed and trigger shipment
         if payment_method == 'COD':
+            deduct_order_stock(order)
             order.paid = True
             order.payment_status = 'COMPLETED'
-            order.save()
+            order.save(update_fields=['paid', 'payment_status', 'updated_at'])
 
             try:
                 if not hasattr(order, 'shipment'):
@@ -236,7 +272,16 @@ class OrderViewSet(viewsets.ModelViewSet):
                 'order_id': order.id
             })
         
-        # For prepaid, trigger payment gateway
+        # For prepaid, hold the stock again if the earlier hold expired
+        try:
+            refresh_order_reservation(order)
+        except InsufficientStock as e:
+            return Response(
+                {'error': 'Some items are out of stock', 'items': e.items},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Trigger payment gateway
         from .payment import PhonePeGateway
         gateway = PhonePeGateway()
         response = gateway.initiate_payment(
@@ -247,7 +292,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         if response['success']:
             order.provider_order_id = response['merchant_transaction_id']
-            order.save()
+            order.save(update_fields=['provider_order_id', 'updated_at'])
             return Response({
                 'success': True,
                 'redirect_url': response['redirect_url']
@@ -279,6 +324,14 @@ class InitiatePaymentView(APIView):
         if order.paid:
             return Response({'error': 'Order already paid'}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            refresh_order_reservation(order)
+        except InsufficientStock as e:
+            return Response(
+                {'error': 'Some items are out of stock', 'items': e.items},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         gateway = PhonePeGateway()
         response = gateway.initiate_payment(
             order_id=order.id,
@@ -288,7 +341,7 @@ class InitiatePaymentView(APIView):
 
         if response['success']:
             order.provider_order_id = response['merchant_transaction_id']
-            order.save()
+            order.save(update_fields=['provider_order_id', 'updated_at'])
             return Response({'redirect_url': response['redirect_url']})
         else:
             return Response(
@@ -322,7 +375,9 @@ class PaymentCallbackView(APIView):
                         order.paid = True
                         order.payment_status = 'COMPLETED'
                         order.payment_id = transaction_id
-                        order.save()
+                        order.save(update_fields=['paid', 'payment_status', 'payment_id', 'updated_at'])
+                        # Turn the stock hold into a deduction
+                        deduct_order_stock(order)
                         
                         # Send order confirmation email asynchronously via Celery
                         send_order_email_async(order.id)
@@ -334,9 +389,9 @@ class PaymentCallbackView(APIView):
                      try:
                         order = Order.objects.get(provider_order_id=merchant_transaction_id)
                         order.payment_status = 'FAILED'
-                        order.save()
-                        # Restore stock for failed payment
-                        restore_stock_for_order(order)
+                        order.save(update_fields=['payment_status', 'updated_at'])
+                        # Release held (or restore taken) stock for failed payment
+                        release_order_stock(order)
                      except Order.DoesNotExist:
                         logger.error(f"Order not found for failed transaction: {merchant_transaction_id}")
 
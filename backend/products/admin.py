@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.contrib import admin
+from django.db.models import Q
 from .models import Product, Category, SubCategory
+from .search import search_product_ids
+from .shards import set_sharded_stock, shard_stock
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -19,11 +23,37 @@ def mark_out_of_stock(modeladmin, request, queryset):
 def mark_in_stock(modeladmin, request, queryset):
     queryset.update(manual_out_of_stock=False)
 
+@admin.action(description='Shard stock of selected products (flash sales)')
+def shard_selected_stock(modeladmin, request, queryset):
+    for product in queryset:
+        shard_stock(product, settings.STOCK_SHARD_COUNT)
+
+@admin.action(description='Merge stock shards of selected products')
+def unshard_selected_stock(modeladmin, request, queryset):
+    for product in queryset.filter(stock_shards__gt=0):
+        shard_stock(product, 0)
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'price', 'stock_quantity', 'manual_out_of_stock', 'is_featured', 'is_bestseller', 'show_at_website')
     list_filter = ('category', 'is_featured', 'is_bestseller', 'show_at_website', 'manual_out_of_stock')
-    search_fields = ('name', 'description')
+    search_fields = ('name', 'sku')
     prepopulated_fields = {'slug': ('name',)}
     list_editable = ('price', 'stock_quantity', 'manual_out_of_stock', 'is_featured', 'show_at_website')
-    actions = [mark_out_of_stock, mark_in_stock]
+    readonly_fields = ('stock_shards',)
+    actions = [mark_out_of_stock, mark_in_stock, shard_selected_stock, unshard_selected_stock]
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # A sharded product's stock lives in its shards; spread the new total
+        if change and obj.stock_shards and 'stock_quantity' in form.changed_data:
+            set_sharded_stock(obj, obj.stock_quantity)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text index instead of unindexed icontains over description;
+        # exact SKU lookups are matched as well
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        product_ids = search_product_ids(search_term, limit=None, visible_only=False)
+        return queryset.filter(Q(pk__in=product_ids) | Q(sku__iexact=search_term)), False
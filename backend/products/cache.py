@@ -0,0 +1,187 @@
+"""
+Versioned response cache for the public catalog endpoints.
+
+Rendered responses are stored under a key that includes a catalog version
+number. Any change to a Product, Category or SubCategory bumps the version
+(see products.signals and ProductQuerySet.update), which makes every cached
+response unreachable at once; old entries simply expire.
+
+Stock changes with every checkout and hold, so product responses are cached
+without their stock fields (STOCK_FIELDS), which are read live and merged in
+on every request; changes to stock columns alone don't bump the version.
+
+The version lives in the shared cache, so invalidation only reaches other
+processes when REDIS_CACHE_URL is configured.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .models import Product
+
+CATALOG_VERSION_KEY = 'products:catalog:version'
+RESPONSE_KEY_PREFIX = 'products:response:'
+
+# Product response fields derived from stock, never cached
+STOCK_FIELDS = ('stock_quantity', 'available_quantity', 'in_stock')
+
+# Product columns that only feed STOCK_FIELDS; updating them alone leaves
+# cached responses valid
+STOCK_COLUMNS = {'stock_quantity', 'stock_shards', 'manual_out_of_stock'}
+
+
+def _initial_version():
+    # Time based so a lost version key never revives old cached responses
+    return int(time.time() * 1000)
+
+
+def get_catalog_version():
+    """Return the current catalog version, creating it if missing"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, _initial_version(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, _initial_version())
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response"""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, _initial_version(), timeout=None)
+
+
+def invalidate_catalog():
+    """Bump the catalog version once the current transaction commits"""
+    transaction.on_commit(bump_catalog_version)
+
+
+def response_cache_key(request, version):
+    """Cache key for a request: path, sorted query parameters and Accept header"""
+    query = sorted(request.GET.lists())
+    raw = f"{request.path}|{query}|{request.META.get('HTTP_ACCEPT', '')}"
+    return f"{RESPONSE_KEY_PREFIX}{version}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def is_cacheable(request):
+    """Only anonymous GET/HEAD requests are served from the cache"""
+    return (
+        settings.CATALOG_CACHE_TIMEOUT > 0
+        and request.method in ('GET', 'HEAD')
+        and 'HTTP_AUTHORIZATION' not in request.META
+    )
+
+
+def _products_in(data):
+    """Product dicts of a detail, list or paginated list response"""
+    if isinstance(data, dict) and 'results' in data:
+        data = data['results']
+    return data if isinstance(data, list) else [data]
+
+
+def live_stock(product_ids):
+    """
+    Current stock fields of products, as ProductSerializer renders them.
+
+    Returns:
+        dict: product id -> {stock_quantity, available_quantity, in_stock}
+    """
+    from orders.stock import held_quantities
+
+    rows = Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock_quantity', 'manual_out_of_stock')
+    held = held_quantities(product_ids)
+    stock = {}
+    for product_id, stock_quantity, manual_out_of_stock in rows:
+        available = max(stock_quantity - held[product_id], 0)
+        stock[product_id] = {
+            'stock_quantity': stock_quantity,
+            'available_quantity': available,
+            'in_stock': not manual_out_of_stock and available > 0,
+        }
+    return stock
+
+
+def without_stock(content):
+    """
+    Blank out STOCK_FIELDS in a rendered product response.
+
+    The fields are kept as nulls so with_live_stock fills them in place and
+    the field order stays the same.
+
+    Returns:
+        bytes: The content without stock values, or None if it had no stock
+            fields (e.g. suggestions)
+    """
+    data = json.loads(content)
+    products = [product for product in _products_in(data) if isinstance(product, dict) and 'in_stock' in product]
+    if not products:
+        return None
+    for product in products:
+        product.update(dict.fromkeys(STOCK_FIELDS))
+    return JSONRenderer().render(data)
+
+
+def with_live_stock(content):
+    """Cached product response with the current STOCK_FIELDS merged in"""
+    data = json.loads(content)
+    products = _products_in(data)
+    stock = live_stock([product['id'] for product in products])
+    gone = {'stock_quantity': 0, 'available_quantity': 0, 'in_stock': False}
+    for product in products:
+        product.update(stock.get(product['id'], gone))
+    return JSONRenderer().render(data)
+
+
+class CatalogCacheMixin:
+    """
+    ViewSet mixin serving anonymous reads from the versioned response cache.
+
+    Views returning products set live_stock: their JSON responses are cached
+    without STOCK_FIELDS, which are looked up (one query) on every request.
+
+    Responses carry an ETag so browsers can revalidate with If-None-Match
+    and receive a 304 without the body.
+    """
+    live_stock = False
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = response_cache_key(request, get_catalog_version())
+        cached = cache.get(key)
+
+        if cached is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+            response.render()
+            cached = {'content': response.content, 'content_type': response['Content-Type'], 'stock': False}
+            if self.live_stock:
+                # Only JSON responses can have their stock fields swapped
+                if not isinstance(getattr(response, 'accepted_renderer', None), JSONRenderer):
+                    return response
+                content = without_stock(response.content)
+                if content is not None:
+                    cached.update(content=content, stock=True)
+                    # Same bytes (and ETag) as the cache hits that follow
+                    response.content = with_live_stock(content)
+            cache.set(key, cached, timeout=settings.CATALOG_CACHE_TIMEOUT)
+        else:
+            content = with_live_stock(cached['content']) if cached.get('stock') else cached['content']
+            response = HttpResponse(content, content_type=cached['content_type'])
+
+        etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        patch_vary_headers(response, ['Accept', 'Authorization'])
+        return get_conditional_response(request, etag=etag, response=response)
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from coupons.models import Coupon
+from orders.models import Order
+from products.models import Product
+from products.views import ProductViewSet
+
+# Plan fragments that mean a table is read without an index
+FULL_SCAN_MARKERS = {
+    'sqlite': ['SCAN products_product', 'SCAN orders_order', 'SCAN coupons_coupon'],
+    'postgresql': ['Seq Scan'],
+}
+
+
+def hot_queries():
+    """The storefront's hot queries, built the same way the views build them"""
+    visible = ProductViewSet.slim_queryset(Product.objects.filter(show_at_website=True))
+    return [
+        ('Product list by category and price', visible.filter(category_id=1, price__gte=100, price__lte=500)),
+        ('Product list by sub-category', visible.filter(sub_category_id=1)),
+        ('Featured products', visible.filter(is_featured=True)),
+        ('Bestseller products', visible.filter(is_bestseller=True)),
+        ('Related products', visible.filter(category_id=1).exclude(id=1)[:4]),
+        ('Order history (OrderViewSet.get_queryset)', Order.objects.filter(user_id=1)),
+        ('Payment callback order lookup', Order.objects.filter(provider_order_id='MT0000000000')),
+        ('Coupon lookup at checkout', Coupon.objects.with_code('WELCOME10')),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAINs the hot storefront queries and checks that each one uses an index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--allow-seqscan',
+            action='store_true',
+            help='PostgreSQL: let the planner pick sequential scans (it does on small tables)',
+        )
+
+    def handle(self, *args, **options):
+        markers = FULL_SCAN_MARKERS.get(connection.vendor, [])
+        unindexed = []
+
+        with transaction.atomic():
+            if connection.vendor == 'postgresql' and not options['allow_seqscan']:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for label, queryset in hot_queries():
+                plan = queryset.explain()
+                full_scan = any(marker in line for line in plan.splitlines() for marker in markers
+                                if 'USING' not in line)
+
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write(plan)
+                if full_scan:
+                    unindexed.append(label)
+                    self.stdout.write(self.style.WARNING('-> full table scan'))
+                else:
+                    self.stdout.write(self.style.SUCCESS('-> uses an index'))
+                self.stdout.write('')
+
+        if unindexed:
+            raise CommandError(f'{len(unindexed)} query(s) without an index: {", ".join(unindexed)}')
+        self.stdout.write(self.style.SUCCESS('All hot queries use an index.'))
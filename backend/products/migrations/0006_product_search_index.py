@@ -0,0 +1,55 @@
+# Full-text search index used by products/search.py: a weighted tsvector
+# column with a GIN index on PostgreSQL, an FTS5 table on SQLite
+
+from django.db import migrations
+
+POSTGRES_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(suitable_for, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(key_benefits, '')), 'C') || "
+    "setweight(to_tsvector('english', coalesce(ingredients, '')), 'C') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'D')"
+)
+
+FTS_COLUMNS = 'name, description, key_benefits, ingredients, suitable_for'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "ALTER TABLE products_product ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS ({POSTGRES_SEARCH_VECTOR}) STORED"
+        )
+        schema_editor.execute(
+            "CREATE INDEX products_product_search_vector_gin "
+            "ON products_product USING gin (search_vector)"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE products_product_fts USING fts5("
+            f"{FTS_COLUMNS}, tokenize='porter unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO products_product_fts (rowid, {FTS_COLUMNS}) "
+            f"SELECT id, {FTS_COLUMNS} FROM products_product"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE products_product DROP COLUMN search_vector")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE products_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_manual_out_of_stock'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
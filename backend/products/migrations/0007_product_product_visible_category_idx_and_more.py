@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('show_at_website', True)), fields=['category', 'price'], name='product_visible_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('show_at_website', True)), fields=['sub_category', 'price'], name='product_visible_subcat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('show_at_website', True)), fields=['price'], name='product_visible_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_featured', True), ('show_at_website', True)), fields=['id'], name='product_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_bestseller', True), ('show_at_website', True)), fields=['id'], name='product_bestseller_idx'),
+        ),
+    ]
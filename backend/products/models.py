@@ -1,5 +1,26 @@
 from django.db import models
 
+class ProductQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        Bulk updates (admin actions, product edits) bypass post_save, so
+        invalidate the catalog response cache and re-index any changed
+        search fields here. Stock-only updates (checkouts, restocks) leave
+        the cache alone; cached responses read stock live.
+        """
+        from .cache import STOCK_COLUMNS, invalidate_catalog
+        from .search import INDEXED_FIELDS, index_products
+
+        reindex = set(kwargs) & set(INDEXED_FIELDS)
+        ids = list(self.values_list('pk', flat=True)) if reindex else None
+
+        rows = super().update(**kwargs)
+        if rows and not set(kwargs) <= STOCK_COLUMNS:
+            invalidate_catalog()
+        if ids:
+            index_products(self.model.objects.filter(pk__in=ids))
+        return rows
+
 class Category(models.Model):
     name = models.CharField(max_length=255)
     slug = models.SlugField(unique=True)
@@ -31,6 +52,7 @@ class Product(models.Model):
     size = models.CharField(max_length=50)
     sku = models.CharField(max_length=100, unique=True)
     stock_quantity = models.IntegerField()
+    stock_shards = models.PositiveSmallIntegerField(default=0, help_text="Number of StockShard rows holding this product's stock (0 = not sharded, see products.shards)")
     is_featured = models.BooleanField(default=False)
     is_bestseller = models.BooleanField(default=False)
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
@@ -51,5 +73,59 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # The storefront only reads visible products, so the listing indexes
+        # are partial on show_at_website
+        indexes = [
+            models.Index(
+                fields=['category', 'price'],
+                condition=models.Q(show_at_website=True),
+                name='product_visible_category_idx',
+            ),
+            models.Index(
+                fields=['sub_category', 'price'],
+                condition=models.Q(show_at_website=True),
+                name='product_visible_subcat_idx',
+            ),
+            models.Index(
+                fields=['price'],
+                condition=models.Q(show_at_website=True),
+                name='product_visible_price_idx',
+            ),
+            models.Index(
+                fields=['id'],
+                condition=models.Q(show_at_website=True, is_featured=True),
+                name='product_featured_idx',
+            ),
+            models.Index(
+                fields=['id'],
+                condition=models.Q(show_at_website=True, is_bestseller=True),
+                name='product_bestseller_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.name
+
+    @property
+    def effective_price(self):
+        """discount_price if set, otherwise the regular price"""
+        if self.discount_price and self.discount_price > 0:
+            return self.discount_price
+        return self.price
+
+class StockShard(models.Model):
+    """One slice of a sharded product's stock (see products.shards)"""
+    product = models.ForeignKey(Product, related_name='shards', on_delete=models.CASCADE)
+    index = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'index'], name='stock_shard_product_index_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id}#{self.index}: {self.quantity}'
@@ -0,0 +1,105 @@
+"""
+Full-text product search.
+
+PostgreSQL uses a weighted tsvector column (products_product.search_vector,
+a generated column with a GIN index), so it is maintained by the database.
+SQLite uses an FTS5 table (products_product_fts) kept in step with Product
+saves and deletes by products.signals. Both are created by the
+0006_product_search_index migration.
+
+Indexed fields and their weights, highest first: name, suitable_for,
+key_benefits and ingredients, description. The PostgreSQL weights are part of
+the column definition in that migration.
+"""
+import re
+
+from django.db import connection
+
+FTS_TABLE = 'products_product_fts'
+
+# Column order of the FTS5 table; bm25() weights follow the same order
+INDEXED_FIELDS = ['name', 'description', 'key_benefits', 'ingredients', 'suitable_for']
+FTS_WEIGHTS = [10.0, 1.0, 2.0, 2.0, 5.0]
+
+MAX_RESULTS = 200
+
+
+def _terms(query):
+    """Lower-cased word tokens of a user query (punctuation and operators dropped)"""
+    return re.findall(r'\w+', query.lower())
+
+
+def search_product_ids(query, limit=MAX_RESULTS, visible_only=True):
+    """
+    Rank products matching every term of a query.
+
+    Every term is matched as a prefix, so results update while the user is
+    still typing.
+
+    Args:
+        query: Free-text search string
+        limit: Maximum number of ids returned (None for all matches)
+        visible_only: Skip products hidden from the website
+
+    Returns:
+        list: Product ids, best match first
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+
+    visibility = ' AND p.show_at_website' if visible_only else ''
+    # No limit is LIMIT NULL on PostgreSQL and LIMIT -1 on SQLite
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT p.id FROM products_product p, to_tsquery('english', %s) q "
+                f"WHERE p.search_vector @@ q{visibility} "
+                "ORDER BY ts_rank(p.search_vector, q) DESC, p.id LIMIT %s",
+                [' & '.join(f"{term}:*" for term in terms), limit]
+            )
+        else:
+            weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+            cursor.execute(
+                f"SELECT p.id FROM {FTS_TABLE} JOIN products_product p ON p.id = {FTS_TABLE}.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s{visibility} "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}), p.id LIMIT %s",
+                [' '.join(f'"{term}"*' for term in terms), -1 if limit is None else limit]
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def index_products(products):
+    """
+    Write products into the SQLite FTS5 table (no-op on PostgreSQL).
+
+    Args:
+        products: Iterable of Product instances
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    rows = [
+        [product.pk] + [getattr(product, field) or '' for field in INDEXED_FIELDS]
+        for product in products
+    ]
+    if not rows:
+        return
+
+    columns = ', '.join(INDEXED_FIELDS)
+    placeholders = ', '.join(['%s'] * (len(INDEXED_FIELDS) + 1))
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [[row[0]] for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES ({placeholders})",
+            rows
+        )
+
+
+def unindex_products(product_ids):
+    """Remove products from the SQLite FTS5 table (no-op on PostgreSQL)"""
+    if connection.vendor != 'sqlite' or not product_ids:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [[pk] for pk in product_ids])
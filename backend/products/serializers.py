@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from orders.stock import held_quantities
 from .models import Product, Category, SubCategory
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -17,12 +18,53 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        exclude = ['show_at_website', 'manual_out_of_stock']
+        exclude = ['show_at_website', 'manual_out_of_stock', 'stock_shards']
 
     def get_in_stock(self, obj):
         if obj.manual_out_of_stock:
             return False
-        return obj.stock_quantity > 0
+        return self.get_available_quantity(obj) > 0
 
     def get_available_quantity(self, obj):
-        return obj.stock_quantity
+        """Stock minus what unpaid prepaid orders hold (see orders.stock)"""
+        if not hasattr(self, '_held'):
+            # Products nested in other data (cart lines) get theirs from the context
+            self._held = dict(self.context.get('held_quantities', {}))
+        if obj.pk not in self._held:
+            # Look up every product of a list being serialized at once
+            product_ids = {obj.pk}
+            if isinstance(self.parent, serializers.ListSerializer):
+                product_ids.update(product.pk for product in self.parent.instance)
+            self._held.update(held_quantities(product_ids))
+        return max(obj.stock_quantity - self._held[obj.pk], 0)
+
+
+class ProductListSerializer(ProductSerializer):
+    """
+    Compact product representation for listing endpoints (list, featured,
+    bestsellers, related). The long text fields and gallery images are only
+    returned by the detail endpoint.
+    """
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    sub_category_name = serializers.CharField(source='sub_category.name', read_only=True)
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'name', 'slug',
+            'category', 'category_name', 'sub_category', 'sub_category_name',
+            'price', 'discount_price', 'suitable_for', 'size', 'sku',
+            'stock_quantity', 'is_featured', 'is_bestseller',
+            'rating', 'reviews_count', 'image_main', 'image_2', 'amazon_link',
+            'created_at', 'in_stock', 'available_quantity',
+        ]
+
+    # Columns loaded by listing querysets; in_stock also needs manual_out_of_stock
+    queryset_fields = [
+        'id', 'name', 'slug',
+        'category__id', 'category__name', 'sub_category__id', 'sub_category__name',
+        'price', 'discount_price', 'suitable_for', 'size', 'sku',
+        'stock_quantity', 'manual_out_of_stock', 'is_featured', 'is_bestseller',
+        'rating', 'reviews_count', 'image_main', 'image_2', 'amazon_link',
+        'created_at',
+    ]
@@ -0,0 +1,178 @@
+"""
+Sharded stock for hot products.
+
+Every checkout of a product normally updates its single products_product
+row, so during a flash sale checkouts of that product commit one at a time.
+A product with stock_shards > 0 keeps its stock in that many StockShard rows
+instead. A checkout takes its quantity from a randomly picked shard (trying
+the others if that one runs short), so concurrent checkouts mostly lock
+different rows.
+
+Product.stock_quantity of a sharded product is the display total: it is
+re-aggregated from the shards by the sync_sharded_stock task (every minute)
+and whenever sharding is switched on or the stock is set in the admin.
+Checkout and cart checks read the live total (shard_totals).
+
+Stock held for unpaid prepaid orders (orders.stock) is taken out of the
+shards when the hold is placed, so a sharded product's shard total (and
+stock_quantity) is what is left to sell; an unsharded product's
+stock_quantity includes its held units.
+"""
+import logging
+import random
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import Product, StockShard
+
+logger = logging.getLogger(__name__)
+
+
+def _split(total, shards):
+    """Spread a quantity as evenly as possible over shards"""
+    base, extra = divmod(max(total, 0), shards)
+    return [base + (1 if index < extra else 0) for index in range(shards)]
+
+
+@transaction.atomic
+def shard_stock(product, shards):
+    """
+    Move a product's stock into shards (or re-spread it over a new number of
+    shards), keeping the total. Units held by unpaid orders are kept out of
+    the shards, and put back into stock_quantity when merging.
+
+    Args:
+        product: Product instance
+        shards: Number of shard rows (0 merges the stock back into the product)
+    """
+    from orders.models import StockReservation
+    from orders.stock import reset_held_counters
+
+    locked = Product.objects.select_for_update().get(pk=product.pk)
+    # Waits out checkouts taking from the shards, so their holds are counted
+    list(StockShard.objects.select_for_update().filter(product=locked))
+    held = StockReservation.objects.filter(product=locked).aggregate(held=Sum('quantity'))['held'] or 0
+    if locked.stock_shards:
+        on_hand = shard_totals([locked]).get(locked.pk, 0) + held
+    else:
+        on_hand = locked.stock_quantity
+    total = on_hand - held if shards else on_hand
+
+    StockShard.objects.filter(product=locked).delete()
+    if shards:
+        StockShard.objects.bulk_create([
+            StockShard(product=locked, index=index, quantity=quantity)
+            for index, quantity in enumerate(_split(total, shards))
+        ])
+    Product.objects.filter(pk=locked.pk).update(stock_quantity=total, stock_shards=shards)
+    product.stock_quantity, product.stock_shards = total, shards
+    # Held counters are only kept for unsharded products
+    transaction.on_commit(lambda: reset_held_counters([locked.pk]))
+    logger.info(f"Stock of {locked.name} ({total}) now in {shards or 'no'} shards")
+
+
+@transaction.atomic
+def set_sharded_stock(product, total):
+    """Replace a sharded product's stock with a new total (admin restock)"""
+    shards = list(StockShard.objects.select_for_update().filter(product=product).order_by('index'))
+    for shard, quantity in zip(shards, _split(total, len(shards))):
+        shard.quantity = quantity
+    StockShard.objects.bulk_update(shards, ['quantity'])
+    Product.objects.filter(pk=product.pk).update(stock_quantity=total)
+
+
+def shard_totals(products):
+    """
+    Live stock of the sharded products among `products`.
+
+    Args:
+        products: Product instances with stock_shards loaded
+
+    Returns:
+        dict: product id -> sum of its shards (sharded products only)
+    """
+    product_ids = [product.pk for product in products if product.stock_shards]
+    if not product_ids:
+        return {}
+    rows = (
+        StockShard.objects.filter(product_id__in=product_ids)
+        .values('product_id')
+        .annotate(total=Sum('quantity'))
+        .values_list('product_id', 'total')
+    )
+    return dict(rows)
+
+
+def take_from_shards(product_id, shards, quantity, allow_negative=False):
+    """
+    Take stock from a sharded product. Must run inside a transaction.
+
+    One shard is picked at random and the rest tried in turn; only if no
+    single shard covers the quantity are all the product's shards locked and
+    drained together.
+
+    Args:
+        product_id: Sharded product
+        shards: The product's stock_shards
+        quantity: Quantity to take
+        allow_negative: Take it even if the shards don't hold enough (paid
+            orders); the shortfall comes out of one shard
+
+    Returns:
+        bool: Whether the stock was taken
+    """
+    start = random.randrange(shards)
+    for offset in range(shards):
+        updated = StockShard.objects.filter(
+            product_id=product_id, index=(start + offset) % shards, quantity__gte=quantity
+        ).update(quantity=F('quantity') - quantity)
+        if updated:
+            return True
+
+    locked = list(StockShard.objects.select_for_update().filter(product_id=product_id).order_by('index'))
+    if not locked:
+        return False
+    if sum(shard.quantity for shard in locked) < quantity and not allow_negative:
+        return False
+
+    remaining = quantity
+    for shard in locked:
+        taken = min(max(shard.quantity, 0), remaining)
+        shard.quantity -= taken
+        remaining -= taken
+    locked[start % len(locked)].quantity -= remaining
+    StockShard.objects.bulk_update(locked, ['quantity'])
+    return True
+
+
+def return_to_shards(product_id, shards, quantity):
+    """Put stock back into a randomly picked shard of a sharded product"""
+    StockShard.objects.filter(
+        product_id=product_id, index=random.randrange(shards)
+    ).update(quantity=F('quantity') + quantity)
+
+
+def sync_sharded_stock():
+    """
+    Copy each sharded product's shard total into stock_quantity where it
+    changed, in one UPDATE.
+
+    Returns:
+        int: Number of products updated
+    """
+    products = list(Product.objects.filter(stock_shards__gt=0).only('id', 'stock_quantity', 'stock_shards'))
+    totals = shard_totals(products)
+    changed = {
+        product.pk: totals.get(product.pk, 0)
+        for product in products
+        if totals.get(product.pk, 0) != product.stock_quantity
+    }
+    if not changed:
+        return 0
+    return Product.objects.filter(pk__in=list(changed)).update(
+        stock_quantity=Case(
+            *[When(pk=product_id, then=Value(total)) for product_id, total in changed.items()],
+            output_field=IntegerField(),
+        )
+    )
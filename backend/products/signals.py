@@ -0,0 +1,43 @@
+"""
+Django signals keeping the catalog response cache and search indexes current
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import STOCK_COLUMNS, invalidate_catalog
+from .models import Product, Category, SubCategory
+from .search import index_products, unindex_products
+from . import suggest
+
+
+def is_stock_only(update_fields):
+    """Whether a save only wrote stock columns, which cached responses and indexes don't hold"""
+    return bool(update_fields) and set(update_fields) <= STOCK_COLUMNS
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+def invalidate_catalog_cache(sender, update_fields=None, **kwargs):
+    """Any saved or deleted catalog row invalidates every cached catalog response"""
+    if not is_stock_only(update_fields):
+        invalidate_catalog()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    """Re-index a saved product for full-text search and suggestions"""
+    if is_stock_only(update_fields):
+        return
+    index_products([instance])
+    suggest.schedule_refresh()
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Drop a deleted product from the full-text search and suggestion indexes"""
+    unindex_products([instance.pk])
+    suggest.schedule_refresh()
@@ -0,0 +1,226 @@
+"""
+In-memory search-as-you-type index over the visible catalog.
+
+Product name, SKU and ingredient words are held in a sorted term list (for
+prefix lookups) and a trigram index (for typo tolerance), so suggestions are
+answered without a database query.
+
+Each process builds the index on first use (wsgi.py warms it at start-up)
+and rebuilds it in a background thread when the catalog version from
+products.cache changes, or right away after a product is saved or deleted
+in this process. The old index keeps answering while the new one is built.
+"""
+import bisect
+import heapq
+import logging
+import re
+import threading
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from .cache import get_catalog_version
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# Score multiplier for a term found in each field
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'sku': 3.0,
+    'ingredients': 1.0,
+}
+
+# Trigram similarity below which a term is not treated as a typo match
+MIN_SIMILARITY = 0.45
+
+MAX_SUGGESTIONS = 8
+
+_index = None
+_lock = threading.Lock()
+_refreshing = False
+
+
+def _tokens(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def _trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(grams, other):
+    shared = len(grams & other)
+    return shared / (len(grams) + len(other) - shared)
+
+
+class SuggestIndex:
+    """Prefix and trigram index over a fixed set of products"""
+
+    def __init__(self, products, version=None):
+        self.version = version
+        self.products = {}
+        self.postings = defaultdict(dict)   # term -> {product id: field weight}
+        self.trigrams = defaultdict(set)    # trigram -> terms
+
+        for product in products:
+            self.products[product.pk] = {
+                'id': product.pk,
+                'name': product.name,
+                'slug': product.slug,
+                'sku': product.sku,
+                'image_main': product.image_main.url if product.image_main else None,
+            }
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in _tokens(getattr(product, field) or ''):
+                    postings = self.postings[term]
+                    postings[product.pk] = max(postings.get(product.pk, 0), weight)
+
+        self.terms = sorted(self.postings)
+        for term in self.terms:
+            for gram in _trigrams(term):
+                self.trigrams[gram].add(term)
+
+    def _matching_terms(self, token):
+        """
+        Terms matching one query token.
+
+        Returns:
+            dict: term -> score (1.0 for prefix matches, scaled trigram
+            similarity for typo matches)
+        """
+        matches = {}
+        for term in self.terms[bisect.bisect_left(self.terms, token):]:
+            if not term.startswith(token):
+                break
+            matches[term] = 1.0
+
+        # Typo matching is only a fallback for tokens no term starts with
+        if matches or len(token) < 3:
+            return matches
+
+        grams = _trigrams(token)
+        candidates = set()
+        for gram in grams:
+            candidates |= self.trigrams.get(gram, set())
+
+        for term in candidates - matches.keys():
+            # Compare against the term's prefix too, so a typo in a partly
+            # typed word still matches
+            similarity = max(
+                _similarity(grams, _trigrams(term)),
+                _similarity(grams, _trigrams(term[:len(token)])),
+            )
+            if similarity >= MIN_SIMILARITY:
+                matches[term] = similarity * 0.8
+        return matches
+
+    def suggest(self, query, limit=MAX_SUGGESTIONS):
+        """
+        Products matching every token of a query, best first.
+
+        Args:
+            query: Partially typed search text
+            limit: Maximum number of suggestions
+
+        Returns:
+            list: Suggestion dicts (id, name, slug, sku, image_main)
+        """
+        tokens = _tokens(query)
+        if not tokens:
+            return []
+
+        scores = None
+        for token in tokens:
+            token_scores = {}
+            for term, match_score in self._matching_terms(token).items():
+                for product_id, weight in self.postings[term].items():
+                    score = match_score * weight
+                    if score > token_scores.get(product_id, 0):
+                        token_scores[product_id] = score
+
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    product_id: score + token_scores[product_id]
+                    for product_id, score in scores.items()
+                    if product_id in token_scores
+                }
+            if not scores:
+                return []
+
+        ranked = heapq.nsmallest(
+            limit, scores,
+            key=lambda product_id: (-scores[product_id], self.products[product_id]['name'])
+        )
+        return [self.products[product_id] for product_id in ranked]
+
+
+def build_index():
+    """Build a SuggestIndex from the visible catalog"""
+    version = get_catalog_version()
+    products = Product.objects.filter(show_at_website=True).only(
+        'id', 'name', 'slug', 'sku', 'ingredients', 'image_main'
+    )
+    index = SuggestIndex(products, version=version)
+    logger.info(f"Suggest index built: {len(index.products)} products, {len(index.terms)} terms")
+    return index
+
+
+def refresh_index():
+    """Rebuild the process-wide index and swap it in"""
+    global _index
+    _index = build_index()
+
+
+def refresh_index_in_background():
+    """Rebuild the index in a background thread unless a rebuild is running"""
+    global _refreshing
+    with _lock:
+        if _refreshing:
+            return
+        _refreshing = True
+
+    def run():
+        global _refreshing
+        try:
+            refresh_index()
+        except Exception as e:
+            logger.warning(f"Suggest index refresh failed: {e}")
+        finally:
+            _refreshing = False
+            connection.close()
+
+    threading.Thread(target=run, name='product-suggest-refresh', daemon=True).start()
+
+
+def schedule_refresh():
+    """Rebuild the index after the current transaction commits, if one is loaded"""
+    if _index is not None:
+        transaction.on_commit(refresh_index_in_background)
+
+
+def get_index():
+    """
+    Return the process-wide index.
+
+    Only the first call in a process builds it synchronously; later catalog
+    changes are picked up by a background rebuild.
+    """
+    index = _index
+    if index is None:
+        with _lock:
+            if _index is None:
+                refresh_index()
+        return _index
+
+    if index.version != get_catalog_version():
+        refresh_index_in_background()
+    return index
+
+
+def suggest(query, limit=MAX_SUGGESTIONS):
+    """Suggestions for a partially typed query from the process-wide index"""
+    return get_index().suggest(query, limit=limit)
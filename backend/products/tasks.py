@@ -0,0 +1,23 @@
+"""
+Celery tasks for the product catalog
+"""
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def sync_sharded_stock():
+    """
+    Re-aggregate the displayed stock_quantity of sharded products from
+    their shards (see products.shards).
+    
+    Scheduled via Celery Beat: Every minute.
+    """
+    from .shards import sync_sharded_stock as sync
+    
+    updated = sync()
+    if updated:
+        logger.info(f"Synced stock of {updated} sharded products")
+    return updated
@@ -0,0 +1,396 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.admin.sites import AdminSite
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from coupons.models import Coupon
+from products import suggest
+from products.admin import ProductAdmin
+from products.cache import bump_catalog_version, get_catalog_version
+from products.models import Category, Product, SubCategory
+from products.search import search_product_ids
+
+
+def make_product(name, **fields):
+    """Visible product in the Skin / Cleansers category"""
+    category, _ = Category.objects.get_or_create(slug='skin', defaults={'name': 'Skin'})
+    sub_category, _ = SubCategory.objects.get_or_create(
+        slug='cleansers', defaults={'name': 'Cleansers', 'category': category}
+    )
+    slug = name.lower().replace(' ', '-')
+    defaults = {
+        'slug': slug,
+        'category': category,
+        'sub_category': sub_category,
+        'price': Decimal('499.00'),
+        'description': f'{name} for everyday use',
+        'key_benefits': 'Gentle cleansing',
+        'key_features': 'Soap free',
+        'ingredients': 'Aqua, Glycerin',
+        'how_to_use': 'Massage onto damp skin and rinse',
+        'suitable_for': 'All skin types',
+        'size': '100 ml',
+        'sku': f'SKU-{slug}'.upper(),
+        'stock_quantity': 20,
+        'image_main': 'products/placeholder.png',
+    }
+    defaults.update(fields)
+    return Product.objects.create(name=name, **defaults)
+
+
+@override_settings(CATALOG_CACHE_TIMEOUT=0)
+class ProductListingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def list_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return len(queries)
+
+    def test_list_returns_the_compact_representation(self):
+        make_product('Foaming Face Wash')
+
+        product = self.client.get('/api/products/products/').data['results'][0]
+
+        self.assertEqual(product['category_name'], 'Skin')
+        self.assertEqual(product['sub_category_name'], 'Cleansers')
+        self.assertTrue(product['in_stock'])
+        self.assertNotIn('description', product)
+        self.assertNotIn('image_3', product)
+
+    def test_detail_returns_every_field(self):
+        make_product('Foaming Face Wash')
+
+        product = self.client.get('/api/products/products/foaming-face-wash/').data
+
+        self.assertEqual(product['description'], 'Foaming Face Wash for everyday use')
+        self.assertIn('how_to_use', product)
+        self.assertNotIn('show_at_website', product)
+
+    def test_listing_query_count_does_not_grow_with_the_page(self):
+        make_product('Product 1', is_featured=True, is_bestseller=True)
+        small = {url: self.list_queries(url) for url in (
+            '/api/products/products/', '/api/products/products/featured/', '/api/products/products/bestsellers/',
+        )}
+
+        for number in range(2, 9):
+            make_product(f'Product {number}', is_featured=True, is_bestseller=True)
+        cache.clear()
+
+        for url, count in small.items():
+            self.assertEqual(self.list_queries(url), count, url)
+
+    def test_hidden_and_manually_out_of_stock_products(self):
+        make_product('Hidden Serum', show_at_website=False)
+        make_product('Sold Out Toner', manual_out_of_stock=True)
+
+        products = self.client.get('/api/products/products/').data['results']
+
+        self.assertEqual([product['name'] for product in products], ['Sold Out Toner'])
+        self.assertFalse(products[0]['in_stock'])
+
+
+@override_settings(CATALOG_CACHE_TIMEOUT=0)
+class ProductCursorPaginationTests(TestCase):
+    url = '/api/products/products/'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.products = [make_product(f'Product {number}') for number in range(25)]
+
+    def test_cursor_pages_cover_every_product_once(self):
+        seen = []
+        response = self.client.get(self.url, {'pagination': 'cursor'})
+        while True:
+            data = response.json()
+            self.assertNotIn('count', data)
+            seen += [product['id'] for product in data['results']]
+            if not data['next']:
+                break
+            self.assertIn('cursor=', data['next'])
+            response = self.client.get(data['next'])
+
+        self.assertEqual(seen, sorted((product.pk for product in self.products), reverse=True))
+
+    def test_previous_link_returns_the_earlier_page(self):
+        first = self.client.get(self.url, {'pagination': 'cursor'}).json()
+        second = self.client.get(first['next']).json()
+
+        self.assertEqual(self.client.get(second['previous']).json()['results'], first['results'])
+
+    def test_page_numbers_stay_the_default(self):
+        data = self.client.get(self.url, {'page': 2}).json()
+
+        self.assertEqual(data['count'], 25)
+        self.assertEqual(len(data['results']), 10)
+
+    def test_later_pages_cost_the_same_as_the_first(self):
+        first = self.client.get(self.url, {'pagination': 'cursor'}).json()
+        self.client.get(first['next'])  # held-stock counters of both pages are cached now
+        with CaptureQueriesContext(connection) as first_page:
+            self.client.get(self.url, {'pagination': 'cursor'})
+        with CaptureQueriesContext(connection) as next_page:
+            self.client.get(first['next'])
+
+        self.assertEqual(len(next_page), len(first_page))
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in next_page.captured_queries))
+
+
+class CatalogCacheTests(TestCase):
+    url = '/api/products/products/'
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(suggest, '_index', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.product = make_product('Foaming Face Wash', stock_quantity=5)
+
+    def get_product(self, url=None, **headers):
+        response = self.client.get(url or self.url, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response, response.json()['results'][0]
+
+    def test_cached_responses_show_current_stock(self):
+        self.get_product()
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.product.pk).update(stock_quantity=0)
+
+        _, product = self.get_product()
+        self.assertEqual(get_catalog_version(), version)
+        self.assertEqual((product['stock_quantity'], product['available_quantity']), (0, 0))
+        self.assertFalse(product['in_stock'])
+
+    def test_cached_responses_show_current_holds(self):
+        self.get_product()
+
+        with mock.patch('orders.stock.held_quantities', return_value={self.product.pk: 3}):
+            _, product = self.get_product()
+
+        self.assertEqual(product['stock_quantity'], 5)
+        self.assertEqual(product['available_quantity'], 2)
+
+    def test_catalog_edits_invalidate_the_cache(self):
+        self.get_product()
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.product.pk).update(price=Decimal('399.00'))
+
+        _, product = self.get_product()
+        self.assertNotEqual(get_catalog_version(), version)
+        self.assertEqual(product['price'], '399.00')
+
+    def test_stock_only_saves_do_not_invalidate_or_reindex(self):
+        version = get_catalog_version()
+        self.product.stock_quantity = 50
+
+        with mock.patch('products.signals.index_products') as index_products, \
+                mock.patch('products.signals.suggest.schedule_refresh') as schedule_refresh, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.product.save(update_fields=['stock_quantity'])
+
+        self.assertEqual(get_catalog_version(), version)
+        index_products.assert_not_called()
+        schedule_refresh.assert_not_called()
+
+    def test_suggest_index_is_not_rebuilt_for_stock_changes(self):
+        suggest.refresh_index()
+        index = suggest.get_index()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.product.pk).update(stock_quantity=1)
+
+        with mock.patch('products.suggest.refresh_index_in_background') as refresh:
+            self.assertIs(suggest.get_index(), index)
+        refresh.assert_not_called()
+
+    def test_etag_follows_stock(self):
+        first, _ = self.get_product()
+
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=4)
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_suggestions_are_served_without_stock(self):
+        suggest.refresh_index()
+
+        for _ in range(2):
+            response = self.client.get(f'{self.url}suggest/', {'q': 'foam'})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('in_stock', response.json()[0])
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.wash = make_product('Niacinamide Face Wash', ingredients='Aqua, Niacinamide, Zinc')
+        self.serum = make_product('Brightening Serum', description='Serum with niacinamide for dull skin')
+        self.toner = make_product('Rose Toner', ingredients='Rose water')
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(search_product_ids('niacinamide'), [self.wash.pk, self.serum.pk])
+
+    def test_terms_match_as_prefixes_and_all_are_required(self):
+        self.assertEqual(search_product_ids('niacin'), [self.wash.pk, self.serum.pk])
+        self.assertEqual(search_product_ids('niacin wash'), [self.wash.pk])
+        self.assertEqual(search_product_ids('"rose*" -('), [self.toner.pk])
+        self.assertEqual(search_product_ids('  '), [])
+
+    def test_hidden_products_only_match_when_asked(self):
+        Product.objects.filter(pk=self.toner.pk).update(show_at_website=False)
+
+        self.assertEqual(search_product_ids('rose'), [])
+        self.assertEqual(search_product_ids('rose', visible_only=False), [self.toner.pk])
+
+    def test_limit(self):
+        make_product('Niacinamide Cream')
+
+        self.assertEqual(len(search_product_ids('niacinamide', limit=2)), 2)
+        self.assertEqual(len(search_product_ids('niacinamide', limit=None)), 3)
+
+    def test_edits_are_reindexed(self):
+        self.toner.name = 'Hibiscus Toner'
+        self.toner.save()
+        Product.objects.filter(pk=self.serum.pk).update(name='Vitamin C Serum')
+
+        self.assertEqual(search_product_ids('hibiscus'), [self.toner.pk])
+        self.assertEqual(search_product_ids('rose'), [self.toner.pk])  # still in its ingredients
+        self.assertEqual(search_product_ids('brightening'), [])
+        self.assertEqual(search_product_ids('vitamin'), [self.serum.pk])
+
+        self.toner.delete()
+        self.assertEqual(search_product_ids('hibiscus'), [])
+
+    def test_search_endpoint_returns_best_match_first(self):
+        response = APIClient().get('/api/products/products/search/', {'q': 'niacinamide'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product['id'] for product in response.json()['results']], [self.wash.pk, self.serum.pk])
+
+    def test_search_keeps_the_rank_order_when_a_cursor_is_asked_for(self):
+        response = APIClient().get('/api/products/products/search/', {'q': 'niacinamide', 'pagination': 'cursor'})
+
+        data = response.json()
+        self.assertEqual([product['id'] for product in data['results']], [self.wash.pk, self.serum.pk])
+        self.assertEqual(data['count'], 2)
+
+    def test_admin_search_is_not_capped(self):
+        admin = ProductAdmin(Product, AdminSite())
+        request = RequestFactory().get('/admin/products/product/', {'q': 'niacinamide'})
+
+        with mock.patch('products.admin.search_product_ids', wraps=search_product_ids) as search:
+            queryset, may_have_duplicates = admin.get_search_results(request, Product.objects.all(), 'niacinamide')
+
+        self.assertEqual(search.call_args.kwargs['limit'], None)
+        self.assertEqual(set(queryset), {self.wash, self.serum})
+        self.assertFalse(may_have_duplicates)
+
+    def test_admin_search_matches_exact_sku(self):
+        admin = ProductAdmin(Product, AdminSite())
+        request = RequestFactory().get('/admin/products/product/')
+
+        queryset, _ = admin.get_search_results(request, Product.objects.all(), self.toner.sku.lower())
+
+        self.assertEqual(list(queryset), [self.toner])
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.wash = make_product('Niacinamide Face Wash', sku='LF-WASH-01', ingredients='Aqua, Niacinamide')
+        self.serum = make_product('Hydrating Serum', sku='LF-SERUM-02', ingredients='Hyaluronic acid, Niacinamide')
+        self.hidden = make_product('Nightly Mask', show_at_website=False)
+        patcher = mock.patch.object(suggest, '_index', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        suggest.refresh_index()
+
+    def names(self, query, **kwargs):
+        return [suggestion['name'] for suggestion in suggest.suggest(query, **kwargs)]
+
+    def test_prefixes_match_and_name_outranks_ingredients(self):
+        self.assertEqual(self.names('niac'), ['Niacinamide Face Wash', 'Hydrating Serum'])
+        self.assertEqual(self.names('niac', limit=1), ['Niacinamide Face Wash'])
+
+    def test_every_token_must_match(self):
+        self.assertEqual(self.names('niacinamide ser'), ['Hydrating Serum'])
+        self.assertEqual(self.names('serum wash'), [])
+
+    def test_typos_are_tolerated(self):
+        self.assertEqual(self.names('hydratng'), ['Hydrating Serum'])
+        self.assertEqual(self.names('xq'), [])
+
+    def test_skus_match(self):
+        self.assertEqual(self.names('lf serum'), ['Hydrating Serum'])
+
+    def test_hidden_products_are_left_out(self):
+        self.assertEqual(self.names('nightly'), [])
+
+    def test_endpoint_answers_without_queries(self):
+        client = APIClient()
+
+        with self.assertNumQueries(0):
+            response = client.get('/api/products/products/suggest/', {'q': 'hydra'})
+
+        self.assertEqual(response.status_code, 200)
+        suggestion, = response.json()
+        self.assertEqual(suggestion['slug'], 'hydrating-serum')
+        self.assertTrue(suggestion['image_main'].startswith('http://testserver/'))
+
+    def test_catalog_edits_schedule_a_rebuild(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.serum.name = 'Hydrating Gel'
+            self.serum.save()
+
+        self.assertIn(suggest.refresh_index_in_background, callbacks)
+        suggest.refresh_index()
+        self.assertEqual(self.names('gel'), ['Hydrating Gel'])
+
+    def test_stale_index_is_rebuilt_in_the_background(self):
+        index = suggest.get_index()
+        bump_catalog_version()
+
+        with mock.patch('products.suggest.refresh_index_in_background') as refresh:
+            self.assertIs(suggest.get_index(), index)
+        refresh.assert_called_once_with()
+
+
+class StorefrontIndexTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+
+        call_command('explain_queries', stdout=out)
+
+        self.assertIn('All hot queries use an index.', out.getvalue())
+        self.assertNotIn('full table scan', out.getvalue())
+
+    def test_coupon_codes_match_case_insensitively(self):
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code='Welcome10', valid_from=now, valid_to=now + timedelta(days=1), discount=10, active=True
+        )
+
+        self.assertEqual(list(Coupon.objects.with_code('WELCOME10')), [coupon])
+        self.assertEqual(list(Coupon.objects.with_code('welcome10')), [coupon])
+        self.assertFalse(Coupon.objects.with_code('welcome').exists())
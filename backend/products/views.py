@@ -1,9 +1,15 @@
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from django.db.models import Case, When
 from .models import Product, Category, SubCategory
-from .serializers import ProductSerializer, CategorySerializer, SubCategorySerializer
+from .serializers import ProductSerializer, ProductListSerializer, CategorySerializer, SubCategorySerializer
 from .filters import ProductFilter
+from lefoyer.pagination import CursorOrPageNumberPagination
+from .cache import CatalogCacheMixin
+from .search import search_product_ids
+from . import suggest as suggest_index
 
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticatedOrReadOnly
 
@@ -17,44 +23,100 @@ class ReadOnlyOrAdminPermission(IsAuthenticatedOrReadOnly):
         return request.user and request.user.is_staff
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     filterset_class = ProductFilter
     lookup_field = 'slug'
     permission_classes = [ReadOnlyOrAdminPermission]
+    pagination_class = CursorOrPageNumberPagination
+    cursor_ordering = ('-id',)
+    live_stock = True
+
+    # Actions that return many products use the compact list representation
+    list_actions = ('list', 'featured', 'bestsellers', 'related', 'search')
 
     def get_queryset(self):
-        return Product.objects.filter(show_at_website=True)
+        queryset = Product.objects.filter(show_at_website=True)
+        if self.action in self.list_actions:
+            queryset = self.slim_queryset(queryset)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in self.list_actions:
+            return ProductListSerializer
+        return ProductSerializer
+
+    @staticmethod
+    def slim_queryset(queryset):
+        """Load only the columns ProductListSerializer renders, with categories joined"""
+        return queryset.select_related('category', 'sub_category').only(
+            *ProductListSerializer.queryset_fields
+        )
 
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def featured(self, request):
-        featured_products = Product.objects.filter(is_featured=True, show_at_website=True)
+        featured_products = self.get_queryset().filter(is_featured=True)
         serializer = self.get_serializer(featured_products, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def bestsellers(self, request):
-        bestseller_products = Product.objects.filter(is_bestseller=True, show_at_website=True)
+        bestseller_products = self.get_queryset().filter(is_bestseller=True)
         serializer = self.get_serializer(bestseller_products, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny], pagination_class=PageNumberPagination)
+    def search(self, request):
+        """
+        Full-text search over the catalog, best match first (?q=<terms>).
+        Paged by page number only, since a cursor would re-sort by id.
+        """
+        product_ids = search_product_ids(request.query_params.get('q', ''))
+        rank = Case(*[When(pk=pk, then=position) for position, pk in enumerate(product_ids)], default=0)
+        products = self.filter_queryset(self.get_queryset()).filter(pk__in=product_ids).order_by(rank, 'pk')
+
+        page = self.paginate_queryset(products)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(products, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny], throttle_classes=[])
+    def suggest(self, request):
+        """
+        Search-as-you-type suggestions (?q=<partial text>), served from the
+        in-memory index without a database query. Not throttled: the search
+        box calls it on every keystroke.
+        """
+        suggestions = suggest_index.suggest(request.query_params.get('q', ''))
+        return Response([
+            {
+                **suggestion,
+                'image_main': request.build_absolute_uri(suggestion['image_main']) if suggestion['image_main'] else None,
+            }
+            for suggestion in suggestions
+        ])
+
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
     def related(self, request, slug=None):
         try:
             product = self.get_object()
-            related_products = Product.objects.filter(category=product.category).exclude(id=product.id)[:4]
+            related_products = self.get_queryset().filter(
+                category_id=product.category_id
+            ).exclude(id=product.id)[:4]
             serializer = self.get_serializer(related_products, many=True)
             return Response(serializer.data)
         except Product.DoesNotExist:
             return Response({'error': 'Product not found'}, status=404)
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [ReadOnlyOrAdminPermission]
 
-class SubCategoryViewSet(viewsets.ModelViewSet):
+class SubCategoryViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = SubCategory.objects.all()
     serializer_class = SubCategorySerializer
     permission_classes = [ReadOnlyOrAdminPermission]
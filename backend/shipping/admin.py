@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Shipment, TrackingEvent
+from .models import Shipment, TrackingEvent, PincodeServiceability
 
 
 class TrackingEventInline(admin.TabularInline):
@@ -40,6 +40,7 @@ class ShipmentAdmin(admin.ModelAdmin):
         'destination_area',
         'shipped_at',
         'delivered_at',
+        'unchanged_poll_count',
         'last_error'
     )
     
@@ -76,6 +77,10 @@ class ShipmentAdmin(admin.ModelAdmin):
             ),
             'classes': ('collapse',)
         }),
+        ('Tracking Schedule', {
+            'fields': ('next_poll_at', 'unchanged_poll_count'),
+            'classes': ('collapse',)
+        }),
         ('Error Tracking', {
             'fields': ('last_error',),
             'classes': ('collapse',)
@@ -121,7 +126,7 @@ class ShipmentAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Status'
     
     # Admin actions
-    actions = ['download_labels_as_zip', 'trigger_pickup']
+    actions = ['download_labels_as_zip', 'trigger_pickup', 'export_shipments_csv']
     
     def download_labels_as_zip(self, request, queryset):
         """Download selected shipment labels as a ZIP file"""
@@ -155,6 +160,14 @@ class ShipmentAdmin(admin.ModelAdmin):
         self.message_user(request, f"Pickup registration triggered for {len(shipment_ids)} shipments.")
     
     trigger_pickup.short_description = "Trigger pickup for selected shipments"
+    
+    def export_shipments_csv(self, request, queryset):
+        """Stream the selected shipments as CSV (date ranges: /admin/orders/export/)"""
+        from orders.exports import export_response
+        
+        return export_response('shipments', queryset)
+    
+    export_shipments_csv.short_description = "Export selected shipments as CSV"
 
 
 @admin.register(TrackingEvent)
@@ -168,3 +181,25 @@ class TrackingEventAdmin(admin.ModelAdmin):
     
     def has_add_permission(self, request):
         return False
+
+
+@admin.register(PincodeServiceability)
+class PincodeServiceabilityAdmin(admin.ModelAdmin):
+    """Admin interface for cached pincode serviceability"""
+    
+    list_display = ('pincode', 'serviceable', 'cod_available', 'area_code', 'transit_days', 'checked_at', 'expires_at')
+    list_filter = ('serviceable', 'cod_available', 'area_code')
+    search_fields = ('pincode', 'area_code', 'service_center')
+    readonly_fields = ('created_at', 'updated_at', 'checked_at')
+    actions = ['expire_entries']
+    
+    def expire_entries(self, request, queryset):
+        """Force selected pincodes to be re-checked with Blue Dart on next lookup"""
+        from .serviceability import expire_pincodes
+        
+        pincodes = list(queryset.values_list('pincode', flat=True))
+        expire_pincodes(pincodes)
+        
+        self.message_user(request, f"{len(pincodes)} pincodes will be re-checked on next lookup.")
+    
+    expire_entries.short_description = "Re-check selected pincodes with Blue Dart"
@@ -5,9 +5,13 @@ This module provides a client for interacting with Blue Dart's shipping APIs.
 Handles all SOAP communication, request/response parsing, and error handling.
 """
 import logging
+import os
 import base64
+import threading
 import requests
 import xmltodict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, date
 from decimal import Decimal
 
@@ -26,6 +30,7 @@ from .constants import (
     SUB_PRODUCT_PREPAID,
     PACK_TYPE_NON_DOCUMENTS,
 )
+from .wsdl_snapshots import local_wsdl
 from .utils import (
     to_bluedart_date,
     from_bluedart_date,
@@ -43,6 +48,151 @@ class BlueDartAPIError(Exception):
     pass
 
 
+# Process-wide registry of parsed zeep clients and the pooled HTTP session.
+# Parsing a WSDL is the expensive part of a cold client, so every
+# BlueDartClient in a process shares the same zeep Client per WSDL URL.
+_registry_lock = threading.RLock()
+_soap_clients = {}
+_http_session = None
+_shared_client = None
+
+ZEEP_SETTINGS = Settings(
+    strict=False,
+    xml_huge_tree=True
+)
+
+
+def _build_http_session():
+    """
+    Build a keep-alive session with connection pooling and retries.
+    
+    Connection errors are retried for every method. Read and 5xx errors are
+    only retried for GET (WSDL fetches, tracking), never for SOAP POSTs such
+    as GenerateWayBill which are not idempotent.
+    """
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=2,
+        status=2,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+    )
+    pool_size = max(
+        settings.BLUEDART_TRACKING_CONCURRENCY,
+        settings.BLUEDART_PRELOAD_CONCURRENCY,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=pool_size,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_http_session():
+    """Return the process-wide pooled requests.Session"""
+    global _http_session
+    if _http_session is None:
+        with _registry_lock:
+            if _http_session is None:
+                _http_session = _build_http_session()
+    return _http_session
+
+
+def get_soap_client(wsdl_url):
+    """
+    Return the process-wide zeep Client for a WSDL, parsing it on first use.
+    
+    The bundled snapshot under shipping/wsdl/ is used when present (see
+    wsdl_snapshots), so building a client needs no network access; otherwise
+    the WSDL is fetched from Blue Dart through zeep's SqliteCache.
+    
+    Args:
+        wsdl_url: WSDL URL from WSDL_ENDPOINTS
+        
+    Returns:
+        zeep.Client
+    """
+    client = _soap_clients.get(wsdl_url)
+    if client is None:
+        with _registry_lock:
+            client = _soap_clients.get(wsdl_url)
+            if client is None:
+                local_path = local_wsdl(wsdl_url) if settings.BLUEDART_USE_WSDL_SNAPSHOTS else None
+                
+                if local_path:
+                    transport = Transport(
+                        timeout=30,
+                        operation_timeout=30,
+                        session=get_http_session()
+                    )
+                    client = Client(local_path, transport=transport, settings=ZEEP_SETTINGS)
+                else:
+                    logger.info(f"No bundled WSDL snapshot for {wsdl_url}, fetching from Blue Dart")
+                    transport = Transport(
+                        cache=SqliteCache(),
+                        timeout=30,
+                        operation_timeout=30,
+                        session=get_http_session()
+                    )
+                    client = Client(wsdl_url, transport=transport, settings=ZEEP_SETTINGS)
+                _soap_clients[wsdl_url] = client
+    return client
+
+
+def get_bluedart_client():
+    """Return the process-wide shared BlueDartClient"""
+    global _shared_client
+    if _shared_client is None:
+        with _registry_lock:
+            if _shared_client is None:
+                _shared_client = BlueDartClient()
+    return _shared_client
+
+
+def preload_wsdl():
+    """
+    Parse the Finder, Waybill and Pickup WSDLs into the registry.
+    
+    Called at worker start so the first API call in a process doesn't pay
+    the parse cost. Failures are logged and retried lazily on first use.
+    """
+    client = get_bluedart_client()
+    for service in ('finder', 'waybill', 'pickup'):
+        try:
+            getattr(client, f'{service}_client')
+        except Exception as e:
+            logger.warning(f"Failed to preload Blue Dart {service} WSDL: {e}")
+    logger.info("Blue Dart WSDLs preloaded")
+
+
+def _reset_http_session_after_fork():
+    """
+    Give a forked child its own connection pool.
+    
+    Parsed zeep clients are kept, but sockets must not be shared with the
+    parent (e.g. gunicorn --preload or celery prefork).
+    """
+    global _http_session, _registry_lock
+    _registry_lock = threading.RLock()
+    if _http_session is None:
+        return
+    _http_session = _build_http_session()
+    for client in _soap_clients.values():
+        client.transport.session = _http_session
+    if _shared_client is not None:
+        _shared_client.http_session = _http_session
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_http_session_after_fork)
+
+
 class BlueDartClient:
     """
     Client for Blue Dart SOAP and REST APIs.
@@ -54,6 +204,9 @@ class BlueDartClient:
     - Shipment tracking
     - Pickup registration
     - Waybill cancellation
+    
+    Instances are cheap: parsed SOAP clients and the HTTP session come from
+    the process-wide registry. Use get_bluedart_client() to share one.
     """
     
     def __init__(self):
@@ -70,56 +223,23 @@ class BlueDartClient:
         env = 'demo' if self.demo_mode else 'production'
         self.wsdl_endpoints = WSDL_ENDPOINTS[env]
         
-        # Configure zeep transport with caching
-        transport = Transport(
-            cache=SqliteCache(),
-            timeout=30,
-            operation_timeout=30
-        )
-        zeep_settings = Settings(
-            strict=False,
-            xml_huge_tree=True
-        )
-        
-        # Initialize SOAP clients (lazy loaded)
-        self._finder_client = None
-        self._waybill_client = None
-        self._pickup_client = None
-        self.transport = transport
-        self.zeep_settings = zeep_settings
+        # Pooled keep-alive session shared with the SOAP transports
+        self.http_session = get_http_session()
     
     @property
     def finder_client(self):
-        """Lazy-load Finder SOAP client"""
-        if self._finder_client is None:
-            self._finder_client = Client(
-                self.wsdl_endpoints['finder'],
-                transport=self.transport,
-                settings=self.zeep_settings
-            )
-        return self._finder_client
+        """Shared Finder SOAP client"""
+        return get_soap_client(self.wsdl_endpoints['finder'])
     
     @property
     def waybill_client(self):
-        """Lazy-load Waybill SOAP client"""
-        if self._waybill_client is None:
-            self._waybill_client = Client(
-                self.wsdl_endpoints['waybill'],
-                transport=self.transport,
-                settings=self.zeep_settings
-            )
-        return self._waybill_client
+        """Shared Waybill SOAP client"""
+        return get_soap_client(self.wsdl_endpoints['waybill'])
     
     @property
     def pickup_client(self):
-        """Lazy-load Pickup SOAP client"""
-        if self._pickup_client is None:
-            self._pickup_client = Client(
-                self.wsdl_endpoints['pickup'],
-                transport=self.transport,
-                settings=self.zeep_settings
-            )
-        return self._pickup_client
+        """Shared Pickup SOAP client"""
+        return get_soap_client(self.wsdl_endpoints['pickup'])
     
     def _get_profile(self, customer_code=None):
         """
@@ -520,7 +640,112 @@ class BlueDartClient:
             logger.error(f"Unexpected error generating waybill for order #{order.id}: {e}")
             raise BlueDartAPIError(f"Unexpected error: {str(e)}")
     
-    def track_shipment(self, awb_number):
+    def _fetch_tracking(self, awb_numbers, timeout):
+        """
+        Call the tracking servlet for one or more AWBs.
+        
+        Args:
+            awb_numbers: List of AWB numbers (sent comma-separated)
+            timeout: HTTP timeout in seconds
+            
+        Returns:
+            list: Raw Shipment dicts parsed from the XML response
+        """
+        params = {
+            'handler': 'tnt',
+            'action': 'custawbquery',
+            'loginid': self.login_id,
+            'awb': 'awb',
+            'numbers': ','.join(awb_numbers),
+            'format': 'xml',
+            'lickey': self.tracking_licence_key,
+            'verno': '1.3',
+            'scan': '1',  # Full scan history
+        }
+        
+        response = self.http_session.get(TRACKING_API_BASE, params=params, timeout=timeout)
+        response.raise_for_status()
+        
+        # Parse XML response
+        data = xmltodict.parse(response.text)
+        
+        # Navigate through response structure
+        shipment_data = data.get('ShipmentData') or {}
+        shipments = shipment_data.get('Shipment') or []
+        
+        # Handle single shipment (not a list)
+        if isinstance(shipments, dict):
+            shipments = [shipments]
+        
+        return shipments
+    
+    def _parse_tracking_shipment(self, shipment):
+        """
+        Convert one raw Shipment element into a tracking result.
+        
+        Returns:
+            dict: {'current_status', 'scan_events', 'error'} as in track_shipment()
+        """
+        # Check for error
+        if shipment.get('Status') == 'Error':
+            return {
+                'current_status': None,
+                'scan_events': [],
+                'error': shipment.get('ErrorMessage', 'Unknown tracking error')
+            }
+        
+        # Extract scan details
+        scans = (shipment.get('Scans') or {}).get('ScanDetail', [])
+        
+        # Handle single scan (not a list)
+        if isinstance(scans, dict):
+            scans = [scans]
+        
+        scan_events = []
+        current_status = None
+        
+        for scan in scans:
+            scan_date_str = scan.get('ScanDate', '')
+            scan_time_str = scan.get('ScanTime', '')
+            scan_description = scan.get('Scan', '') or scan.get('ScanDescription', '')
+            scan_code = scan.get('ScanCode', '')
+            scanned_location = scan.get('ScannedLocation', '')
+            instructions = scan.get('Instructions', '')
+            
+            # Parse datetime
+            try:
+                scan_datetime = datetime.strptime(
+                    f"{scan_date_str} {scan_time_str}",
+                    '%Y-%m-%d %H:%M:%S'
+                )
+            except ValueError:
+                scan_datetime = None
+            
+            scan_events.append({
+                'scan_date': scan_datetime,
+                'scan_code': scan_code,
+                'scan_description': scan_description,
+                'scanned_location': scanned_location,
+                'instructions': instructions
+            })
+            
+            # Map Blue Dart status to our internal status
+            if scan_description and not current_status:
+                for bd_status, internal_status in BLUEDART_STATUS_MAP.items():
+                    if bd_status.lower() in scan_description.lower():
+                        current_status = internal_status
+                        break
+        
+        # Sort events by date (newest first)
+        scan_events.sort(key=lambda x: x['scan_date'] or datetime.min, reverse=True)
+        
+        return {
+            'current_status': current_status,
+            'scan_events': scan_events,
+            'error': None
+        }
+    
+    def track_shipment(self, awb_number, timeout=30):
         """
         Track a shipment and get all scan events.
         
@@ -528,6 +753,7 @@ class BlueDartClient:
         
         Args:
             awb_number: 11-digit AWB number
+            timeout: HTTP timeout in seconds
             
         Returns:
             dict: {
@@ -547,91 +773,19 @@ class BlueDartClient:
         """
         logger.info(f"Tracking shipment: {awb_number}")
         
-        params = {
-            'handler': 'tnt',
-            'action': 'custawbquery',
-            'loginid': self.login_id,
-            'awb': 'awb',
-            'numbers': awb_number,
-            'format': 'xml',
-            'lickey': self.tracking_licence_key,
-            'verno': '1.3',
-            'scan': '1',  # Full scan history
-        }
-        
         try:
-            response = requests.get(TRACKING_API_BASE, params=params, timeout=30)
-            response.raise_for_status()
+            shipments = self._fetch_tracking([awb_number], timeout)
+            result = self._parse_tracking_shipment(shipments[0] if shipments else {})
             
-            # Parse XML response
-            data = xmltodict.parse(response.text)
-            
-            # Navigate through response structure
-            shipment_data = data.get('ShipmentData', {})
-            shipment = shipment_data.get('Shipment', {})
-            
-            # Check for error
-            if isinstance(shipment, dict) and shipment.get('Status') == 'Error':
-                error_msg = shipment.get('ErrorMessage', 'Unknown tracking error')
-                logger.warning(f"Tracking error for {awb_number}: {error_msg}")
-                return {
-                    'current_status': None,
-                    'scan_events': [],
-                    'error': error_msg
-                }
-            
-            # Extract scan details
-            scans = shipment.get('Scans', {}).get('ScanDetail', [])
-            
-            # Handle single scan (not a list)
-            if isinstance(scans, dict):
-                scans = [scans]
-            
-            scan_events = []
-            current_status = None
-            
-            for scan in scans:
-                scan_date_str = scan.get('ScanDate', '')
-                scan_time_str = scan.get('ScanTime', '')
-                scan_description = scan.get('Scan', '') or scan.get('ScanDescription', '')
-                scan_code = scan.get('ScanCode', '')
-                scanned_location = scan.get('ScannedLocation', '')
-                instructions = scan.get('Instructions', '')
-                
-                # Parse datetime
-                try:
-                    scan_datetime = datetime.strptime(
-                        f"{scan_date_str} {scan_time_str}",
-                        '%Y-%m-%d %H:%M:%S'
-                    )
-                except ValueError:
-                    scan_datetime = None
-                
-                scan_events.append({
-                    'scan_date': scan_datetime,
-                    'scan_code': scan_code,
-                    'scan_description': scan_description,
-                    'scanned_location': scanned_location,
-                    'instructions': instructions
-                })
-                
-                # Map Blue Dart status to our internal status
-                if scan_description and not current_status:
-                    for bd_status, internal_status in BLUEDART_STATUS_MAP.items():
-                        if bd_status.lower() in scan_description.lower():
-                            current_status = internal_status
-                            break
-            
-            # Sort events by date (newest first)
-            scan_events.sort(key=lambda x: x['scan_date'] or datetime.min, reverse=True)
+            if result['error']:
+                logger.warning(f"Tracking error for {awb_number}: {result['error']}")
+            else:
+                logger.info(
+                    f"Tracking for {awb_number}: {len(result['scan_events'])} events, "
+                    f"status={result['current_status']}"
+                )
             
-            logger.info(f"Tracking for {awb_number}: {len(scan_events)} events, status={current_status}")
-            
-            return {
-                'current_status': current_status,
-                'scan_events': scan_events,
-                'error': None
-            }
+            return result
             
         except requests.RequestException as e:
             logger.error(f"HTTP error tracking {awb_number}: {e}")
@@ -640,6 +794,54 @@ class BlueDartClient:
             logger.error(f"Unexpected error tracking {awb_number}: {e}")
             raise BlueDartAPIError(f"Unexpected error: {str(e)}")
     
+    def track_shipments(self, awb_numbers, chunk_size=None, timeout=30):
+        """
+        Track many shipments with one tracking request per chunk of AWBs.
+        
+        The tracking servlet accepts a comma-separated list of numbers and
+        returns one Shipment element per AWB.
+        
+        Args:
+            awb_numbers: List of AWB numbers
+            chunk_size: AWBs per request (default BLUEDART_TRACKING_BATCH_SIZE)
+            timeout: HTTP timeout in seconds per request
+            
+        Returns:
+            dict: AWB number -> result dict in the same shape as track_shipment()
+        """
+        chunk_size = chunk_size or settings.BLUEDART_TRACKING_BATCH_SIZE
+        results = {}
+        
+        for start in range(0, len(awb_numbers), chunk_size):
+            chunk = awb_numbers[start:start + chunk_size]
+            logger.info(f"Tracking {len(chunk)} shipments in one request")
+            
+            try:
+                shipments = self._fetch_tracking(chunk, timeout)
+            except requests.RequestException as e:
+                logger.error(f"HTTP error tracking {len(chunk)} shipments: {e}")
+                raise BlueDartAPIError(f"Tracking API error: {str(e)}")
+            except Exception as e:
+                logger.error(f"Unexpected error tracking {len(chunk)} shipments: {e}")
+                raise BlueDartAPIError(f"Unexpected error: {str(e)}")
+            
+            for shipment in shipments:
+                awb_number = shipment.get('@WaybillNo')
+                if not awb_number and len(chunk) == 1:
+                    awb_number = chunk[0]
+                if awb_number in chunk:
+                    results[awb_number] = self._parse_tracking_shipment(shipment)
+            
+            for awb_number in chunk:
+                if awb_number not in results:
+                    results[awb_number] = {
+                        'current_status': None,
+                        'scan_events': [],
+                        'error': 'No tracking data returned'
+                    }
+        
+        return results
+    
     def register_pickup(self, shipments, pickup_date=None, pickup_time='16:00', close_time='18:00'):
         """
         Register a pickup request for multiple shipments.
@@ -39,6 +39,21 @@ BLUEDART_STATUS_MAP = {
     'Cancelled': 'cancelled',
 }
 
+# Tracking poll cadence (minutes) by shipment status, before backoff
+TRACKING_POLL_INTERVALS = {
+    'booked': 240,
+    'pickup_scheduled': 120,
+    'picked_up': 180,
+    'in_transit': 240,
+    'out_for_delivery': 30,
+    'undelivered': 120,
+    'rto_initiated': 360,
+}
+TRACKING_DUE_POLL_INTERVAL = 60  # Cap once expected delivery date is reached
+TRACKING_MAX_POLL_INTERVAL = 720  # Backoff never waits longer than 12 hours
+TRACKING_MAX_BACKOFF_STEPS = 3  # Interval doubles per unchanged poll, up to 8x
+TRACKING_STALE_AFTER_DAYS = 10  # Older undelivered shipments are polled half as often
+
 # WSDL Endpoints
 WSDL_ENDPOINTS = {
     'demo': {
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shipping.client import get_http_session
+from shipping.constants import WSDL_ENDPOINTS
+from shipping.wsdl_snapshots import check_drift, write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Snapshots Blue Dart WSDL/XSD documents into shipping/wsdl/, or checks them for drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--env',
+            choices=list(WSDL_ENDPOINTS) + ['all'],
+            default='all',
+            help='Blue Dart environment to snapshot (default: all)',
+        )
+        parser.add_argument(
+            '--service',
+            choices=sorted({service for services in WSDL_ENDPOINTS.values() for service in services}),
+            help='Only snapshot this service',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Compare the bundled snapshots with the live service instead of writing them',
+        )
+
+    def handle(self, *args, **options):
+        envs = list(WSDL_ENDPOINTS) if options['env'] == 'all' else [options['env']]
+        session = get_http_session()
+
+        differences = []
+        for env in envs:
+            for service in WSDL_ENDPOINTS[env]:
+                if options['service'] and service != options['service']:
+                    continue
+
+                if options['check']:
+                    differences += check_drift(env, service, session)
+                else:
+                    directory = write_snapshot(env, service, session)
+                    self.stdout.write(self.style.SUCCESS(f'{env}/{service} -> {directory}'))
+
+        if options['check']:
+            for difference in differences:
+                self.stdout.write(self.style.WARNING(difference))
+            if differences:
+                raise CommandError(f'{len(differences)} WSDL document(s) differ from the bundled snapshots')
+            self.stdout.write(self.style.SUCCESS('Bundled WSDL snapshots match the live service.'))
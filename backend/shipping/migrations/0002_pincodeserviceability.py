@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PincodeServiceability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pincode', models.CharField(max_length=6, unique=True)),
+                ('serviceable', models.BooleanField(default=False)),
+                ('cod_available', models.BooleanField(default=False)),
+                ('area_code', models.CharField(blank=True, help_text='3-character destination area code from Blue Dart', max_length=3, null=True)),
+                ('service_center', models.CharField(blank=True, max_length=100, null=True)),
+                ('transit_days', models.IntegerField(blank=True, help_text='Days from pickup to delivery for Domestic Priority', null=True)),
+                ('error', models.TextField(blank=True, help_text='Error message returned by Blue Dart on the last check', null=True)),
+                ('checked_at', models.DateTimeField(help_text='When Blue Dart was last queried for this pincode')),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='After this time the entry is refreshed from Blue Dart on next lookup')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Pincode serviceability',
+                'verbose_name_plural': 'Pincode serviceability',
+                'ordering': ['pincode'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0002_pincodeserviceability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='When the tracking poller should next query Blue Dart (empty = as soon as possible)', null=True),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='unchanged_poll_count',
+            field=models.PositiveIntegerField(default=0, help_text='Consecutive tracking polls without a status change'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0003_shipment_next_poll_at_shipment_unchanged_poll_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['-created_at', '-id'], name='shipping_sh_created_9cfab4_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0004_shipment_shipping_sh_created_9cfab4_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['updated_at'], name='shipping_sh_updated_767526_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trackingevent',
+            index=models.Index(fields=['created_at'], name='shipping_tr_created_28ac14_idx'),
+        ),
+    ]
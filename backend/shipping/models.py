@@ -1,7 +1,18 @@
+from datetime import timedelta
+
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from orders.models import Order
 
+from .constants import (
+    TRACKING_POLL_INTERVALS,
+    TRACKING_DUE_POLL_INTERVAL,
+    TRACKING_MAX_POLL_INTERVAL,
+    TRACKING_MAX_BACKOFF_STEPS,
+    TRACKING_STALE_AFTER_DAYS,
+)
+
 
 class Shipment(models.Model):
     """
@@ -100,6 +111,18 @@ class Shipment(models.Model):
     # Delivery estimates and actuals
     expected_delivery_date = models.DateField(null=True, blank=True)
 
+    # Adaptive tracking schedule
+    next_poll_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="When the tracking poller should next query Blue Dart (empty = as soon as possible)"
+    )
+    unchanged_poll_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Consecutive tracking polls without a status change"
+    )
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -126,6 +149,8 @@ class Shipment(models.Model):
         indexes = [
             models.Index(fields=['status', 'created_at']),
             models.Index(fields=['awb_number']),
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['updated_at']),  # Incremental columnar export
         ]
 
     def __str__(self):
@@ -137,6 +162,39 @@ class Shipment(models.Model):
         """Returns True if shipment is still in transit and needs tracking"""
         return self.status not in ['delivered', 'cancelled', 'rto_delivered']
 
+    def schedule_next_poll(self, status_changed, now=None):
+        """
+        Set next_poll_at after a tracking poll.
+        
+        The interval comes from the current status, is shortened once the
+        expected delivery date is reached, lengthened for shipments older
+        than TRACKING_STALE_AFTER_DAYS, and doubles for each consecutive
+        poll without a status change.
+        """
+        now = now or timezone.now()
+        
+        if not self.is_active():
+            self.next_poll_at = None
+            return
+        
+        if status_changed:
+            self.unchanged_poll_count = 0
+        else:
+            self.unchanged_poll_count += 1
+        
+        interval = TRACKING_POLL_INTERVALS.get(self.status, settings.BLUEDART_TRACKING_POLL_INTERVAL)
+        
+        if self.created_at and now - self.created_at > timedelta(days=TRACKING_STALE_AFTER_DAYS):
+            interval *= 2
+        
+        interval *= 2 ** min(self.unchanged_poll_count, TRACKING_MAX_BACKOFF_STEPS)
+        interval = min(interval, TRACKING_MAX_POLL_INTERVAL)
+        
+        if self.expected_delivery_date and timezone.localdate(now) >= self.expected_delivery_date:
+            interval = min(interval, TRACKING_DUE_POLL_INTERVAL)
+        
+        self.next_poll_at = now + timedelta(minutes=interval)
+    
     def get_status_display_color(self):
         """Returns color code for status badge in frontend"""
         color_map = {
@@ -195,7 +253,56 @@ class TrackingEvent(models.Model):
         ]
         indexes = [
             models.Index(fields=['shipment', '-scan_date']),
+            models.Index(fields=['created_at']),  # Incremental columnar export
         ]
 
     def __str__(self):
         return f"{self.scan_description} at {self.scanned_location}"
+
+
+class PincodeServiceability(models.Model):
+    """
+    Cached Blue Dart serviceability and transit time for a destination pincode.
+    Refreshed from the Finder API once expires_at has passed.
+    """
+    pincode = models.CharField(max_length=6, unique=True)
+    serviceable = models.BooleanField(default=False)
+    cod_available = models.BooleanField(default=False)
+    area_code = models.CharField(
+        max_length=3,
+        null=True,
+        blank=True,
+        help_text="3-character destination area code from Blue Dart"
+    )
+    service_center = models.CharField(max_length=100, null=True, blank=True)
+    transit_days = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="Days from pickup to delivery for Domestic Priority"
+    )
+    error = models.TextField(
+        null=True,
+        blank=True,
+        help_text="Error message returned by Blue Dart on the last check"
+    )
+
+    # Refresh metadata
+    checked_at = models.DateTimeField(help_text="When Blue Dart was last queried for this pincode")
+    expires_at = models.DateTimeField(
+        db_index=True,
+        help_text="After this time the entry is refreshed from Blue Dart on next lookup"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['pincode']
+        verbose_name = 'Pincode serviceability'
+        verbose_name_plural = 'Pincode serviceability'
+
+    def __str__(self):
+        return f"{self.pincode} ({'serviceable' if self.serviceable else 'not serviceable'})"
+
+    def is_expired(self):
+        """Returns True if the entry must be refreshed from Blue Dart"""
+        return self.expires_at <= timezone.now()
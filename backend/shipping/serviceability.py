@@ -0,0 +1,338 @@
+"""
+Cached pincode serviceability lookups.
+
+Lookups are answered from the shared cache first, then from the
+PincodeServiceability table. Blue Dart's Finder API is only called on a
+miss or once the stored entry has expired.
+
+The table is kept warm for every pincode in the bundled master CSV by the
+nightly preload_pincode_master task, so the live API is normally only a
+fallback for pincodes missing from the master.
+"""
+import csv
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .client import BlueDartAPIError, get_bluedart_client
+from .models import PincodeServiceability
+from .utils import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'shipping:pincode:'
+
+# How long a stale entry is served from cache while Blue Dart is failing
+STALE_CACHE_SECONDS = 300
+
+
+def _cache_key(pincode):
+    return f"{CACHE_KEY_PREFIX}{pincode}"
+
+
+def _record_payload(record):
+    """Plain dict of the stored fields, safe to put in the shared cache"""
+    return {
+        'serviceable': record.serviceable,
+        'cod_available': record.cod_available,
+        'area_code': record.area_code,
+        'transit_days': record.transit_days,
+        'error': record.error,
+        'expires_at': record.expires_at,
+    }
+
+
+def _cache_payload(pincode, payload, timeout=None):
+    if timeout is None:
+        timeout = int((payload['expires_at'] - timezone.now()).total_seconds())
+    if timeout > 0:
+        cache.set(_cache_key(pincode), payload, timeout=timeout)
+
+
+def _build_response(payload):
+    """
+    Build the check-serviceability response from a cached payload.
+
+    The expected delivery date is derived from transit_days at read time so
+    a cached entry stays correct across days.
+    """
+    if not payload['serviceable']:
+        return {
+            'serviceable': False,
+            'cod_available': False,
+            'expected_delivery_date': None,
+            'transit_days': None,
+            'area_code': None,
+            'error': payload['error'],
+        }
+
+    transit_days = payload['transit_days']
+    expected_delivery_date = None
+    if transit_days is not None:
+        expected_delivery_date = timezone.localdate() + timedelta(days=transit_days)
+
+    return {
+        'serviceable': True,
+        'cod_available': payload['cod_available'],
+        'expected_delivery_date': expected_delivery_date,
+        'transit_days': transit_days,
+        'area_code': payload['area_code'],
+        'error': payload['error'],
+    }
+
+
+def fetch_pincode_serviceability(pincode, client):
+    """
+    Query Blue Dart for a pincode without touching the database.
+
+    Args:
+        pincode: 6-digit destination pincode
+        client: BlueDartClient to use
+
+    Returns:
+        dict: PincodeServiceability field values for this pincode
+
+    Raises:
+        BlueDartAPIError: If the Finder API call fails
+    """
+    serviceability_result = client.check_serviceability(pincode)
+    transit_result = {}
+    if serviceability_result['serviceable']:
+        transit_result = client.get_transit_time(pincode)
+
+    error = transit_result.get('error') or serviceability_result.get('error')
+
+    # Negative and errored answers are re-checked sooner
+    if serviceability_result['serviceable'] and not error:
+        ttl_hours = settings.BLUEDART_SERVICEABILITY_TTL_HOURS
+    else:
+        ttl_hours = settings.BLUEDART_SERVICEABILITY_NEGATIVE_TTL_HOURS
+
+    now = timezone.now()
+    return {
+        'serviceable': bool(serviceability_result['serviceable']),
+        'cod_available': bool(serviceability_result['cod_available']),
+        'area_code': transit_result.get('area_code'),
+        'service_center': transit_result.get('service_center'),
+        'transit_days': transit_result.get('transit_days'),
+        'error': error,
+        'checked_at': now,
+        'expires_at': now + timedelta(hours=ttl_hours),
+    }
+
+
+def refresh_pincode(pincode, client=None):
+    """
+    Query Blue Dart for a pincode and upsert its PincodeServiceability row.
+
+    Args:
+        pincode: 6-digit destination pincode
+        client: Optional BlueDartClient (default the shared client)
+
+    Returns:
+        PincodeServiceability: The refreshed record
+
+    Raises:
+        BlueDartAPIError: If the Finder API call fails
+    """
+    client = client or get_bluedart_client()
+
+    record, _ = PincodeServiceability.objects.update_or_create(
+        pincode=pincode,
+        defaults=fetch_pincode_serviceability(pincode, client)
+    )
+
+    _cache_payload(pincode, _record_payload(record))
+    return record
+
+
+def store_pincode_results(results):
+    """
+    Upsert a batch of fetched pincode results in one statement and cache them.
+
+    Args:
+        results: Dict of pincode -> fetch_pincode_serviceability() values
+    """
+    if not results:
+        return
+
+    records = [
+        PincodeServiceability(pincode=pincode, **values)
+        for pincode, values in results.items()
+    ]
+    PincodeServiceability.objects.bulk_create(
+        records,
+        update_conflicts=True,
+        unique_fields=['pincode'],
+        update_fields=[
+            'serviceable',
+            'cod_available',
+            'area_code',
+            'service_center',
+            'transit_days',
+            'error',
+            'checked_at',
+            'expires_at',
+            'updated_at',
+        ],
+    )
+
+    cache.set_many({
+        _cache_key(record.pincode): _record_payload(record)
+        for record in records
+    }, timeout=settings.BLUEDART_SERVICEABILITY_NEGATIVE_TTL_HOURS * 3600)
+
+
+def expire_pincodes(pincodes):
+    """Force the given pincodes to be re-checked with Blue Dart on next lookup"""
+    PincodeServiceability.objects.filter(pincode__in=pincodes).update(expires_at=timezone.now())
+    cache.delete_many([_cache_key(pincode) for pincode in pincodes])
+
+
+def get_stored_serviceability(pincode):
+    """
+    Return serviceability for a pincode from the cache or table only.
+
+    Args:
+        pincode: 6-digit destination pincode
+
+    Returns:
+        dict: Same shape as the check-serviceability API response, or None
+            if Blue Dart has to be queried (no entry, or it has expired)
+    """
+    payload = cache.get(_cache_key(pincode))
+    if payload is not None:
+        return _build_response(payload)
+
+    record = PincodeServiceability.objects.filter(pincode=pincode).first()
+    if record and not record.is_expired():
+        payload = _record_payload(record)
+        _cache_payload(pincode, payload)
+        return _build_response(payload)
+    return None
+
+
+def get_pincode_serviceability(pincode, client=None):
+    """
+    Return serviceability and transit time for a pincode.
+
+    Args:
+        pincode: 6-digit destination pincode
+        client: Optional BlueDartClient used if Blue Dart has to be queried
+
+    Returns:
+        dict: Same shape as the check-serviceability API response
+
+    Raises:
+        BlueDartAPIError: If Blue Dart fails and there is no stored entry
+    """
+    response = get_stored_serviceability(pincode)
+    if response is not None:
+        return response
+
+    record = PincodeServiceability.objects.filter(pincode=pincode).first()
+    try:
+        record = refresh_pincode(pincode, client=client)
+    except BlueDartAPIError:
+        if record is None:
+            raise
+        # Serve the expired entry rather than failing the product page
+        logger.warning(f"Blue Dart unavailable, serving stale serviceability for {pincode}")
+        payload = _record_payload(record)
+        _cache_payload(pincode, payload, timeout=STALE_CACHE_SECONDS)
+        return _build_response(payload)
+
+    return _build_response(_record_payload(record))
+
+
+def load_pincode_master(path=None):
+    """
+    Read the bundled pincode master CSV.
+
+    Args:
+        path: CSV file with a 'pincode' column (default BLUEDART_PINCODE_CSV)
+
+    Returns:
+        list: Sorted, de-duplicated 6-digit pincodes
+    """
+    path = path or settings.BLUEDART_PINCODE_CSV
+    with open(path, newline='', encoding='utf-8') as f:
+        pincodes = {
+            row['pincode'].strip()
+            for row in csv.DictReader(f)
+            if row.get('pincode') and row['pincode'].strip().isdigit()
+            and len(row['pincode'].strip()) == 6
+        }
+    return sorted(pincodes)
+
+
+def preload_pincode_master(pincodes, concurrency=None, rate_per_second=None, batch_size=None):
+    """
+    Refresh the PincodeServiceability table for every given pincode.
+
+    Pincodes checked within BLUEDART_PRELOAD_MIN_AGE_HOURS are skipped and
+    each batch is stored as soon as it completes, so an interrupted run
+    resumes from the last stored batch.
+
+    Args:
+        pincodes: Iterable of 6-digit pincodes
+        concurrency: Worker threads calling Blue Dart
+        rate_per_second: Max pincodes queried per second across all workers
+        batch_size: Pincodes fetched and stored per batch
+
+    Returns:
+        dict: {'refreshed': int, 'skipped': int, 'errors': int}
+    """
+    concurrency = concurrency or settings.BLUEDART_PRELOAD_CONCURRENCY
+    rate_per_second = rate_per_second or settings.BLUEDART_PRELOAD_RATE_PER_SECOND
+    batch_size = batch_size or settings.BLUEDART_PRELOAD_BATCH_SIZE
+
+    pincodes = sorted(set(pincodes))
+    cutoff = timezone.now() - timedelta(hours=settings.BLUEDART_PRELOAD_MIN_AGE_HOURS)
+    recently_checked = set(
+        PincodeServiceability.objects.filter(
+            checked_at__gte=cutoff
+        ).values_list('pincode', flat=True)
+    )
+    pending = [pincode for pincode in pincodes if pincode not in recently_checked]
+
+    logger.info(
+        f"Pincode preload: {len(pending)} to refresh, {len(pincodes) - len(pending)} recently checked"
+    )
+
+    limiter = RateLimiter(rate_per_second)
+    client = get_bluedart_client()
+
+    def fetch(pincode):
+        limiter.wait()
+        try:
+            return pincode, fetch_pincode_serviceability(pincode, client)
+        except BlueDartAPIError as e:
+            logger.warning(f"Pincode preload failed for {pincode}: {e}")
+            return pincode, None
+
+    refreshed = 0
+    errors = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            results = {}
+            for pincode, values in executor.map(fetch, batch):
+                if values is None:
+                    errors += 1
+                else:
+                    results[pincode] = values
+
+            store_pincode_results(results)
+            refreshed += len(results)
+            logger.info(f"Pincode preload progress: {start + len(batch)}/{len(pending)} (last {batch[-1]})")
+
+    return {
+        'refreshed': refreshed,
+        'skipped': len(pincodes) - len(pending),
+        'errors': errors,
+    }
@@ -2,13 +2,18 @@
 Celery tasks for Blue Dart shipping automation
 """
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 from datetime import datetime, timedelta
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
 from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
 
 from .models import Shipment, TrackingEvent
-from .client import BlueDartClient, BlueDartAPIError
+from .client import BlueDartAPIError, get_bluedart_client
 from orders.models import Order
 
 logger = logging.getLogger(__name__)
@@ -48,7 +53,7 @@ def generate_shipment_for_order(self, order_id):
             return
         
         # Initialize Blue Dart client
-        client = BlueDartClient()
+        client = get_bluedart_client()
         
         # Set COD parameters
         sub_product_code = 'C' if is_cod else 'P'
@@ -117,85 +122,260 @@ def generate_shipment_for_order(self, order_id):
         raise self.retry(exc=e)
 
 
+def _apply_tracking_batch(shipments_by_awb, results):
+    """
+    Apply a batch of tracking API results to their shipments.
+    
+    Existing event keys for the whole batch are loaded in one query, only
+    new scan events are inserted (one bulk_create), and every polled
+    shipment's status and next poll time are written with one bulk_update.
+    
+    Args:
+        shipments_by_awb: Dict of AWB number -> Shipment
+        results: Dict of AWB number -> track_shipments() result
+        
+    Returns:
+        tuple: (status_changed_count, error_count)
+    """
+    now = timezone.now()
+    polled_shipments = []
+    status_changes = []
+    error_count = 0
+    tracked = []
+    
+    for awb_number, result in results.items():
+        shipment = shipments_by_awb[awb_number]
+        polled_shipments.append(shipment)
+        shipment.updated_at = now
+        
+        if result['error']:
+            shipment.last_error = result['error']
+            shipment.schedule_next_poll(status_changed=False, now=now)
+            error_count += 1
+            continue
+        
+        tracked.append((shipment, result['scan_events']))
+        
+        new_status = result['current_status']
+        status_changed = bool(new_status) and new_status != shipment.status
+        
+        if status_changed:
+            logger.info(f"Shipment {shipment.awb_number} status changed: {shipment.status} -> {new_status}")
+            shipment.status = new_status
+            
+            # Set timestamps based on status
+            if new_status == 'picked_up' and not shipment.shipped_at:
+                shipment.shipped_at = now
+            elif new_status == 'delivered' and not shipment.delivered_at:
+                shipment.delivered_at = now
+            
+            status_changes.append(shipment)
+        
+        shipment.schedule_next_poll(status_changed=status_changed, now=now)
+    
+    # Diff scan events against what is already stored for this batch
+    existing_keys = set(
+        TrackingEvent.objects.filter(
+            shipment__in=[shipment for shipment, _ in tracked]
+        ).values_list('shipment_id', 'scan_date', 'scan_code', 'scanned_location')
+    )
+    
+    new_events = []
+    for shipment, scan_events in tracked:
+        for event_data in scan_events:
+            if not event_data['scan_date']:
+                continue
+            
+            scan_date = event_data['scan_date']
+            if timezone.is_naive(scan_date):
+                scan_date = timezone.make_aware(scan_date)
+            
+            key = (shipment.id, scan_date, event_data['scan_code'], event_data['scanned_location'])
+            if key in existing_keys:
+                continue
+            existing_keys.add(key)
+            
+            new_events.append(TrackingEvent(
+                shipment=shipment,
+                scan_date=scan_date,
+                scan_code=event_data['scan_code'],
+                scanned_location=event_data['scanned_location'],
+                scan_description=event_data['scan_description'],
+                instructions=event_data.get('instructions', '')
+            ))
+    
+    with transaction.atomic():
+        if new_events:
+            TrackingEvent.objects.bulk_create(new_events, ignore_conflicts=True)
+        if polled_shipments:
+            Shipment.objects.bulk_update(
+                polled_shipments,
+                [
+                    'status',
+                    'shipped_at',
+                    'delivered_at',
+                    'last_error',
+                    'next_poll_at',
+                    'unchanged_poll_count',
+                    'updated_at',
+                ]
+            )
+    
+    # Send notification email for significant status changes
+    notify_statuses = ['picked_up', 'in_transit', 'out_for_delivery', 'delivered']
+    for shipment in status_changes:
+        if shipment.status in notify_statuses:
+            try:
+                from accounts.tasks import send_shipment_update_email_task
+                send_shipment_update_email_task.delay(shipment.order_id, shipment.status)
+            except Exception as e:
+                logger.warning(f"Failed to queue shipment update email: {e}")
+    
+    return len(status_changes), error_count
+
+
 @shared_task
 def poll_active_shipments():
     """
-    Poll Blue Dart tracking API for all active shipments.
+    Poll Blue Dart tracking API for active shipments that are due.
     
-    Scheduled via Celery Beat: Every 2 hours.
-    Updates shipment status and creates tracking events.
+    Scheduled via Celery Beat: Every 15 minutes. Each shipment is only
+    tracked once its next_poll_at has passed (see Shipment.schedule_next_poll).
+    AWBs are tracked BLUEDART_TRACKING_BATCH_SIZE at a time, with the chunk
+    requests fanned out across a bounded thread pool sharing one keep-alive
+    session; each chunk's results are written back on the task thread with
+    bulk queries as they arrive.
+    Shipments still pending when BLUEDART_TRACKING_POLL_DEADLINE passes are
+    left for the next poll.
     """
     logger.info("Starting tracking poll for active shipments")
     
-    # Get all non-delivered shipments with AWB numbers
-    active_shipments = Shipment.objects.filter(
+    # Get all non-delivered shipments with AWB numbers that are due
+    active_shipments = list(Shipment.objects.filter(
+        Q(next_poll_at__isnull=True) | Q(next_poll_at__lte=timezone.now()),
         awb_number__isnull=False
     ).exclude(
         status__in=['delivered', 'cancelled', 'rto_delivered']
-    )
+    ))
     
-    logger.info(f"Found {active_shipments.count()} active shipments to track")
+    logger.info(f"Found {len(active_shipments)} active shipments due for tracking")
     
-    client = BlueDartClient()
+    if not active_shipments:
+        return
+    
+    client = get_bluedart_client()
     updated_count = 0
     error_count = 0
+    deadline = time.monotonic() + settings.BLUEDART_TRACKING_POLL_DEADLINE
     
-    for shipment in active_shipments:
-        try:
-            result = client.track_shipment(shipment.awb_number)
+    # One tracking request per chunk of AWBs
+    shipments_by_awb = {shipment.awb_number: shipment for shipment in active_shipments}
+    awb_numbers = list(shipments_by_awb)
+    chunk_size = settings.BLUEDART_TRACKING_BATCH_SIZE
+    chunks = [awb_numbers[i:i + chunk_size] for i in range(0, len(awb_numbers), chunk_size)]
+    
+    executor = ThreadPoolExecutor(max_workers=settings.BLUEDART_TRACKING_CONCURRENCY)
+    futures = {
+        executor.submit(
+            client.track_shipments,
+            chunk,
+            chunk_size=chunk_size,
+            timeout=settings.BLUEDART_TRACKING_TIMEOUT
+        ): chunk
+        for chunk in chunks
+    }
+    processed = 0
+    
+    try:
+        for future in as_completed(futures, timeout=settings.BLUEDART_TRACKING_POLL_DEADLINE):
+            chunk = futures[future]
+            processed += len(chunk)
             
-            if result['error']:
-                shipment.last_error = result['error']
-                shipment.save()
-                error_count += 1
+            try:
+                results = future.result()
+            except Exception as e:
+                logger.error(f"Error tracking {len(chunk)} shipments: {e}")
+                error_count += len(chunk)
                 continue
             
-            # Update shipment status
-            if result['current_status']:
-                old_status = shipment.status
-                shipment.status = result['current_status']
-                
-                # Set timestamps based on status
-                if shipment.status == 'picked_up' and not shipment.shipped_at:
-                    shipment.shipped_at = timezone.now()
-                elif shipment.status == 'delivered' and not shipment.delivered_at:
-                    shipment.delivered_at = timezone.now()
-                
-                shipment.save()
-                
-                if old_status != shipment.status:
-                    logger.info(f"Shipment {shipment.awb_number} status changed: {old_status} -> {shipment.status}")
-                    updated_count += 1
-                    
-                    # Send notification email for significant status changes
-                    notify_statuses = ['picked_up', 'in_transit', 'out_for_delivery', 'delivered']
-                    if shipment.status in notify_statuses:
-                        try:
-                            from accounts.tasks import send_shipment_update_email_task
-                            send_shipment_update_email_task.delay(shipment.order_id, shipment.status)
-                        except Exception as e:
-                            logger.warning(f"Failed to queue shipment update email: {e}")
-            
-            # Create/update tracking events
-            for event_data in result['scan_events']:
-                TrackingEvent.objects.get_or_create(
-                    shipment=shipment,
-                    scan_date=event_data['scan_date'],
-                    scan_code=event_data['scan_code'],
-                    scanned_location=event_data['scanned_location'],
-                    defaults={
-                        'scan_description': event_data['scan_description'],
-                        'instructions': event_data.get('instructions', '')
-                    }
-                )
+            try:
+                batch_updated, batch_errors = _apply_tracking_batch(shipments_by_awb, results)
+                updated_count += batch_updated
+                error_count += batch_errors
+            except Exception as e:
+                logger.error(f"Error saving tracking results for {len(chunk)} shipments: {e}")
+                error_count += len(chunk)
             
-        except Exception as e:
-            logger.error(f"Error tracking shipment {shipment.awb_number}: {e}")
-            error_count += 1
+            if time.monotonic() > deadline:
+                raise FuturesTimeoutError()
+    except FuturesTimeoutError:
+        logger.warning(
+            f"Tracking poll deadline reached, {len(awb_numbers) - processed} shipments left for next poll"
+        )
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
     
     logger.info(f"Tracking poll complete: {updated_count} updated, {error_count} errors")
 
 
+@shared_task
+def preload_pincode_master():
+    """
+    Refresh serviceability for every pincode in the bundled pincode master.
+    
+    Scheduled via Celery Beat: Nightly at 2:30 AM IST.
+    Uses bounded concurrency and a shared rate limit against Blue Dart, and
+    skips pincodes already refreshed in this cycle so a killed run resumes.
+    """
+    from .serviceability import load_pincode_master, preload_pincode_master as preload
+    
+    pincodes = load_pincode_master()
+    logger.info(f"Starting pincode master preload for {len(pincodes)} pincodes")
+    
+    result = preload(pincodes)
+    
+    logger.info(
+        f"Pincode preload complete: {result['refreshed']} refreshed, "
+        f"{result['skipped']} skipped, {result['errors']} errors"
+    )
+    return result
+
+
+@shared_task
+def check_wsdl_drift():
+    """
+    Compare the bundled Blue Dart WSDL snapshots with the live service.
+    
+    Not scheduled by default; add it to Celery Beat once snapshots are
+    committed. Logs an error for every changed document so the snapshots can
+    be refreshed with `manage.py snapshot_wsdl`. Services without a snapshot
+    are skipped.
+    """
+    from .constants import WSDL_ENDPOINTS
+    from .client import get_http_session
+    from .wsdl_snapshots import MANIFEST_FILENAME, check_drift, snapshot_path
+    
+    differences = []
+    checked = 0
+    for env, services in WSDL_ENDPOINTS.items():
+        for service in services:
+            if not (snapshot_path(env, service) / MANIFEST_FILENAME).exists():
+                logger.debug(f"No WSDL snapshot bundled for {env}/{service}, skipping drift check")
+                continue
+            checked += 1
+            try:
+                differences += check_drift(env, service, get_http_session())
+            except Exception as e:
+                logger.warning(f"WSDL drift check failed for {env}/{service}: {e}")
+    
+    for difference in differences:
+        logger.error(f"Blue Dart WSDL drift: {difference}")
+    
+    if checked and not differences:
+        logger.info("Blue Dart WSDL snapshots match the live service")
+    return differences
+
+
 @shared_task
 def register_daily_pickup():
     """
@@ -222,7 +402,7 @@ def register_daily_pickup():
     
     logger.info(f"Registering pickup for {shipments_to_pickup.count()} shipments")
     
-    client = BlueDartClient()
+    client = get_bluedart_client()
     
     try:
         result = client.register_pickup(shipments=list(shipments_to_pickup))
@@ -235,7 +415,8 @@ def register_daily_pickup():
         pickup_token = result['pickup_token']
         shipments_to_pickup.update(
             pickup_token=pickup_token,
-            status='pickup_scheduled'
+            status='pickup_scheduled',
+            updated_at=timezone.now()
         )
         
         logger.info(f"Pickup registered successfully: Token {pickup_token} for {shipments_to_pickup.count()} shipments")
@@ -263,7 +444,7 @@ def register_shipment_pickup(shipment_ids):
         logger.warning("No valid shipments found for pickup registration")
         return
     
-    client = BlueDartClient()
+    client = get_bluedart_client()
     
     try:
         result = client.register_pickup(shipments=list(shipments))
@@ -275,7 +456,8 @@ def register_shipment_pickup(shipment_ids):
         pickup_token = result['pickup_token']
         shipments.update(
             pickup_token=pickup_token,
-            status='pickup_scheduled'
+            status='pickup_scheduled',
+            updated_at=timezone.now()
         )
         
         logger.info(f"Pickup registered: Token {pickup_token} for {shipments.count()} shipments")
@@ -310,7 +492,7 @@ def cancel_shipment(self, shipment_id):
     
     logger.info(f"Cancelling shipment {shipment.awb_number}")
     
-    client = BlueDartClient()
+    client = get_bluedart_client()
     
     try:
         result = client.cancel_waybill(shipment.awb_number)
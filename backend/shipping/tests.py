@@ -1,3 +1,579 @@
-from django.test import TestCase
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.pagination import CursorPagination
+from rest_framework.test import APIClient
+from rest_framework.throttling import AnonRateThrottle
+
+from orders.models import Order
+
+from . import client as bluedart
+from . import wsdl_snapshots
+from .client import BlueDartAPIError, BlueDartClient
+from .constants import WSDL_ENDPOINTS
+from .models import PincodeServiceability, Shipment, TrackingEvent
+from .serviceability import get_pincode_serviceability, load_pincode_master, preload_pincode_master
+from .tasks import _apply_tracking_batch, check_wsdl_drift, poll_active_shipments
+
+
+def finder_client(serviceable=True, transit_days=2, error=None):
+    """Stand-in BlueDartClient answering the Finder calls"""
+    client = mock.Mock()
+    client.check_serviceability.return_value = {
+        'serviceable': serviceable, 'cod_available': serviceable, 'error': error,
+    }
+    client.get_transit_time.return_value = {
+        'area_code': 'BLR', 'service_center': 'Bangalore', 'transit_days': transit_days, 'error': None,
+    }
+    return client
+
+
+def make_shipment(awb_number, status='in_transit', user=None, **fields):
+    """Order plus booked shipment for the tracking tests"""
+    if user is None:
+        user, _ = get_user_model().objects.get_or_create(
+            username='tracking', defaults={'email': 'tracking@example.com'}
+        )
+    order = Order.objects.create(
+        user=user, first_name='Asha', last_name='Rao', email='asha@example.com', phone='9999999999',
+        address='12 MG Road', city='Bengaluru', state='Karnataka', pincode='560001', total=Decimal('499.00'),
+    )
+    return Shipment.objects.create(
+        order=order, awb_number=awb_number, status=status, origin_area='BOM',
+        destination_pincode='560001', weight_kg=Decimal('0.50'), declared_value=Decimal('499.00'), **fields
+    )
+
+
+def tracking_result(status=None, events=(), error=None):
+    """track_shipments() result for one AWB"""
+    return {'current_status': status, 'scan_events': list(events), 'error': error}
+
+
+def tracking_xml(*shipments):
+    """Tracking servlet response for (awb_number, scan) pairs; scan None = error"""
+    elements = []
+    for awb_number, scan in shipments:
+        if scan is None:
+            elements.append(
+                f'<Shipment WaybillNo="{awb_number}"><Status>Error</Status>'
+                f'<ErrorMessage>Invalid AWB</ErrorMessage></Shipment>'
+            )
+        else:
+            elements.append(
+                f'<Shipment WaybillNo="{awb_number}"><Status>{scan}</Status><Scans><ScanDetail>'
+                f'<Scan>{scan}</Scan><ScanCode>001</ScanCode><ScanDate>2026-10-01</ScanDate>'
+                f'<ScanTime>10:30:00</ScanTime><ScannedLocation>BANGALORE HUB</ScannedLocation>'
+                f'</ScanDetail></Scans></Shipment>'
+            )
+    response = mock.Mock(text=f'<ShipmentData>{"".join(elements)}</ShipmentData>')
+    response.raise_for_status.return_value = None
+    return response
+
+
+class PincodeServiceabilityCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_miss_queries_blue_dart_and_stores_the_answer(self):
+        client = finder_client()
+
+        result = get_pincode_serviceability('560001', client=client)
+
+        self.assertTrue(result['serviceable'])
+        self.assertEqual(result['transit_days'], 2)
+        self.assertEqual(result['expected_delivery_date'], timezone.localdate() + timedelta(days=2))
+        client.check_serviceability.assert_called_once_with('560001')
+        self.assertTrue(PincodeServiceability.objects.filter(pincode='560001', serviceable=True).exists())
+
+    def test_repeat_lookup_is_served_from_cache(self):
+        get_pincode_serviceability('560001', client=finder_client())
+        client = finder_client()
+
+        with self.assertNumQueries(0):
+            result = get_pincode_serviceability('560001', client=client)
+
+        self.assertTrue(result['serviceable'])
+        client.check_serviceability.assert_not_called()
+
+    def test_unexpired_row_is_used_when_cache_is_empty(self):
+        get_pincode_serviceability('560001', client=finder_client())
+        cache.clear()
+        client = finder_client()
+
+        result = get_pincode_serviceability('560001', client=client)
+
+        self.assertEqual(result['area_code'], 'BLR')
+        client.check_serviceability.assert_not_called()
+
+    def test_expired_row_is_refreshed(self):
+        get_pincode_serviceability('560001', client=finder_client())
+        PincodeServiceability.objects.filter(pincode='560001').update(expires_at=timezone.now())
+        cache.clear()
+        client = finder_client(transit_days=4)
+
+        result = get_pincode_serviceability('560001', client=client)
+
+        self.assertEqual(result['transit_days'], 4)
+        client.check_serviceability.assert_called_once()
+
+    def test_negative_answers_expire_sooner(self):
+        get_pincode_serviceability('560001', client=finder_client())
+        get_pincode_serviceability('999999', client=finder_client(serviceable=False))
+
+        positive = PincodeServiceability.objects.get(pincode='560001')
+        negative = PincodeServiceability.objects.get(pincode='999999')
+        self.assertLess(negative.expires_at, positive.expires_at)
+
+    def test_stale_row_is_served_when_blue_dart_fails(self):
+        get_pincode_serviceability('560001', client=finder_client())
+        PincodeServiceability.objects.filter(pincode='560001').update(expires_at=timezone.now())
+        cache.clear()
+        client = finder_client()
+        client.check_serviceability.side_effect = BlueDartAPIError('timeout')
+
+        with self.assertLogs('shipping.serviceability', level='WARNING'):
+            result = get_pincode_serviceability('560001', client=client)
+
+        self.assertTrue(result['serviceable'])
+
+    def test_failure_without_stored_row_raises(self):
+        client = finder_client()
+        client.check_serviceability.side_effect = BlueDartAPIError('timeout')
+
+        with self.assertRaises(BlueDartAPIError):
+            get_pincode_serviceability('560001', client=client)
+
+
+class PincodeMasterPreloadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_master_keeps_valid_unique_pincodes(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('pincode,office\n560001,A\n560001,B\n12345,C\nabcdef,D\n110001,E\n')
+
+        self.assertEqual(load_pincode_master(f.name), ['110001', '560001'])
+
+    @override_settings(BLUEDART_PRELOAD_RATE_PER_SECOND=0, BLUEDART_PRELOAD_BATCH_SIZE=2)
+    def test_preload_stores_results_and_skips_recent_pincodes(self):
+        get_pincode_serviceability('110001', client=finder_client())
+        client = finder_client()
+
+        def check_serviceability(pincode):
+            if pincode == '400001':
+                raise BlueDartAPIError('timeout')
+            return {'serviceable': True, 'cod_available': False, 'error': None}
+
+        client.check_serviceability.side_effect = check_serviceability
+
+        with mock.patch('shipping.serviceability.get_bluedart_client', return_value=client), \
+                self.assertLogs('shipping.serviceability', level='INFO'):
+            result = preload_pincode_master(['110001', '380001', '400001', '560001'])
+
+        self.assertEqual(result, {'refreshed': 2, 'skipped': 1, 'errors': 1})
+        self.assertEqual(
+            set(PincodeServiceability.objects.values_list('pincode', flat=True)),
+            {'110001', '380001', '560001'},
+        )
+        # Stored answers are cached for the product page
+        self.assertEqual(get_pincode_serviceability('380001', client=mock.Mock())['area_code'], 'BLR')
+
+
+@mock.patch.object(AnonRateThrottle, 'rate', '1/minute', create=True)
+class CheckServiceabilityThrottleTests(TestCase):
+    url = '/api/shipping/check-serviceability/'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_stored_pincodes_are_not_throttled(self):
+        get_pincode_serviceability('560001', client=finder_client())
+
+        for _ in range(3):
+            response = self.client.get(self.url, {'pincode': '560001'})
+            self.assertEqual(response.status_code, 200)
+
+    def test_live_lookups_are_throttled(self):
+        with mock.patch('shipping.serviceability.get_bluedart_client', return_value=finder_client()):
+            first = self.client.get(self.url, {'pincode': '560001'})
+            second = self.client.get(self.url, {'pincode': '110001'})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+
+
+@override_settings(BLUEDART_TRACKING_BATCH_SIZE=2, BLUEDART_TRACKING_CONCURRENCY=4)
+class PollActiveShipmentsTests(TestCase):
+    def test_only_due_active_shipments_are_tracked_in_chunks(self):
+        for awb_number in ('10000000001', '10000000002', '10000000003'):
+            make_shipment(awb_number)
+        make_shipment('10000000004', next_poll_at=timezone.now() + timedelta(hours=1))
+        make_shipment('10000000005', status='delivered')
+        client = mock.Mock()
+        client.track_shipments.side_effect = lambda chunk, **kwargs: {
+            awb_number: tracking_result('in_transit') for awb_number in chunk
+        }
+
+        with mock.patch('shipping.tasks.get_bluedart_client', return_value=client):
+            poll_active_shipments()
+
+        chunks = [call.args[0] for call in client.track_shipments.call_args_list]
+        self.assertEqual(sorted(len(chunk) for chunk in chunks), [1, 2])
+        self.assertEqual(
+            sorted(awb_number for chunk in chunks for awb_number in chunk),
+            ['10000000001', '10000000002', '10000000003'],
+        )
+        self.assertFalse(Shipment.objects.filter(awb_number__lte='10000000003', next_poll_at=None).exists())
+
+    def test_failed_chunk_does_not_stop_the_others(self):
+        make_shipment('10000000001')
+        make_shipment('10000000002')
+        make_shipment('10000000003')
+        client = mock.Mock()
+
+        def track_shipments(chunk, **kwargs):
+            if '10000000003' in chunk:
+                raise BlueDartAPIError('timeout')
+            return {awb_number: tracking_result('out_for_delivery') for awb_number in chunk}
+
+        client.track_shipments.side_effect = track_shipments
+
+        with mock.patch('shipping.tasks.get_bluedart_client', return_value=client), \
+                mock.patch('accounts.tasks.send_shipment_update_email_task'), \
+                self.assertLogs('shipping.tasks', level='ERROR'):
+            poll_active_shipments()
+
+        failed = next(call.args[0] for call in client.track_shipments.call_args_list if '10000000003' in call.args[0])
+        for shipment in Shipment.objects.all():
+            self.assertEqual(shipment.status, 'in_transit' if shipment.awb_number in failed else 'out_for_delivery')
+        self.assertEqual(len(failed), Shipment.objects.filter(status='in_transit').count())
+
+    @override_settings(BLUEDART_TRACKING_POLL_DEADLINE=0.2)
+    def test_shipments_pending_at_the_deadline_wait_for_the_next_poll(self):
+        make_shipment('10000000001')
+        release = threading.Event()
+        client = mock.Mock()
+
+        def track_shipments(chunk, **kwargs):
+            release.wait(5)
+            return {awb_number: tracking_result('delivered') for awb_number in chunk}
+
+        client.track_shipments.side_effect = track_shipments
+
+        try:
+            with mock.patch('shipping.tasks.get_bluedart_client', return_value=client), \
+                    self.assertLogs('shipping.tasks', level='WARNING') as logs:
+                poll_active_shipments()
+        finally:
+            release.set()
+
+        self.assertIn('deadline reached, 1 shipments left', '\n'.join(logs.output))
+        shipment = Shipment.objects.get()
+        self.assertEqual(shipment.status, 'in_transit')
+        self.assertIsNone(shipment.next_poll_at)
+
+
+class TrackShipmentsTests(TestCase):
+    def setUp(self):
+        self.bluedart = BlueDartClient()
+        self.bluedart.http_session = mock.Mock()
+
+    def test_awbs_are_sent_in_chunks_and_matched_by_waybill_number(self):
+        self.bluedart.http_session.get.side_effect = [
+            tracking_xml(('10000000002', 'Out for Delivery'), ('10000000001', 'In Transit')),
+            tracking_xml(('10000000003', None)),
+        ]
+
+        results = self.bluedart.track_shipments(['10000000001', '10000000002', '10000000003'], chunk_size=2)
+
+        numbers = [call.kwargs['params']['numbers'] for call in self.bluedart.http_session.get.call_args_list]
+        self.assertEqual(numbers, ['10000000001,10000000002', '10000000003'])
+        self.assertEqual(results['10000000001']['current_status'], 'in_transit')
+        self.assertEqual(results['10000000002']['current_status'], 'out_for_delivery')
+        self.assertEqual(results['10000000002']['scan_events'][0]['scanned_location'], 'BANGALORE HUB')
+        self.assertEqual(results['10000000003']['error'], 'Invalid AWB')
+
+    def test_awbs_missing_from_the_response_get_an_error(self):
+        self.bluedart.http_session.get.return_value = tracking_xml(('10000000001', 'Delivered'))
+
+        results = self.bluedart.track_shipments(['10000000001', '10000000002'])
+
+        self.assertEqual(results['10000000001']['current_status'], 'delivered')
+        self.assertEqual(results['10000000002']['error'], 'No tracking data returned')
+
+    def test_http_errors_raise_api_error(self):
+        self.bluedart.http_session.get.side_effect = requests.ConnectionError('reset')
+
+        with self.assertRaises(BlueDartAPIError), self.assertLogs('shipping.client', level='ERROR'):
+            self.bluedart.track_shipments(['10000000001'])
+
+
+def scan(description, code, location, hour):
+    return {
+        'scan_date': datetime(2026, 10, 1, hour), 'scan_code': code, 'scan_description': description,
+        'scanned_location': location, 'instructions': '',
+    }
+
+
+@mock.patch('accounts.tasks.send_shipment_update_email_task')
+class ApplyTrackingBatchTests(TestCase):
+    def test_only_new_events_are_inserted(self, send_email):
+        shipment = make_shipment('10000000001', status='booked')
+        picked_up = scan('Picked Up', '015', 'MUMBAI', 9)
+        _apply_tracking_batch({shipment.awb_number: shipment}, {
+            shipment.awb_number: tracking_result('picked_up', [picked_up]),
+        })
+
+        _apply_tracking_batch({shipment.awb_number: shipment}, {
+            shipment.awb_number: tracking_result('in_transit', [scan('In Transit', '002', 'PUNE', 15), picked_up]),
+        })
+
+        self.assertEqual(
+            sorted(TrackingEvent.objects.values_list('scan_code', flat=True)), ['002', '015']
+        )
+
+    def test_status_changes_set_timestamps_and_queue_emails(self, send_email):
+        shipment = make_shipment('10000000001', status='booked')
+
+        changed, errors = _apply_tracking_batch({shipment.awb_number: shipment}, {
+            shipment.awb_number: tracking_result('picked_up', [scan('Picked Up', '015', 'MUMBAI', 9)]),
+        })
+
+        self.assertEqual((changed, errors), (1, 0))
+        shipment.refresh_from_db()
+        self.assertEqual(shipment.status, 'picked_up')
+        self.assertIsNotNone(shipment.shipped_at)
+        self.assertEqual(shipment.unchanged_poll_count, 0)
+        self.assertIsNotNone(shipment.next_poll_at)
+        send_email.delay.assert_called_once_with(shipment.order_id, 'picked_up')
+
+    def test_errors_are_recorded_and_backed_off(self, send_email):
+        shipment = make_shipment('10000000001')
+
+        changed, errors = _apply_tracking_batch({shipment.awb_number: shipment}, {
+            shipment.awb_number: tracking_result(error='Invalid AWB'),
+        })
+
+        self.assertEqual((changed, errors), (0, 1))
+        shipment.refresh_from_db()
+        self.assertEqual(shipment.last_error, 'Invalid AWB')
+        self.assertEqual(shipment.unchanged_poll_count, 1)
+        send_email.delay.assert_not_called()
+
+    def test_query_count_does_not_grow_with_the_batch(self, send_email):
+        def apply(awb_numbers):
+            shipments = {awb_number: make_shipment(awb_number) for awb_number in awb_numbers}
+            results = {
+                awb_number: tracking_result('in_transit', [
+                    scan('Arrived at Hub', '003', 'PUNE', 8), scan('Departed from Hub', '004', 'PUNE', 12),
+                ])
+                for awb_number in awb_numbers
+            }
+            with CaptureQueriesContext(connection) as queries:
+                _apply_tracking_batch(shipments, results)
+            return len(queries)
+
+        self.assertEqual(apply(['10000000001']), apply(['10000000002', '10000000003', '10000000004']))
+        self.assertEqual(TrackingEvent.objects.count(), 8)
+
+
+class ScheduleNextPollTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.shipment = make_shipment('10000000001', status='in_transit')
+
+    def minutes_until_next_poll(self, status_changed=False):
+        self.shipment.schedule_next_poll(status_changed=status_changed, now=self.now)
+        return (self.shipment.next_poll_at - self.now) / timedelta(minutes=1)
+
+    def test_interval_follows_the_status(self):
+        self.assertEqual(self.minutes_until_next_poll(status_changed=True), 240)
+        self.shipment.status = 'out_for_delivery'
+        self.assertEqual(self.minutes_until_next_poll(status_changed=True), 30)
+
+    def test_unchanged_polls_back_off_up_to_the_cap(self):
+        self.shipment.status = 'out_for_delivery'
+        intervals = [self.minutes_until_next_poll() for _ in range(5)]
+
+        self.assertEqual(intervals, [60, 120, 240, 240, 240])
+        self.assertEqual(self.minutes_until_next_poll(status_changed=True), 30)
+        self.assertEqual(self.shipment.unchanged_poll_count, 0)
+
+    def test_backoff_never_exceeds_the_maximum_interval(self):
+        for _ in range(4):
+            interval = self.minutes_until_next_poll()
+        self.assertEqual(interval, 720)
+
+    def test_stale_shipments_are_polled_less_often(self):
+        self.shipment.created_at = self.now - timedelta(days=11)
+        self.assertEqual(self.minutes_until_next_poll(status_changed=True), 480)
+
+    def test_shipments_due_for_delivery_are_polled_hourly(self):
+        self.shipment.expected_delivery_date = timezone.localdate(self.now)
+        for _ in range(3):
+            self.assertEqual(self.minutes_until_next_poll(), 60)
+
+    def test_finished_shipments_are_not_polled_again(self):
+        self.shipment.status = 'delivered'
+        self.shipment.schedule_next_poll(status_changed=True, now=self.now)
+        self.assertIsNone(self.shipment.next_poll_at)
+
+
+class SharedClientRegistryTests(TestCase):
+    def setUp(self):
+        patchers = [
+            mock.patch.dict(bluedart._soap_clients, clear=True),
+            mock.patch.object(bluedart, '_http_session', None),
+            mock.patch.object(bluedart, '_shared_client', None),
+            mock.patch.object(bluedart, '_registry_lock', bluedart._registry_lock),
+            mock.patch.object(bluedart, 'Client', side_effect=lambda wsdl, **kwargs: mock.Mock(**kwargs)),
+            mock.patch.object(bluedart, 'local_wsdl', return_value='/tmp/service.wsdl'),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_wsdl_is_parsed_once_per_url(self):
+        first = bluedart.get_soap_client('https://example.com/finder?wsdl')
+        again = bluedart.get_soap_client('https://example.com/finder?wsdl')
+        other = bluedart.get_soap_client('https://example.com/waybill?wsdl')
+
+        self.assertIs(first, again)
+        self.assertEqual(bluedart.Client.call_count, 2)
+        self.assertIsNot(first, other)
+
+    def test_clients_share_one_pooled_session(self):
+        bluedart.get_soap_client('https://example.com/finder?wsdl')
+        bluedart.get_soap_client('https://example.com/waybill?wsdl')
+
+        sessions = {id(call.kwargs['transport'].session) for call in bluedart.Client.call_args_list}
+        self.assertEqual(sessions, {id(bluedart.get_http_session())})
+        self.assertIs(BlueDartClient().http_session, bluedart.get_http_session())
+
+    def test_bluedart_client_is_shared(self):
+        self.assertIs(bluedart.get_bluedart_client(), bluedart.get_bluedart_client())
+
+    def test_forked_child_gets_its_own_session(self):
+        client = bluedart.get_soap_client('https://example.com/finder?wsdl')
+        shared = bluedart.get_bluedart_client()
+        parent_session = bluedart.get_http_session()
+
+        bluedart._reset_http_session_after_fork()
+
+        self.assertIsNot(bluedart.get_http_session(), parent_session)
+        self.assertIs(client.transport.session, bluedart.get_http_session())
+        self.assertIs(shared.http_session, bluedart.get_http_session())
+        self.assertIs(bluedart.get_soap_client('https://example.com/finder?wsdl'), client)
+
+
+FINDER_WSDL = b"""<?xml version="1.0"?>
+<wsdl:definitions xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/" xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+  <wsdl:types><xsd:schema><xsd:import schemaLocation="ServiceFinderQuery.svc?xsd=xsd0"/></xsd:schema></wsdl:types>
+</wsdl:definitions>"""
+
+
+def wsdl_session(schema=b'<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema"/>'):
+    """Session serving the Finder WSDL and the schema it imports"""
+    def get(url, timeout=None):
+        response = mock.Mock(content=FINDER_WSDL if url.endswith('?wsdl') else schema)
+        response.raise_for_status.return_value = None
+        return response
+
+    session = mock.Mock()
+    session.get.side_effect = get
+    return session
+
+
+class WsdlSnapshotTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(wsdl_snapshots, 'SNAPSHOT_DIR', Path(directory.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_snapshot_rewrites_imports_to_local_files(self):
+        directory = wsdl_snapshots.write_snapshot('demo', 'finder', wsdl_session())
+
+        local_path = wsdl_snapshots.local_wsdl(WSDL_ENDPOINTS['demo']['finder'])
+        self.assertEqual(local_path, str(directory / 'service.wsdl'))
+        self.assertIn(b'schemaLocation="xsd0.xsd"', (directory / 'service.wsdl').read_bytes())
+        self.assertTrue((directory / 'xsd0.xsd').exists())
+        self.assertIsNone(wsdl_snapshots.local_wsdl(WSDL_ENDPOINTS['demo']['waybill']))
+
+    def test_drift_check_skips_quietly_without_snapshots(self):
+        with mock.patch('shipping.client.get_http_session') as get_http_session, \
+                self.assertNoLogs('shipping.tasks', level='INFO'):
+            self.assertEqual(check_wsdl_drift(), [])
+
+        get_http_session.return_value.get.assert_not_called()
+
+    def test_drift_check_reports_changed_documents(self):
+        wsdl_snapshots.write_snapshot('demo', 'finder', wsdl_session())
+        changed = wsdl_session(schema=b'<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema" version="2"/>')
+
+        with mock.patch('shipping.client.get_http_session', return_value=changed), \
+                self.assertLogs('shipping.tasks', level='ERROR'):
+            differences = check_wsdl_drift()
+
+        self.assertEqual(len(differences), 1)
+        self.assertIn('demo/finder', differences[0])
+        self.assertIn('xsd=xsd0 changed', differences[0])
+
+    def test_drift_check_passes_for_current_snapshots(self):
+        wsdl_snapshots.write_snapshot('demo', 'finder', wsdl_session())
+
+        with mock.patch('shipping.client.get_http_session', return_value=wsdl_session()):
+            self.assertEqual(check_wsdl_drift(), [])
+
+
+class ShipmentCursorPaginationTests(TestCase):
+    url = '/api/shipping/shipments/'
+
+    def setUp(self):
+        self.customer = get_user_model().objects.create_user(username='asha', email='asha@example.com', password='pw')
+        self.own = [make_shipment(f'2000000000{number}', user=self.customer) for number in range(5)]
+        self.others = [make_shipment(f'3000000000{number}') for number in range(2)]
+        self.client = APIClient()
+
+    def walk(self, page_size):
+        """AWB numbers of every cursor page, checking each page's size"""
+        awb_numbers = []
+        with mock.patch.object(CursorPagination, 'page_size', page_size):
+            data = self.client.get(self.url, {'pagination': 'cursor'}).json()
+            while True:
+                self.assertNotIn('count', data)
+                self.assertLessEqual(len(data['results']), page_size)
+                awb_numbers += [shipment['awb_number'] for shipment in data['results']]
+                if not data['next']:
+                    return awb_numbers
+                data = self.client.get(data['next']).json()
+
+    def test_customers_page_through_their_own_shipments(self):
+        self.client.force_authenticate(self.customer)
+
+        awb_numbers = self.walk(page_size=2)
+
+        self.assertEqual(awb_numbers, [shipment.awb_number for shipment in reversed(self.own)])
+
+    def test_staff_page_through_every_shipment(self):
+        self.client.force_authenticate(get_user_model().objects.create_user(
+            username='ops', email='ops@example.com', password='pw', is_staff=True
+        ))
+
+        awb_numbers = self.walk(page_size=3)
+
+        self.assertEqual(len(awb_numbers), 7)
+        self.assertEqual(set(awb_numbers), {shipment.awb_number for shipment in self.own + self.others})
@@ -2,6 +2,7 @@
 Utility functions for Blue Dart API integration
 """
 import time
+import threading
 from datetime import datetime, date
 import base64
 from django.core.files.base import ContentFile
@@ -178,3 +179,35 @@ def split_address(full_address, line1_max=30, line2_max=30, line3_max=25):
             break  # Can't fit anymore
     
     return (line1.strip(), line2.strip(), line3.strip())
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces out calls to at most `rate` per second.
+    
+    Shared between worker threads so bulk jobs stay under Blue Dart's
+    request limits regardless of concurrency.
+    
+    Example:
+        >>> limiter = RateLimiter(5)
+        >>> limiter.wait()  # blocks until the next slot is free
+    """
+    
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        """Block until the caller may make its next request"""
+        if not self.interval:
+            return
+        
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
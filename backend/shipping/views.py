@@ -3,10 +3,13 @@ Django REST Framework views for shipping API endpoints
 """
 import logging
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.exceptions import Throttled
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.http import FileResponse, Http404
+from lefoyer.pagination import CursorOrPageNumberPagination
 
 from .models import Shipment, TrackingEvent
 from .serializers import (
@@ -15,13 +18,28 @@ from .serializers import (
     PincodeCheckSerializer,
     PincodeCheckResponseSerializer
 )
-from .client import BlueDartClient, BlueDartAPIError
+from .client import BlueDartAPIError, get_bluedart_client
+from .serviceability import get_pincode_serviceability, get_stored_serviceability
 
 logger = logging.getLogger(__name__)
 
 
+def throttle_live_lookup(request):
+    """
+    Apply the default API throttles to a lookup that has to query Blue Dart.
+
+    Raises:
+        Throttled: If the client has used up its rate
+    """
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            raise Throttled(throttle.wait())
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@throttle_classes([])  # Stored answers are free; live Blue Dart lookups are throttled below
 def check_serviceability(request):
     """
     Check pincode serviceability and get estimated delivery date.
@@ -44,36 +62,16 @@ def check_serviceability(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     pincode = serializer.validated_data['pincode']
+
+    # Most pincodes are not in the bundled master yet, so a miss usually
+    # means a live Blue Dart call
+    response_data = get_stored_serviceability(pincode)
+    if response_data is not None:
+        return Response(response_data)
+    throttle_live_lookup(request)
     
     try:
-        client = BlueDartClient()
-        
-        # Check serviceability
-        serviceability_result = client.check_serviceability(pincode)
-        
-        if not serviceability_result['serviceable']:
-            response_data = {
-                'serviceable': False,
-                'cod_available': False,
-                'expected_delivery_date': None,
-                'transit_days': None,
-                'area_code': None,
-                'error': serviceability_result.get('error')
-            }
-            return Response(response_data)
-        
-        # Get transit time
-        transit_result = client.get_transit_time(pincode)
-        
-        response_data = {
-            'serviceable': True,
-            'cod_available': serviceability_result['cod_available'],
-            'expected_delivery_date': transit_result.get('expected_delivery_date'),
-            'transit_days': transit_result.get('transit_days'),
-            'area_code': transit_result.get('area_code'),
-            'error': transit_result.get('error')
-        }
-        
+        response_data = get_pincode_serviceability(pincode)
         return Response(response_data)
         
     except BlueDartAPIError as e:
@@ -123,7 +121,7 @@ def track_shipment(request, awb_number):
             return Response(serializer.data)
         except Shipment.DoesNotExist:
             # Shipment not in our DB, try fetching directly from Blue Dart
-            client = BlueDartClient()
+            client = get_bluedart_client()
             result = client.track_shipment(awb_number)
             
             if result['error']:
@@ -199,6 +197,7 @@ class ShipmentViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Shipment.objects.all().select_related('order').prefetch_related('events')
     serializer_class = ShipmentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CursorOrPageNumberPagination
     
     def get_queryset(self):
         """Filter shipments by user unless staff"""
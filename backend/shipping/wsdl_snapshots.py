@@ -0,0 +1,200 @@
+"""
+Offline snapshots of Blue Dart's WSDL/XSD documents.
+
+Each service's WSDL and everything it imports is stored under
+shipping/wsdl/<env>/<service>/ with import locations rewritten to the local
+files, so zeep clients can be built without any network access. A
+manifest.json records where each file came from and its hash, which is used
+to detect drift against the live service.
+"""
+import hashlib
+import json
+import logging
+import re
+from pathlib import Path
+from urllib.parse import urljoin, urlparse, parse_qs
+
+from django.utils import timezone
+from lxml import etree
+
+from .constants import WSDL_ENDPOINTS
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = Path(__file__).resolve().parent / 'wsdl'
+ROOT_FILENAME = 'service.wsdl'
+MANIFEST_FILENAME = 'manifest.json'
+
+WSDL_NS = 'http://schemas.xmlsoap.org/wsdl/'
+XSD_NS = 'http://www.w3.org/2001/XMLSchema'
+
+# (element, attribute holding the referenced document)
+IMPORT_REFERENCES = [
+    (f'{{{WSDL_NS}}}import', 'location'),
+    (f'{{{XSD_NS}}}import', 'schemaLocation'),
+    (f'{{{XSD_NS}}}include', 'schemaLocation'),
+]
+
+
+def snapshot_path(env, service):
+    """Directory holding the snapshot for one environment/service"""
+    return SNAPSHOT_DIR / env / service
+
+
+def find_endpoint(wsdl_url):
+    """
+    Look up which environment and service a WSDL URL belongs to.
+
+    Returns:
+        tuple: (env, service) or None if the URL is not in WSDL_ENDPOINTS
+    """
+    for env, services in WSDL_ENDPOINTS.items():
+        for service, url in services.items():
+            if url == wsdl_url:
+                return env, service
+    return None
+
+
+def local_wsdl(wsdl_url):
+    """
+    Path of the bundled snapshot for a WSDL URL.
+
+    Returns:
+        str: Local service.wsdl path, or None if no snapshot exists
+    """
+    endpoint = find_endpoint(wsdl_url)
+    if endpoint is None:
+        return None
+
+    path = snapshot_path(*endpoint) / ROOT_FILENAME
+    return str(path) if path.exists() else None
+
+
+def _local_filename(url, taken):
+    """Readable, unique file name for an imported document"""
+    query = parse_qs(urlparse(url).query)
+    for key, extension in (('xsd', 'xsd'), ('wsdl', 'wsdl'), ('singleWsdl', 'wsdl')):
+        if query.get(key) and query[key][0]:
+            name = f"{query[key][0]}.{extension}"
+            break
+    else:
+        name = Path(urlparse(url).path).name or 'document.xml'
+
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', name)
+    stem, dot, extension = name.rpartition('.')
+    candidate, counter = name, 1
+    while candidate in taken:
+        counter += 1
+        candidate = f"{stem}_{counter}{dot}{extension}" if dot else f"{name}_{counter}"
+    return candidate
+
+
+def crawl(wsdl_url, session, timeout=30):
+    """
+    Download a WSDL and every document it imports.
+
+    Args:
+        wsdl_url: Root WSDL URL
+        session: requests.Session to fetch with
+        timeout: HTTP timeout in seconds per document
+
+    Returns:
+        dict: URL -> {'filename', 'raw' (bytes as served), 'content' (bytes
+        with import locations rewritten to local file names)}
+    """
+    documents = {}
+    taken = set()
+    queue = [wsdl_url]
+
+    while queue:
+        url = queue.pop(0)
+        if url in documents:
+            continue
+
+        response = session.get(url, timeout=timeout)
+        response.raise_for_status()
+        raw = response.content
+
+        filename = ROOT_FILENAME if url == wsdl_url else _local_filename(url, taken)
+        taken.add(filename)
+        documents[url] = {'filename': filename, 'raw': raw, 'tree': etree.fromstring(raw)}
+
+        for tag, attribute in IMPORT_REFERENCES:
+            for element in documents[url]['tree'].iter(tag):
+                location = element.get(attribute)
+                if location:
+                    queue.append(urljoin(url, location))
+
+    # Point every import at the local copy now that all names are known
+    for url, document in documents.items():
+        tree = document.pop('tree')
+        for tag, attribute in IMPORT_REFERENCES:
+            for element in tree.iter(tag):
+                location = element.get(attribute)
+                if location:
+                    element.set(attribute, documents[urljoin(url, location)]['filename'])
+        document['content'] = etree.tostring(tree, xml_declaration=True, encoding='utf-8')
+
+    return documents
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_snapshot(env, service, session):
+    """
+    Snapshot one service's WSDL/XSD set into the repo.
+
+    Returns:
+        Path: Snapshot directory
+    """
+    wsdl_url = WSDL_ENDPOINTS[env][service]
+    documents = crawl(wsdl_url, session)
+
+    directory = snapshot_path(env, service)
+    directory.mkdir(parents=True, exist_ok=True)
+    for old_file in directory.iterdir():
+        old_file.unlink()
+
+    manifest = {
+        'source': wsdl_url,
+        'fetched_at': timezone.now().isoformat(),
+        'documents': {},
+    }
+    for url, document in documents.items():
+        (directory / document['filename']).write_bytes(document['content'])
+        manifest['documents'][document['filename']] = {
+            'url': url,
+            'sha256': _sha256(document['raw']),
+        }
+
+    (directory / MANIFEST_FILENAME).write_text(json.dumps(manifest, indent=2) + '\n')
+    logger.info(f"Snapshotted {len(documents)} Blue Dart {env}/{service} documents to {directory}")
+    return directory
+
+
+def check_drift(env, service, session):
+    """
+    Compare a bundled snapshot against the live service.
+
+    Returns:
+        list: Human-readable differences (empty if the snapshot is current)
+    """
+    manifest_path = snapshot_path(env, service) / MANIFEST_FILENAME
+    if not manifest_path.exists():
+        return [f"{env}/{service}: no snapshot bundled"]
+
+    manifest = json.loads(manifest_path.read_text())
+    bundled = {entry['url']: entry['sha256'] for entry in manifest['documents'].values()}
+    live = {url: _sha256(document['raw']) for url, document in crawl(manifest['source'], session).items()}
+
+    differences = []
+    for url in sorted(set(bundled) | set(live)):
+        if url not in live:
+            differences.append(f"{env}/{service}: {url} no longer imported")
+        elif url not in bundled:
+            differences.append(f"{env}/{service}: {url} newly imported")
+        elif bundled[url] != live[url]:
+            differences.append(f"{env}/{service}: {url} changed")
+    return differences